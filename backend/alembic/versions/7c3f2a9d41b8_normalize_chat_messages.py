@@ -0,0 +1,100 @@
+"""Normalize chat messages into an append-only table
+
+Revision ID: 7c3f2a9d41b8
+Revises: 1ee890f3f157
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3f2a9d41b8'
+down_revision: Union[str, Sequence[str], None] = '1ee890f3f157'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    # 1. Per-message table keyed by (ordered pair, seq); chat rows become headers
+    op.create_table(
+        'chat_messages',
+        sa.Column('user1_id', sa.BigInteger(), nullable=False),
+        sa.Column('user2_id', sa.BigInteger(), nullable=False),
+        sa.Column('seq', sa.BigInteger(), nullable=False),
+        sa.Column('chat_id', sa.BigInteger(), sa.ForeignKey('chat.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('sender_id', sa.BigInteger(), nullable=True),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('sent_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('user1_id', 'user2_id', 'seq'),
+    )
+
+    # 2. Backfill from the JSONB arrays; seq numbers follow message time per pair, compared
+    #    as parsed timestamps (ISO text with and without offsets does not sort correctly)
+    op.execute("""
+        INSERT INTO chat_messages (user1_id, user2_id, seq, chat_id, sender_id, text, sent_at)
+        SELECT
+            LEAST(c.user1_id, c.user2_id),
+            GREATEST(c.user1_id, c.user2_id),
+            ROW_NUMBER() OVER (
+                PARTITION BY LEAST(c.user1_id, c.user2_id), GREATEST(c.user1_id, c.user2_id)
+                ORDER BY t.parsed NULLS LAST, c.id, m.ord
+            ),
+            c.id,
+            CASE WHEN m.value->>'sender' ~ '^[0-9]+$' THEN (m.value->>'sender')::bigint END,
+            m.value->>'text',
+            COALESCE(t.parsed, c.updated_at, now())
+        FROM chat c
+        CROSS JOIN LATERAL jsonb_array_elements(
+            CASE WHEN jsonb_typeof(c.messages) = 'array' THEN c.messages ELSE '[]'::jsonb END
+        ) WITH ORDINALITY AS m(value, ord)
+        CROSS JOIN LATERAL (
+            SELECT CASE
+                WHEN m.value->>'timestamp' ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}.*(Z|[+-][0-9]{2}:?[0-9]{2})$'
+                    THEN (m.value->>'timestamp')::timestamptz
+                WHEN m.value->>'timestamp' ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}'
+                    THEN (m.value->>'timestamp')::timestamp AT TIME ZONE 'UTC'
+            END AS parsed
+        ) AS t
+        WHERE jsonb_typeof(m.value) = 'object' AND m.value->>'text' IS NOT NULL
+    """)
+
+    # 3. Indexes (created after the backfill so it is not slowed down by them)
+    op.create_index('ix_chat_messages_chat_seq', 'chat_messages', ['chat_id', 'seq'])
+    op.create_index('ix_chat_messages_chat_sent_at', 'chat_messages', ['chat_id', 'sent_at'])
+    op.create_index('ix_chat_messages_user2', 'chat_messages', ['user2_id', 'user1_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Messages written after the upgrade only exist in chat_messages, so every conversation's
+    # JSONB array is rebuilt from the table before it is dropped. Elements come back in the
+    # pre-migration shape {sender, text, timestamp} in seq order; keys other than those
+    # (and array elements without text, which were never copied) are not restored.
+    op.execute("""
+        UPDATE chat AS c
+        SET messages = rebuilt.messages
+        FROM (
+            SELECT
+                chat_id,
+                jsonb_agg(
+                    jsonb_build_object(
+                        'sender', sender_id,
+                        'text', text,
+                        'timestamp', to_char(sent_at AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US')
+                    )
+                    ORDER BY seq
+                ) AS messages
+            FROM chat_messages
+            GROUP BY chat_id
+        ) AS rebuilt
+        WHERE rebuilt.chat_id = c.id
+    """)
+    op.drop_index('ix_chat_messages_user2', table_name='chat_messages')
+    op.drop_index('ix_chat_messages_chat_sent_at', table_name='chat_messages')
+    op.drop_index('ix_chat_messages_chat_seq', table_name='chat_messages')
+    op.drop_table('chat_messages')
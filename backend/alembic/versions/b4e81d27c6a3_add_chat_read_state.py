@@ -0,0 +1,59 @@
+"""Add per-user chat read state (inbox ordering and unread counts)
+
+Revision ID: b4e81d27c6a3
+Revises: 7c3f2a9d41b8
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e81d27c6a3'
+down_revision: Union[str, Sequence[str], None] = '7c3f2a9d41b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    # 1. One row per (user, peer) of every pair that has messages
+    op.create_table(
+        'chat_read_state',
+        sa.Column('user_id', sa.BigInteger(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('peer_id', sa.BigInteger(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('last_seq', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('last_read_seq', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('last_message_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'peer_id'),
+    )
+
+    # 2. Backfill from the latest message of each pair, for both participants.
+    #    Existing history is treated as read so nobody starts with a wall of unread messages.
+    op.execute("""
+        INSERT INTO chat_read_state (user_id, peer_id, last_seq, last_read_seq, last_message_at)
+        SELECT p.user_id, p.peer_id, last.seq, last.seq, last.sent_at
+        FROM (
+            SELECT DISTINCT ON (user1_id, user2_id) user1_id, user2_id, seq, sent_at
+            FROM chat_messages
+            ORDER BY user1_id, user2_id, seq DESC
+        ) AS last
+        CROSS JOIN LATERAL (
+            VALUES (last.user1_id, last.user2_id), (last.user2_id, last.user1_id)
+        ) AS p(user_id, peer_id)
+        WHERE EXISTS (SELECT 1 FROM users WHERE id = p.user_id)
+          AND EXISTS (SELECT 1 FROM users WHERE id = p.peer_id)
+    """)
+
+    # 3. Inbox index: a page of a user's conversations is one (backward) range scan,
+    #    the keyset cursor (last_message_at, peer_id) < (..) is an index condition
+    op.create_index('ix_chat_read_state_inbox', 'chat_read_state', ['user_id', 'last_message_at', 'peer_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_read_state_inbox', table_name='chat_read_state')
+    op.drop_table('chat_read_state')
@@ -0,0 +1,39 @@
+"""Add a per-topic sentiment watermark to conversations
+
+Revision ID: d7f2a4c8e913
+Revises: b4e81d27c6a3
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7f2a4c8e913'
+down_revision: Union[str, Sequence[str], None] = 'b4e81d27c6a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    # 1. Newest message of each (pair, topic) conversation already scored by assess
+    op.add_column('chat', sa.Column('last_sentiment_at', sa.TIMESTAMP(timezone=True), nullable=True))
+
+    # 2. Backfill from the pair-level watermark so messages already scored are not scored twice
+    op.execute("""
+        UPDATE chat AS c
+        SET last_sentiment_at = r.last_sentiment_at
+        FROM report AS r
+        WHERE LEAST(r.user1_id, r.user2_id) = LEAST(c.user1_id, c.user2_id)
+          AND GREATEST(r.user1_id, r.user2_id) = GREATEST(c.user1_id, c.user2_id)
+          AND r.last_sentiment_at IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat', 'last_sentiment_at')
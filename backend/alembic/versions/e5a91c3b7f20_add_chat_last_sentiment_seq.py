@@ -0,0 +1,39 @@
+"""Key the per-topic sentiment watermark on the pair's message seq
+
+Revision ID: e5a91c3b7f20
+Revises: d7f2a4c8e913
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a91c3b7f20'
+down_revision: Union[str, Sequence[str], None] = 'd7f2a4c8e913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    # 1. Highest seq of each (pair, topic) conversation already scored by assess
+    op.add_column('chat', sa.Column('last_sentiment_seq', sa.BigInteger(), nullable=True))
+
+    # 2. Backfill from the time-based watermark: everything sent up to it was scored
+    op.execute("""
+        UPDATE chat AS c
+        SET last_sentiment_seq = (
+            SELECT MAX(m.seq) FROM chat_messages AS m
+            WHERE m.chat_id = c.id AND m.sent_at <= c.last_sentiment_at
+        )
+        WHERE c.last_sentiment_at IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat', 'last_sentiment_seq')
@@ -0,0 +1,94 @@
+# bench/broadcast.py
+"""
+Room broadcast latency with members spread over workers (SocketManager + ClusterBus).
+
+Run from backend/ with the usual .env and Redis up (or --fakeredis to run in-process):
+    python -m bench.broadcast --members 2 50 500 --remote-share 0.5
+
+Local members get no-op sockets on this process; the remote share is
+registered as present on other (simulated) worker nodes, so every broadcast does
+the presence lookup and publishes for real. A broadcast costs one pipelined
+presence read plus one pipelined publish whatever the room size.
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+from core.redis import redis_client
+from ws import cluster, socket_manager
+from ws.chat_flusher import ChatFlusher
+
+REMOTE_NODES = ["bench-node-a", "bench-node-b", "bench-node-c"]
+
+
+class _NoFlush:
+    async def flush_rooms(self, room_ids):
+        return 0
+
+
+class _Socket:
+    async def send_text(self, data):
+        return None
+
+    async def send_bytes(self, data):
+        return None
+
+
+async def measure(members: int, remote_share: float, rounds: int) -> float:
+    manager = socket_manager.SocketManager()
+    client = cluster.redis_client
+    room = f"bench-room-{members}"
+    remote = int(members * remote_share)
+    await client.zadd(cluster.NODES_KEY, {node: time.time() + 600 for node in REMOTE_NODES})
+    for uid in range(members):
+        user_id = f"bench-{uid}"
+        if uid < remote:
+            await client.hset(cluster._presence_key(user_id), REMOTE_NODES[uid % len(REMOTE_NODES)], 1)
+        else:
+            await manager.register_connection(user_id, _Socket())
+        await manager.add_user_to_room(user_id, room)
+
+    timings = []
+    frame = {"type": "chat", "payload": {"room_id": room, "text": "hello there", "seq": 1}}
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await manager.broadcast_to_room(room, frame)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    for conn in list(manager._conns):
+        await manager.unregister_connection(conn)
+    await client.delete(*(cluster._presence_key(f"bench-{uid}") for uid in range(members)))
+    await client.zrem(cluster.NODES_KEY, *REMOTE_NODES)
+    manager._ping_task.cancel()
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--members", type=int, nargs="+", default=[2, 50, 500])
+    parser.add_argument("--remote-share", type=float, default=0.5)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--fakeredis", action="store_true", help="use an in-process Redis")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    if args.fakeredis:
+        import fakeredis
+        cluster.redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    else:
+        cluster.redis_client = redis_client
+    socket_manager.settings.CLUSTER_ENABLED = True
+    ChatFlusher.instance = classmethod(lambda cls: _NoFlush())
+
+    async def run_all():  # one loop: the Redis client's connections are bound to it
+        for members in args.members:
+            median_ms = await measure(members, args.remote_share, args.rounds)
+            print(f"{members:>5} members ({args.remote_share:.0%} remote): median broadcast {median_ms:.3f} ms")
+
+    asyncio.run(run_all())
+
+
+if __name__ == "__main__":
+    main()
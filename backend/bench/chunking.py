@@ -0,0 +1,59 @@
+# bench/chunking.py
+"""
+Chunking and map-reduce scoring of long conversations (services/text_sentiment.py).
+
+Run from backend/ with the usual .env:
+    python -m bench.chunking                      # chunk_messages only, no LLM
+    python -m bench.chunking --e2e --messages 2000
+
+--e2e also runs analyze_conversation end to end; point LLM_BASE_URL at the stub
+server (llm_stub_server.py, e.g. STUB_LATENCY_MS=300) to get repeatable numbers.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from core.config import get_settings
+from services.text_sentiment import analyze_conversation, chunk_messages
+
+WORDS = "we should visit my parents next month and plan the trip together before the wedding".split()
+
+
+def synthetic_chat(n: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    return [
+        {"sender": str(1 + i % 2), "text": " ".join(rng.choices(WORDS, k=rng.randint(3, 40)))}
+        for i in range(n)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--e2e", action="store_true", help="also score the chat through the LLM")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    messages = synthetic_chat(args.messages)
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        chunks = chunk_messages(messages, settings.SENTIMENT_CHUNK_TOKENS)
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"chunk_messages: {args.messages} messages -> {len(chunks)} chunks of <= "
+          f"{settings.SENTIMENT_CHUNK_TOKENS} tokens, median {statistics.median(timings):.1f} ms, "
+          f"max {max(timings):.1f} ms over {args.repeat} runs")
+
+    if args.e2e:
+        start = time.perf_counter()
+        score = asyncio.run(analyze_conversation(messages, "general"))
+        print(f"analyze_conversation: {score} in {time.perf_counter() - start:.2f} s "
+              f"({len(chunks)} chunks, concurrency {settings.SENTIMENT_MAX_CONCURRENCY})")
+
+
+if __name__ == "__main__":
+    main()
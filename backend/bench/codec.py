@@ -0,0 +1,46 @@
+# bench/codec.py
+"""
+Frame size and encode/decode time of the WebSocket codecs (ws/codec.py).
+
+Run from backend/ (msgpack must be installed for the binary codec):
+    python -m bench.codec --iterations 100000
+
+Frames are the ones the server sends most: an llm_stream delta, a chat message and
+an assess stage update. Sizes are the frame bytes before permessage-deflate.
+"""
+import argparse
+import timeit
+
+from ws.codec import JSON_CODEC, MsgPackCodec, msgpack
+
+FRAMES = {
+    "llm_stream": {"type": "assess", "request_id": "3f1c2a9e", "payload": {"stage": "llm_stream", "delta": "The couple shows "}},
+    "chat": {
+        "type": "chat", "request_id": "c-81", "payload": {
+            "room_id": "12_57", "sender": "12", "receiver": "57", "text": "Shall we meet on Sunday?",
+            "topic": "general", "ts": "2026-10-19T18:04:11.123456", "id": "1760897051123-0", "seq": 418,
+        },
+    },
+    "stage": {"type": "assess", "request_id": "3f1c2a9e", "payload": {"stage": "analysing_sentiment", "message": "Analyzing messages"}},
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    codecs = [JSON_CODEC] + ([MsgPackCodec()] if msgpack is not None else [])
+    for name, frame in FRAMES.items():
+        for codec in codecs:
+            data = codec.encode(frame)
+            size = len(data.encode("utf-8") if isinstance(data, str) else data)
+            encode_us = timeit.timeit(lambda: codec.encode(frame), number=args.iterations) / args.iterations * 1e6
+            decode_us = timeit.timeit(lambda: codec.decode(data), number=args.iterations) / args.iterations * 1e6
+            print(f"{name:<11} {codec.name:<8} {size:>4} B  encode {encode_us:5.2f} us  decode {decode_us:5.2f} us")
+    if msgpack is None:
+        print("msgpack is not installed: only the JSON codec was measured")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# bench/db_paths.py
+"""
+Handler DB path: sync session in the default thread executor vs AsyncSession over asyncpg.
+
+Run from backend/ against a Postgres with the app's schema (DB_* settings in .env):
+    python -m bench.db_paths --concurrency 1 16 64 256 --calls 20
+
+Each of --concurrency tasks runs --calls report lookups (utils.report_utils.get_report,
+as the assess/view_report handlers do) either through
+    loop.run_in_executor(None, db_call, ...)   -- the path before the asyncpg engine
+or  async_db_call(...)                        -- AsyncSession.run_sync on the event loop
+and the per-call latency percentiles and total throughput are printed for both.
+Pool size and timeouts come from DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from core.database import async_engine, engine
+from utils.helpers import async_db_call, db_call
+from utils.report_utils import get_report
+
+
+async def _run(path: str, concurrency: int, calls: int):
+    loop = asyncio.get_running_loop()
+    latencies = []
+
+    async def worker(n: int) -> None:
+        for i in range(calls):
+            u1, u2 = 1 + (n + i) % 50, 51 + (n * i) % 50
+            start = time.perf_counter()
+            if path == "executor":
+                await loop.run_in_executor(None, db_call, get_report, u1, u2)
+            else:
+                await async_db_call(get_report, u1, u2)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return statistics.median(latencies), p95, len(latencies) / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64, 256])
+    parser.add_argument("--calls", type=int, default=20)
+    args = parser.parse_args()
+
+    async def run_all():
+        await async_db_call(get_report, 1, 2)  # warm both pools
+        db_call(get_report, 1, 2)
+        for concurrency in args.concurrency:
+            for path in ("executor", "asyncpg"):
+                p50, p95, throughput = await _run(path, concurrency, args.calls)
+                print(f"concurrency {concurrency:>4} {path:<8}: p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  "
+                      f"{throughput:8.0f} calls/s")
+        await async_engine.dispose()
+        engine.dispose()
+
+    asyncio.run(run_all())
+
+
+if __name__ == "__main__":
+    main()
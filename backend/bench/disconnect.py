@@ -0,0 +1,71 @@
+# bench/disconnect.py
+"""
+Disconnect cost against the total number of rooms (SocketManager reverse index).
+
+Run from backend/ with the usual .env (no Redis or DB needed):
+    python -m bench.disconnect --rooms 1000 10000 100000
+
+Every room has two members; each disconnecting user is in --rooms-per-user rooms.
+The ChatFlusher and the cluster bus are swapped out so only the in-memory work is
+timed. With the reverse index the time stays flat as the total room count grows.
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+from ws import socket_manager
+from ws.chat_flusher import ChatFlusher
+
+
+class _NoFlush:
+    async def flush_rooms(self, room_ids):
+        return 0
+
+
+class _Socket:
+    async def send_text(self, data):
+        return None
+
+    async def send_bytes(self, data):
+        return None
+
+
+async def measure(total_rooms: int, rooms_per_user: int, samples: int) -> float:
+    manager = socket_manager.SocketManager()
+    users = total_rooms * 2 // rooms_per_user
+    sockets = {}
+    for uid in range(users):
+        sockets[uid] = _Socket()
+        await manager.register_connection(str(uid), sockets[uid])
+    for room in range(total_rooms):
+        for uid in (room * 2 % users, (room * 2 + 1) % users):
+            await manager.add_user_to_room(str(uid), f"room-{room}")
+
+    timings = []
+    for uid in range(min(samples, users)):
+        start = time.perf_counter()
+        await manager.unregister_connection(sockets[uid])
+        timings.append((time.perf_counter() - start) * 1000)
+    manager._ping_task.cancel()
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--rooms-per-user", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)  # one line per register/unregister otherwise
+    socket_manager.settings.CLUSTER_ENABLED = False
+    ChatFlusher.instance = classmethod(lambda cls: _NoFlush())
+    for total in args.rooms:
+        median_ms = asyncio.run(measure(total, args.rooms_per_user, args.samples))
+        print(f"{total:>8} rooms: median disconnect {median_ms:.3f} ms ({args.rooms_per_user} rooms per user)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# bench/history.py
+"""
+Latency of a buffered chat history page (core.redis.get_cached_page).
+
+Run from backend/ with the usual .env and Redis up (or --fakeredis to run in-process):
+    python -m bench.history --buffered 1000 10000 --limit 50
+
+For each buffer size two rooms are filled: one where every message is on the
+requested topic, and one where only --rare-share of them are. Reports the median
+time of the first page and how many requests it takes to page through the buffer.
+The scan per request is capped at CHAT_HISTORY_SCAN_CHUNKS chunks of `limit`.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from core import redis as redis_buffer
+
+
+async def fill(room_id: str, size: int, rare_share: float) -> None:
+    every = max(1, round(1 / rare_share)) if rare_share < 1 else 1
+    key = redis_buffer.chat_stream_key(room_id)
+    await redis_buffer.redis_client.delete(key)
+    for start in range(0, size, 1000):
+        async with redis_buffer.redis_client.pipeline(transaction=False) as pipe:
+            for seq in range(start, min(size, start + 1000)):
+                topic = "travel" if seq % every == 0 else "family"
+                pipe.xadd(key, {"m": json.dumps({"seq": seq, "topic": topic, "text": "hello there"})})
+            await pipe.execute()
+
+
+async def measure(room_id: str, limit: int, rounds: int):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await redis_buffer.get_cached_page(room_id, "travel", None, limit)
+        timings.append((time.perf_counter() - start) * 1000)
+    requests, cursor = 1, None
+    _, cursor = await redis_buffer.get_cached_page(room_id, "travel", None, limit)
+    while cursor is not None:
+        _, cursor = await redis_buffer.get_cached_page(room_id, "travel", cursor, limit)
+        requests += 1
+    return statistics.median(timings), max(timings), requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--buffered", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--rare-share", type=float, default=0.01)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--fakeredis", action="store_true", help="use an in-process Redis")
+    args = parser.parse_args()
+
+    if args.fakeredis:
+        import fakeredis
+        redis_buffer.redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    async def run_all():  # one loop: the Redis client's connections are bound to it
+        for size in args.buffered:
+            for label, share in (("dense", 1.0), ("rare", args.rare_share)):
+                room = f"bench_{label}_{size}"
+                await fill(room, size, share)
+                median_ms, max_ms, requests = await measure(room, args.limit, args.rounds)
+                await redis_buffer.redis_client.delete(redis_buffer.chat_stream_key(room))
+                print(f"{size:>6} buffered, {label:<5} topic: first page median {median_ms:.2f} ms, "
+                      f"max {max_ms:.2f} ms, {requests} requests to page through")
+
+    asyncio.run(run_all())
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
 from functools import lru_cache
+from typing import Dict
 
 
 class Settings(BaseSettings):
@@ -26,6 +27,20 @@ class Settings(BaseSettings):
     DB_PORT: int
     DB_NAME: str
     DATABASE_URL: str | None = None  # optional, can build dynamically
+    DB_POOL_SIZE: int = Field(10, description="Connections kept open by the async engine pool")
+    DB_MAX_OVERFLOW: int = Field(10, description="Extra async connections allowed beyond the pool size under bursts")
+    DB_POOL_TIMEOUT: float = Field(10.0, description="Seconds to wait for a free async connection before failing")
+    DB_POOL_RECYCLE: int = Field(1800, description="Seconds after which a pooled connection is replaced")
+    DB_COMMAND_TIMEOUT: float = Field(30.0, description="asyncpg per-statement timeout in seconds")
+
+    # --- DB instrumentation ---
+    DB_ECHO: bool = Field(False, description="Log every SQL statement (development only)")
+    DB_SLOW_QUERY_MS: float = Field(200.0, description="Statements slower than this are logged with redacted parameters")
+    DB_N_PLUS_ONE_THRESHOLD: int = Field(10, description="Same statement run this often in one request / message is flagged as N+1")
+
+    # --- Redis ---
+    REDIS_HOST: str = "localhost"
+    REDIS_PORT: int = 6379
 
     # --- AI / LLM Keys ---
     OPENAI_API_KEY: str
@@ -34,6 +49,27 @@ class Settings(BaseSettings):
     HUGGINGFACE_HUB_TOKEN: str
     OPENROUTER_API_KEY: str
 
+    # --- LLM resilience ---
+    LLM_TIMEOUT: float = Field(30.0, description="Per-request LLM timeout in seconds")
+    LLM_MIN_IN_FLIGHT: int = Field(1, description="Lower bound of the adaptive in-flight LLM call limit")
+    LLM_MAX_IN_FLIGHT: int = Field(8, description="Upper bound of the adaptive in-flight LLM call limit")
+    LLM_QUEUE_TIMEOUT: float = Field(10.0, description="Max seconds to wait for an in-flight slot before degrading")
+    LLM_MAX_RETRIES: int = Field(3, description="Retries on timeouts, rate limits and 5xx errors")
+    LLM_RETRY_BASE_DELAY: float = Field(0.5, description="Base delay in seconds for jittered exponential backoff")
+    LLM_RETRY_MAX_DELAY: float = Field(8.0, description="Max backoff delay in seconds")
+    LLM_BREAKER_FAILURES: int = Field(5, description="Consecutive failures that open the circuit breaker")
+    LLM_BREAKER_RESET_SECONDS: float = Field(30.0, description="Seconds the breaker stays open before a probe")
+    LLM_CACHE_SIZE: int = Field(256, description="Prompts whose last good answer is kept as a fallback")
+
+    # --- LLM telemetry ---
+    LLM_PROMPT_COST_PER_1K: float = Field(0.0, description="USD per 1k prompt tokens, for cost estimates")
+    LLM_COMPLETION_COST_PER_1K: float = Field(0.0, description="USD per 1k completion tokens, for cost estimates")
+    LLM_TRACE_PATH: str | None = Field(None, description="Optional JSONL file receiving one line per LLM call")
+
+    # --- Sentiment scoring ---
+    SENTIMENT_CHUNK_TOKENS: int = Field(3000, description="Max conversation tokens per sentiment prompt")
+    SENTIMENT_MAX_CONCURRENCY: int = Field(4, description="Max chunks scored concurrently per assessment")
+
     # --- Data directory ---
     DATA_DIR: str = "./data"
 
@@ -44,6 +80,56 @@ class Settings(BaseSettings):
     REFRESH_EXPIRE_DAYS: int = Field(30, description="JWT refresh token expiry in days")
     
     WS_PING_INTERVAL: int
+    WS_HEARTBEAT_TICK: float = Field(1.0, description="Heartbeat wheel tick; pings are spread over WS_PING_INTERVAL")
+    WS_DEAD_AFTER: float = Field(90.0, description="Drop a connection silent for this many seconds (0 disables)")
+    WS_DEAD_DROP_CONCURRENCY: int = Field(32, description="Dead connections closed concurrently by the heartbeat")
+    WS_SEND_QUEUE_SIZE: int = Field(256, description="Max frames queued per connection")
+    WS_SEND_TIMEOUT: float = Field(5.0, description="Seconds a single send may take before the socket is dropped")
+    WS_SLOW_CONSUMER_POLICY: str = Field("disconnect", description="On full queue: 'disconnect' or 'drop_oldest'")
+    WS_QUEUE_DEPTH_ALERT: int = Field(64, description="Send queue depth counted as backed up in /metrics")
+    METRICS_CONNECTION_DETAIL: bool = Field(False, description="Allow /metrics?detail=true (per-connection stats incl. user ids)")
+    WS_HANDLER_LIMITS: Dict[str, int] = Field(
+        {"chat": 8, "assess": 1, "view_report": 2},
+        description="Max in-flight handler tasks per connection, by message type",
+    )
+    WS_USER_HANDLER_LIMITS: Dict[str, int] = Field(
+        {"chat": 16, "assess": 2, "view_report": 4},
+        description="Max in-flight handler tasks per user across all their sockets, by message type",
+    )
+    WS_HANDLER_DEFAULT_LIMIT: int = Field(4, description="Per-connection and per-user limit for types not listed above")
+
+    # --- Multi-process delivery ---
+    CLUSTER_ENABLED: bool = Field(True, description="Deliver to sockets held by other workers via Redis pub/sub")
+    CLUSTER_NODE_TTL: int = Field(30, description="Seconds a worker counts as alive after its last heartbeat")
+
+    # --- Chat write-behind (Redis -> Postgres) ---
+    CHAT_FLUSH_INTERVAL: float = Field(5.0, description="Seconds between background flush passes")
+    CHAT_FLUSH_MAX_AGE: float = Field(30.0, description="Flush a room once its oldest buffered message is this old")
+    CHAT_FLUSH_MAX_MESSAGES: int = Field(200, description="Flush a room as soon as its buffer holds this many messages")
+    CHAT_FLUSH_BATCH_ROOMS: int = Field(50, description="Rooms written per DB transaction")
+    CHAT_FLUSH_LOCK_TTL: int = Field(60, description="Seconds a per-room flush lock is held at most")
+    CHAT_FLUSH_RETRY_BASE_DELAY: float = Field(5.0, description="First retry delay in seconds for a room whose flush failed")
+    CHAT_FLUSH_RETRY_MAX_DELAY: float = Field(300.0, description="Max retry delay in seconds for a repeatedly failing room")
+    CHAT_FLUSH_READ_COUNT: int = Field(1000, description="Max buffered messages read per room per flush")
+    CHAT_STREAM_MAXLEN: int = Field(10000, description="Safety cap (approximate) on a room's Redis stream")
+    CHAT_HISTORY_SCAN_CHUNKS: int = Field(4, description="Stream chunks of `limit` entries one history page may scan")
+    CHAT_RESUME_MAX_MESSAGES: int = Field(500, description="Max messages replayed per room on reconnect")
+    CHAT_OFFLINE_MAX: int = Field(200, description="Max frames queued for a user while offline")
+    CHAT_OFFLINE_TTL: int = Field(7 * 24 * 3600, description="Seconds an offline queue is kept")
+
+    # --- Profile cache ---
+    PROFILE_CACHE_SIZE: int = Field(10000, description="Profiles kept in the in-process LRU tier")
+    PROFILE_CACHE_TTL: int = Field(300, description="Seconds a cached profile snapshot stays valid")
+    PROFILE_CACHE_REDIS: bool = Field(False, description="Also share profile snapshots between workers through Redis")
+
+    # --- Background jobs (assess / report) ---
+    JOB_WORKERS: int = Field(4, description="Jobs executed concurrently by this process")
+    JOB_LEASE_SECONDS: int = Field(120, description="A running job not renewed within this is requeued")
+    JOB_MAX_ATTEMPTS: int = Field(3, description="Times a job is (re)started before it is dropped")
+    JOB_DEDUPE_TTL: int = Field(600, description="Upper bound in seconds on a per-pair dedupe key")
+    JOB_RESULT_TTL: int = Field(3600, description="Seconds a finished job's hash and subscribers are kept")
+    JOB_ACTIVE_COUNT_TTL: int = Field(3600, description="Upper bound in seconds on a user's queued+running job counter")
+    JOB_POLL_INTERVAL: float = Field(0.2, description="Idle worker poll interval in seconds")
 
     class Config:
         env_file = ".env"
@@ -2,6 +2,7 @@
 
 
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, scoped_session, declarative_base
 from core.config import settings
 
@@ -10,22 +11,41 @@ DATABASE_URL = (
     f"postgresql://{settings.DB_USER}:{settings.DB_PASS}"
     f"@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
 )
+ASYNC_DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
 
 # Engine
 #engine = create_engine(DATABASE_URL, echo=settings.DEBUG,  connect_args={'options': '-c client_encoding=utf8'})
 engine = create_engine(
     DATABASE_URL,
-    echo=settings.DEBUG,
+    echo=settings.DB_ECHO,
     pool_pre_ping=True,                 # auto-reconnects dropped connections
     connect_args={'options': '-c client_encoding=utf8'}
 )
 
+# Async engine (asyncpg) for WebSocket handlers, the chat flusher and async routes.
+# Queries run on the event loop instead of hopping to the default thread executor.
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=settings.DB_ECHO,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+    connect_args={"command_timeout": settings.DB_COMMAND_TIMEOUT},
+)
+
 
 # Session factory
 SessionLocal = scoped_session(
     sessionmaker(autocommit=False, autoflush=False, bind=engine)
 )
 
+# Async session factory; objects stay usable after commit (no lazy reload outside the loop)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 # Base class for ORM models
 Base = declarative_base()
 
@@ -41,3 +61,14 @@ def get_db():
         raise
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Provide a transactional async database session."""
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
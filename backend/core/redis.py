@@ -1,28 +1,145 @@
 import redis.asyncio as redis
+from redis import Redis as SyncRedis
 import json
-from typing import List
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+from core.config import get_settings
+
+settings = get_settings()
 
 # Create Redis connection pool
 redis_client = redis.from_url(
-    "redis://localhost:6379", 
+    f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}",
+    decode_responses=True
+)
+
+# Blocking client for sync code paths (the profile cache's optional Redis tier)
+sync_redis_client = SyncRedis.from_url(
+    f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}",
     decode_responses=True
 )
 
-async def save_message_to_cache(room_id: str, message: dict):
+# ZSET room_id -> when its buffer became pending (unix seconds; 0 = due now).
+# The write-behind flusher drains rooms from here by age or size.
+CHAT_ROOMS_KEY = "chat:rooms"
+
+# Consumer group the flusher reads room streams with (entries are XACKed once committed)
+CHAT_FLUSH_GROUP = "flusher"
+
+
+def chat_stream_key(room_id: str) -> str:
+    return f"chat:{room_id}"
+
+
+def decode_stream_entry(entry_id: str, fields: dict) -> dict:
+    """Stream entry -> message dict carrying its stream id (monotonic per room) as `id`."""
+    message = json.loads(fields["m"])
+    message["id"] = entry_id
+    return message
+
+
+async def save_message_to_cache(room_id: str, message: dict) -> str:
     """
-    Save a chat message into Redis list for the given room.
+    Append a chat message to the room's Redis stream and index the room for the
+    background flusher (marked due at once when the buffer is large), all in one
+    round trip. Returns the stream entry id, usable for dedupe and resume.
+    MAXLEN (approximate) is only a safety cap: rooms are flushed long before it.
     """
-    await redis_client.rpush(f"chat:{room_id}", json.dumps(message))
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.xadd(chat_stream_key(room_id), {"m": json.dumps(message)},
+                  maxlen=settings.CHAT_STREAM_MAXLEN, approximate=True)
+        pipe.zadd(CHAT_ROOMS_KEY, {room_id: time.time()}, nx=True)
+        pipe.xlen(chat_stream_key(room_id))
+        entry_id, _, length = await pipe.execute()
+    if length >= settings.CHAT_FLUSH_MAX_MESSAGES:
+        await redis_client.zadd(CHAT_ROOMS_KEY, {room_id: 0}, xx=True)
+    return entry_id
+
+# INCR the room sequence only if it exists (nil -> the caller seeds it first)
+_next_seq_script = redis_client.register_script("""
+if redis.call('EXISTS', KEYS[1]) == 1 then
+  return redis.call('INCR', KEYS[1])
+end
+return false
+""")
+
+
+async def next_room_seq(room_id: str, seed: Callable[[], Awaitable[int]]) -> int:
+    """
+    Next per-room sequence number (INCR of chat:seq:<room>). When the counter is missing
+    (first message, or evicted) it is seeded with `await seed()` -- the highest seq
+    already used -- before incrementing.
+    """
+    key = f"chat:seq:{room_id}"
+    seq = await _next_seq_script(keys=[key])
+    if seq is None:
+        await redis_client.set(key, await seed(), nx=True)
+        seq = await redis_client.incr(key)
+    return int(seq)
+
+async def last_buffered_seq(room_id: str) -> int:
+    """Seq of the newest message still in the room stream (0 when empty)."""
+    entries = await redis_client.xrevrange(chat_stream_key(room_id), count=1)
+    if not entries:
+        return 0
+    return int(decode_stream_entry(*entries[0]).get("seq") or 0)
+
+async def push_offline_message(user_id: str, obj: dict) -> None:
+    """Queue a frame for a user with no open socket (bounded, expiring)."""
+    key = f"offline:{user_id}"
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.rpush(key, json.dumps(obj))
+        pipe.ltrim(key, -settings.CHAT_OFFLINE_MAX, -1)
+        pipe.expire(key, settings.CHAT_OFFLINE_TTL)
+        await pipe.execute()
+
+async def pop_offline_messages(user_id: str) -> List[dict]:
+    """Atomically take every queued offline frame of a user, oldest first."""
+    key = f"offline:{user_id}"
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.lrange(key, 0, -1)
+        pipe.delete(key)
+        entries, _ = await pipe.execute()
+    return [json.loads(e) for e in entries]
 
 async def get_messages_from_cache(room_id: str) -> List[dict]:
     """
-    Get all cached chat messages for a room.
+    Get all cached (not yet flushed) chat messages for a room, oldest first.
+    """
+    entries = await redis_client.xrange(chat_stream_key(room_id))
+    return [decode_stream_entry(entry_id, fields) for entry_id, fields in entries]
+
+async def get_cached_page(
+    room_id: str, topic: str, before: Optional[str] = None, limit: int = 50
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Newest-first page of not-yet-flushed messages on `topic` with stream id < `before`
+    (the whole buffer when None). Reads the stream tail in chunks of `limit`, at most
+    CHAT_HISTORY_SCAN_CHUNKS of them, so a room busy on other topics cannot make one
+    request walk the whole buffer: the page may then come back short (even empty).
+    Returns (messages, next_before); next_before is None once the buffer is exhausted.
     """
-    messages = await redis_client.lrange(f"chat:{room_id}", 0, -1)
-    return [json.loads(msg) for msg in messages]
+    key = chat_stream_key(room_id)
+    topic = (topic or "general").lower()
+    page: List[dict] = []
+    upper = f"({before}" if before else "+"
+    for _ in range(max(1, settings.CHAT_HISTORY_SCAN_CHUNKS)):
+        chunk = await redis_client.xrevrange(key, max=upper, min="-", count=limit)
+        for entry_id, fields in chunk:
+            msg = decode_stream_entry(entry_id, fields)
+            if (msg.get("topic") or "general").lower() != topic:
+                continue
+            page.append(msg)
+            if len(page) == limit:
+                return page, entry_id
+        if len(chunk) < limit:
+            return page, None
+        upper = f"({chunk[-1][0]}"
+    # scan budget spent: resume below the last entry read
+    return page, chunk[-1][0]
 
 async def clear_room_cache(room_id: str):
     """
     Delete cached messages for a room.
     """
-    await redis_client.delete(f"chat:{room_id}")
+    await redis_client.delete(chat_stream_key(room_id))
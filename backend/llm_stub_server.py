@@ -0,0 +1,240 @@
+# llm_stub_server.py
+"""
+Local OpenAI-compatible stand-in for the LLM provider, for load tests and offline runs.
+
+Run it and point the backend at it:
+    STUB_MODE=synthetic uvicorn llm_stub_server:app --port 8100
+    LLM_BASE_URL=http://127.0.0.1:8100/v1   (in the backend .env)
+
+Modes (STUB_MODE):
+- synthetic: answer every prompt with a deterministic "NN.NN%" derived from the prompt
+- record:    forward to the real provider (STUB_UPSTREAM_URL / STUB_UPSTREAM_KEY) once and
+             append the prompt/response pair to STUB_FIXTURES (JSONL)
+- replay:    answer from STUB_FIXTURES; misses fall back to synthetic or, with
+             STUB_REPLAY_MISS=error, return 404 so gaps in the fixture set are visible
+
+Behaviour knobs (all optional):
+- STUB_LATENCY=fixed|uniform|normal|lognormal, STUB_LATENCY_MS (median), STUB_LATENCY_SPREAD_MS
+- STUB_ERROR_RATE (0..1) and STUB_ERROR_STATUSES (e.g. "429,500,503")
+- STUB_TOKEN_DELAY_MS: delay between streamed chunks when the request has stream=true
+- STUB_SEED: seed for the latency / error RNG so runs are reproducible
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import requests
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("llm_stub_server")
+
+MODE = os.getenv("STUB_MODE", "synthetic").lower()
+FIXTURES_PATH = os.getenv("STUB_FIXTURES", "llm_fixtures.jsonl")
+UPSTREAM_URL = os.getenv("STUB_UPSTREAM_URL", "https://openrouter.ai/api/v1").rstrip("/")
+UPSTREAM_KEY = os.getenv("STUB_UPSTREAM_KEY", "")
+REPLAY_MISS = os.getenv("STUB_REPLAY_MISS", "synthetic").lower()
+
+LATENCY = os.getenv("STUB_LATENCY", "fixed").lower()
+LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "200"))
+LATENCY_SPREAD_MS = float(os.getenv("STUB_LATENCY_SPREAD_MS", "50"))
+ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))
+ERROR_STATUSES = [int(s) for s in os.getenv("STUB_ERROR_STATUSES", "429,500,503").split(",") if s.strip()]
+TOKEN_DELAY_MS = float(os.getenv("STUB_TOKEN_DELAY_MS", "20"))
+
+_rng = random.Random(os.getenv("STUB_SEED"))
+_fixtures: Dict[str, Dict[str, Any]] = {}
+_fixtures_lock = threading.Lock()
+
+app = FastAPI(title="LLM stub server")
+
+
+# ---------------- Fixtures ----------------
+def fixture_key(model: str, messages: List[Dict[str, Any]]) -> str:
+    """Stable key for a prompt: model + messages, independent of sampling options."""
+    raw = json.dumps({"model": model, "messages": messages}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def load_fixtures(path: str) -> None:
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                _fixtures[entry["key"]] = entry
+    logger.info(f"Loaded {len(_fixtures)} fixtures from {path}")
+
+
+def save_fixture(entry: Dict[str, Any]) -> None:
+    with _fixtures_lock:
+        _fixtures[entry["key"]] = entry
+        with open(FIXTURES_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+if MODE in ("record", "replay"):
+    load_fixtures(FIXTURES_PATH)
+
+
+# ---------------- Behaviour ----------------
+def sample_latency_ms() -> float:
+    if LATENCY == "uniform":
+        value = _rng.uniform(LATENCY_MS - LATENCY_SPREAD_MS, LATENCY_MS + LATENCY_SPREAD_MS)
+    elif LATENCY == "normal":
+        value = _rng.gauss(LATENCY_MS, LATENCY_SPREAD_MS)
+    elif LATENCY == "lognormal":
+        # median LATENCY_MS; spread controls the tail
+        sigma = max(LATENCY_SPREAD_MS, 1.0) / max(LATENCY_MS, 1.0)
+        value = _rng.lognormvariate(0, sigma) * LATENCY_MS
+    else:
+        value = LATENCY_MS
+    return max(0.0, value)
+
+
+def synthetic_reply(messages: List[Dict[str, Any]]) -> str:
+    """Deterministic percentage per prompt, in the format the backend parsers expect."""
+    digest = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).digest()
+    value = int.from_bytes(digest[:4], "big") % 10000 / 100
+    return f"{value:.2f}%"
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def record_upstream(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Call the real provider without streaming and return the stored fixture entry."""
+    upstream_body = {k: v for k, v in body.items() if k not in ("stream", "stream_options")}
+    resp = requests.post(
+        f"{UPSTREAM_URL}/chat/completions",
+        headers={"Authorization": f"Bearer {UPSTREAM_KEY}"},
+        json=upstream_body,
+        timeout=120,
+    )
+    resp.raise_for_status()
+    data = resp.json()
+    entry = {
+        "key": fixture_key(body.get("model", ""), body.get("messages", [])),
+        "model": body.get("model", ""),
+        "messages": body.get("messages", []),
+        "response": data["choices"][0]["message"]["content"],
+        "usage": data.get("usage"),
+        "recorded_at": time.time(),
+    }
+    save_fixture(entry)
+    return entry
+
+
+async def resolve_reply(body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return {"content", "usage"} for the request, or None on a replay miss with STUB_REPLAY_MISS=error."""
+    model = body.get("model", "")
+    messages = body.get("messages", [])
+    key = fixture_key(model, messages)
+
+    entry = _fixtures.get(key)
+    if entry is None and MODE == "record":
+        entry = await asyncio.to_thread(record_upstream, body)
+    if entry is not None:
+        return {"content": entry["response"], "usage": entry.get("usage")}
+
+    if MODE == "replay" and REPLAY_MISS == "error":
+        return None
+
+    content = synthetic_reply(messages)
+    prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+    completion_tokens = estimate_tokens(content)
+    return {
+        "content": content,
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+# ---------------- OpenAI-compatible API ----------------
+def _error(status: int, message: str) -> JSONResponse:
+    return JSONResponse(status_code=status, content={"error": {"message": message, "type": "stub_error", "code": status}})
+
+
+def _chunks(text: str, size: int = 4) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "stub"}]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "stub")
+
+    await asyncio.sleep(sample_latency_ms() / 1000)
+
+    if ERROR_RATE and _rng.random() < ERROR_RATE:
+        return _error(_rng.choice(ERROR_STATUSES or [500]), "injected error")
+
+    try:
+        reply = await resolve_reply(body)
+    except Exception as exc:
+        logger.exception(f"Upstream recording failed: {exc}")
+        return _error(502, f"upstream_failed: {exc}")
+    if reply is None:
+        return _error(404, "no fixture recorded for this prompt")
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    if not body.get("stream"):
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply["content"]},
+                "finish_reason": "stop",
+            }],
+            "usage": reply["usage"],
+        }
+
+    include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+    async def event_stream():
+        def frame(choices, usage=None) -> str:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model, "choices": choices}
+            if usage is not None:
+                chunk["usage"] = usage
+            return f"data: {json.dumps(chunk)}\n\n"
+
+        yield frame([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        for piece in _chunks(reply["content"]):
+            await asyncio.sleep(TOKEN_DELAY_MS / 1000)
+            yield frame([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+        yield frame([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if include_usage:
+            yield frame([], usage=reply["usage"])
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("STUB_PORT", "8100")))
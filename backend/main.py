@@ -1,22 +1,26 @@
 # main.py
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 
 # SQLAlchemy Base & engine
-from core.database import engine, Base
+from core.database import engine, async_engine, Base
 
 # Import SQLAlchemy models to register them with Base
 import models  # Ensure your SQLAlchemy models are defined here
 
 # Route modules
-from routes import auth, rag_faiss, socket_connection, conversations
+from routes import auth, rag_faiss, socket_connection, conversations, metrics
 
+from services.db_telemetry import db_telemetry
 from ws.socket_manager import SocketManager
+from ws.job_queue import JobQueue
+from ws.chat_flusher import ChatFlusher
 from ws.handlers.chat import handle_chat
 from ws.handlers.assess import handle_assess
 from ws.handlers.report import handle_report
+from schemas.ws import ChatPayload, AssessPayload, ViewReportPayload
 
 
 # --- FastAPI App Initialization ---
@@ -29,6 +33,21 @@ app = FastAPI(
 # --- Create all tables (only needed if using SQLAlchemy models) ---
 Base.metadata.create_all(bind=engine)
 
+# --- DB instrumentation (query counts / time per route and WS message type, see /metrics) ---
+db_telemetry.instrument(engine, "sync")
+db_telemetry.instrument(async_engine.sync_engine, "async")
+
+
+@app.middleware("http")
+async def db_query_scope(request: Request, call_next):
+    with db_telemetry.scope("http:other") as scope:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if route is not None and hasattr(route, "path"):
+            scope.name = f"http:{request.method} {route.path}"  # route template, not the raw path
+        return response
+
+
 # --- CORS Middleware ---
 app.add_middleware(
     CORSMiddleware,
@@ -40,9 +59,29 @@ app.add_middleware(
 
 
 mgr = SocketManager.instance()
-mgr.register_handler("chat", handle_chat)
-mgr.register_handler("assess", handle_assess)
-mgr.register_handler("view_report", handle_report)
+jobs = JobQueue.instance()
+flusher = ChatFlusher.instance()
+mgr.register_handler("chat", handle_chat, schema=ChatPayload)
+# assess / report run as durable queued jobs; interactive report views go first
+mgr.register_handler("assess", jobs.register("assess", handle_assess, priority=5, schema=AssessPayload),
+                     schema=AssessPayload)
+mgr.register_handler("view_report", jobs.register("view_report", handle_report, priority=1, schema=ViewReportPayload),
+                     schema=ViewReportPayload)
+
+
+@app.on_event("startup")
+async def start_background_workers():
+    await mgr.start_cluster()
+    await jobs.start()
+    await flusher.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await flusher.stop()
+    await jobs.stop()
+    await mgr.stop_cluster()
+    await async_engine.dispose()
 
 
 
@@ -51,6 +90,7 @@ app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(rag_faiss.router, tags=["Matchmaking"])
 app.include_router(socket_connection.router, tags=["WebSocket Chat"])
 app.include_router(conversations.router, tags=["Conversations"])
+app.include_router(metrics.router, tags=["Metrics"])
 #app.include_router(horoscope.router, tags=["Horoscope"])
 
 # --- Static Files (e.g., profile photos) ---
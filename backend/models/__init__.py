@@ -1,6 +1,6 @@
 
 from .user import User
-from .chat import ChatMessage
+from .chat import ChatMessage, ChatEntry, ChatReadState
 from .report import Report
 
-__all__ = ["User", "ChatMessage", "Report"]
\ No newline at end of file
+__all__ = ["User", "ChatMessage", "ChatEntry", "ChatReadState", "Report"]
\ No newline at end of file
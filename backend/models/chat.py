@@ -11,8 +11,47 @@ class ChatMessage(Base):
     user2_id = sa.Column(sa.BigInteger, sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     topic = sa.Column(sa.String(200), nullable=True)
     messages = sa.Column(JSONB, default=[])
+    last_sentiment_seq = sa.Column(sa.BigInteger, nullable=True)  # highest pair seq of this topic scored by assess
+    last_sentiment_at = sa.Column(sa.TIMESTAMP(timezone=True), nullable=True)  # newest message of this topic scored by assess
     created_at = sa.Column(sa.TIMESTAMP(timezone=True), server_default=func.now())
     updated_at = sa.Column(sa.TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
     __table_args__ = (
         sa.Index("ix_chat", sa.text("LEAST(user1_id, user2_id)"), sa.text("GREATEST(user1_id, user2_id)"), sa.text("lower(topic)"), unique=True),
     )
+
+
+class ChatEntry(Base):
+    """
+    One chat message, append-only. Keyed by the ordered user pair and a per-pair
+    sequence number; `chat_id` points at the (pair, topic) conversation header in `chat`.
+    """
+    __tablename__ = "chat_messages"
+    user1_id = sa.Column(sa.BigInteger, primary_key=True)  # LEAST of the pair
+    user2_id = sa.Column(sa.BigInteger, primary_key=True)  # GREATEST of the pair
+    seq = sa.Column(sa.BigInteger, primary_key=True)
+    chat_id = sa.Column(sa.BigInteger, sa.ForeignKey("chat.id", ondelete="CASCADE"), nullable=False)
+    sender_id = sa.Column(sa.BigInteger, nullable=True)
+    text = sa.Column(sa.Text, nullable=False)
+    sent_at = sa.Column(sa.TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    __table_args__ = (
+        sa.Index("ix_chat_messages_chat_seq", "chat_id", "seq"),
+        sa.Index("ix_chat_messages_chat_sent_at", "chat_id", "sent_at"),
+        sa.Index("ix_chat_messages_user2", "user2_id", "user1_id"),
+    )
+
+
+class ChatReadState(Base):
+    """
+    Per-user view of a conversation pair: how far the pair's messages go (`last_seq`,
+    `last_message_at`) and how far the user has read (`last_read_seq`). Two rows per
+    pair, one per participant, so a user's inbox is an index range on (user_id, last_message_at).
+    """
+    __tablename__ = "chat_read_state"
+    user_id = sa.Column(sa.BigInteger, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    peer_id = sa.Column(sa.BigInteger, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    last_seq = sa.Column(sa.BigInteger, nullable=False, server_default="0")
+    last_read_seq = sa.Column(sa.BigInteger, nullable=False, server_default="0")
+    last_message_at = sa.Column(sa.TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    __table_args__ = (
+        sa.Index("ix_chat_read_state_inbox", "user_id", "last_message_at", "peer_id"),
+    )
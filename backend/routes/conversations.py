@@ -1,23 +1,142 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
 
-from schemas import ConversationItem
-from utils.chat_utils import fetch_conversations
-from .deps import get_db, get_user_id
+from core.redis import get_cached_page
+from schemas import ConversationItem, ConversationPage, ChatHistoryPage
+from utils.chat_utils import fetch_conversations, get_history_page, mark_conversation_read
+from utils.helpers import ordered_pair
+from .deps import get_async_db, get_user_id
 
 router = APIRouter(tags=["Conversations"])
 
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _encode_inbox_cursor(item: dict) -> str:
+    """'<last_message_at as epoch microseconds>:<peer id>' of the last item of a page."""
+    micros = (item["last_message_at"] - _EPOCH) // timedelta(microseconds=1)
+    return f"{micros}:{item['id']}"
+
+
+def _parse_inbox_cursor(cursor: Optional[str]):
+    if not cursor:
+        return None
+    micros, _, peer_id = cursor.partition(":")
+    try:
+        return _EPOCH + timedelta(microseconds=int(micros)), int(peer_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/conversations", response_model=ConversationPage)
+async def conversations_route(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Conversations of the logged-in user, most recently active first, with the peer's
+    name and photo, the topic and a snippet of the last message, and the unread count.
+    Pass `next_cursor` back as `cursor` for the next page.
+    """
+    rows, has_more = await db.run_sync(fetch_conversations, int(user_id), _parse_inbox_cursor(cursor), limit)
+    return {
+        "items": [ConversationItem.from_raw(item) for item in rows],
+        "next_cursor": _encode_inbox_cursor(rows[-1]) if has_more and rows else None,
+    }
+
+
 @router.get("/fetch_conversations", response_model=List[ConversationItem])
-def fetch_conversations_route(
+async def fetch_conversations_route(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
     user_id: str = Depends(get_user_id),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Fetch recent conversations for the logged-in user.
-    Returns a list of ConversationItem objects.
+    Returns a list of ConversationItem objects (one page; see /conversations for the cursor).
+    """
+    rows, _ = await db.run_sync(fetch_conversations, int(user_id), _parse_inbox_cursor(cursor), limit)
+    return [ConversationItem.from_raw(item) for item in rows]
+
+
+@router.post("/mark_read")
+async def mark_read_route(
+    partner_id: int,
+    seq: Optional[int] = Query(None, ge=0),
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Mark the conversation with the partner as read up to `seq` (default: everything persisted)."""
+    last_read_seq = await db.run_sync(mark_conversation_read, int(user_id), partner_id, seq)
+    return {"partner_id": partner_id, "last_read_seq": last_read_seq}
+
+
+def _parse_cursor(cursor: Optional[str]):
+    """
+    Cursor is 'buf:<stream id>:<seq>' (still in the Redis buffer; seq is the lowest one
+    already returned) or 'seq:<seq>' (persisted). Returns (kind, position, seq bound).
+    """
+    if not cursor:
+        return "buf", None, None
+    kind, _, value = cursor.partition(":")
+    try:
+        if kind == "buf":
+            position, _, seq = value.partition(":")
+            return kind, position or None, int(seq) if seq else None
+        if kind == "seq":
+            return kind, int(value) if value else None, None
+    except ValueError:
+        pass
+    raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/chat_history", response_model=ChatHistoryPage)
+async def chat_history_route(
+    partner_id: int,
+    topic: str = "general",
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_async_db),
+):
     """
-    user_id_int = int(user_id)
-    raw_list = fetch_conversations(db, user_id_int)
-    return [ConversationItem.from_raw(item) for item in raw_list]
+    Conversation history with the partner, newest first, one page at a time.
+    Messages still buffered in Redis (newest) come first, then persisted ones via
+    keyset pagination on seq. Pass `next_cursor` back as `cursor` for older messages.
+    A message committed by the flusher but not yet removed from the buffer is
+    returned once, by seq: persisted rows continue below the lowest buffered seq.
+    A page may hold fewer than `limit` messages while the buffer is being scanned;
+    keep following `next_cursor` until it is null.
+    """
+    u1, u2 = ordered_pair(int(user_id), partner_id)
+    kind, position, below_seq = _parse_cursor(cursor)
+    messages = []
+
+    if kind == "buf":
+        pending, buffer_next = await get_cached_page(f"{u1}_{u2}", topic, position, limit)
+        messages.extend({
+            "seq": m.get("seq"),
+            "id": m.get("id"),
+            "sender": str(m["sender"]) if m.get("sender") is not None else None,
+            "text": m.get("text", ""),
+            "timestamp": m.get("ts") or m.get("timestamp"),
+            "pending": True,
+        } for m in pending)
+        seqs = [m["seq"] for m in messages if m["seq"] is not None]
+        if seqs:
+            below_seq = min(seqs + ([below_seq] if below_seq is not None else []))
+        if buffer_next is not None:
+            bound = f":{below_seq}" if below_seq is not None else ""
+            return {"messages": messages, "next_cursor": f"buf:{buffer_next}{bound}"}
+        position = below_seq
+
+    rows, has_more = await db.run_sync(get_history_page, u1, u2, topic, position, limit - len(messages))
+    messages.extend(rows)
+    next_cursor = f"seq:{rows[-1]['seq']}" if has_more and rows else None
+    return {"messages": messages, "next_cursor": next_cursor}
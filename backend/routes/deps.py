@@ -1,14 +1,19 @@
 # routes/deps.py
-from typing import Optional, Generator
+from typing import Optional, Generator, AsyncGenerator
 from fastapi import Depends, HTTPException, Header, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from core.database import get_db as _get_db
+from core.database import get_db as _get_db, get_async_db as _get_async_db
 from core.security import decode_token
 
 # re-export DB dependency
 def get_db() -> Generator[Session, None, None]:
     yield from _get_db()
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async for db in _get_async_db():
+        yield db
+
 # --- Extract User ID from Token ---
 async def get_user_id(
     authorization: Optional[str] = Header(None),
@@ -0,0 +1,43 @@
+# routes/metrics.py
+from fastapi import APIRouter, HTTPException, status
+
+from core.config import get_settings
+
+from services.db_telemetry import db_telemetry
+from services.llm_api import resilience_snapshot
+from services.llm_telemetry import telemetry
+from utils.profile_cache import ProfileCache
+from ws.job_queue import JobQueue
+from ws.chat_flusher import ChatFlusher
+from ws.socket_manager import SocketManager
+
+router = APIRouter(tags=["Metrics"])
+settings = get_settings()
+
+
+@router.get("/metrics")
+async def metrics(detail: bool = False):
+    """
+    In-process runtime metrics for this worker.
+    - llm.features: per-feature call counts, token usage, cost and latency histograms
+    - llm.resilience: limiter / circuit breaker state and counters
+    - jobs: queue depth (shared) and jobs running in this worker
+    - chat_flush: rooms pending flush, flush lag and batch size histograms
+    - profile_cache: profile snapshot cache hits / misses
+    - db: per route / message type query count and DB time, slow and N+1 counts, pool gauges
+    - websockets: connections, rooms and a send queue depth histogram; `detail=true` adds
+      per-connection stats (with user ids) and needs METRICS_CONNECTION_DETAIL
+    """
+    if detail and not settings.METRICS_CONNECTION_DETAIL:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Connection detail is disabled")
+    return {
+        "llm": {
+            "features": telemetry.snapshot(),
+            "resilience": resilience_snapshot(),
+        },
+        "jobs": await JobQueue.instance().stats(),
+        "chat_flush": await ChatFlusher.instance().stats(),
+        "db": db_telemetry.snapshot(),
+        "profile_cache": ProfileCache.instance().stats(),
+        "websockets": SocketManager.instance().connection_stats(detail=detail),
+    }
@@ -3,10 +3,10 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from .deps import get_db, get_user_id
-from utils.profile_utils import load_profiles, find_profile_by_id
+from utils.profile_utils import load_profiles, get_profile
 from services.rag_engine import get_best_matches, rebuild_faiss
 from models import User
-from schemas import MatchResponse, UserOut  # adjust import if needed
+from schemas import MatchResponse  # adjust import if needed
 
 router = APIRouter(tags=["Matchmaking"])
 
@@ -22,11 +22,7 @@ async def recommend_matches(
     """
 
     # Step 1: Get profile of the logged-in user
-    user_obj = find_profile_by_id(db, user_id)
-    if not user_obj:
-        raise HTTPException(status_code=404, detail="User profile not found")
-
-    user_profile = UserOut.model_validate(user_obj)
+    user_profile = get_profile(db, user_id)
 
     print("DEBUG: user exists?", user_profile, flush=True)
     if not user_profile:
@@ -5,6 +5,8 @@ import logging
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
 
 from ws.socket_manager import SocketManager
+from ws.codec import negotiate
+from ws.chat_replay import replay_missed
 from .deps import get_user_id, get_exp_token
 
 router = APIRouter()
@@ -35,11 +37,20 @@ def _extract_token_from_headers(websocket: WebSocket) -> Optional[str]:
 
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, token: Optional[str] = Query(None)):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None),
+    codec: Optional[str] = Query(None),
+    resume: Optional[str] = Query(None),
+):
     """
     WebSocket endpoint that authenticates a user using a bearer token supplied either
     as ?token=<token> or via an Authorization header. On success the connection is
     accepted and registered with SocketManager; incoming messages are dispatched.
+    The wire format defaults to JSON text frames; clients may opt into MessagePack
+    with ?codec=msgpack or the `matrimai.msgpack` subprotocol.
+    After a reconnect, ?resume=<room_id>:<last seq>,... replays missed chat messages
+    (together with anything queued while the user was offline) in one frame.
     """
     
 
@@ -85,9 +96,10 @@ async def websocket_endpoint(websocket: WebSocket, token: Optional[str] = Query(
     user_id = str(user_id)
     logger.info("WebSocket authenticated for user_id=%s", user_id)
 
-    # 3) Accept and register the connection
+    # 3) Negotiate the wire format, accept and register the connection
+    wire_codec, subprotocol = negotiate(websocket, codec)
     try:
-        await websocket.accept()
+        await websocket.accept(subprotocol=subprotocol)
     except Exception as exc:
         logger.exception("Failed to accept websocket for user %s: %s", user_id, exc)
         try:
@@ -97,7 +109,7 @@ async def websocket_endpoint(websocket: WebSocket, token: Optional[str] = Query(
         return
 
     try:
-        await manager.register_connection(user_id, websocket)
+        await manager.register_connection(user_id, websocket, codec=wire_codec)
     except Exception as exc:
         logger.exception("Failed to register websocket for user %s: %s", user_id, exc)
         try:
@@ -109,14 +121,23 @@ async def websocket_endpoint(websocket: WebSocket, token: Optional[str] = Query(
     # Build context for handlers — token_exp is an integer unix timestamp (as returned by deps)
     ctx = {"user_id": user_id, "claims": None, "token_exp": token_exp}
 
+    # Catch up: missed messages for resumed rooms + the offline queue, in one frame
+    try:
+        await replay_missed(manager, websocket, user_id, resume)
+    except Exception:
+        logger.exception("Replay of missed messages failed for user %s", user_id)
+
     # 4) Read loop and dispatch
     try:
         while True:
-            raw_text = await websocket.receive_text()
-            if raw_text is None:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            raw = message.get("text") if message.get("text") is not None else message.get("bytes")
+            if raw is None:
                 continue
             # dispatch_raw is async; manager will handle exceptions in handler execution
-            await manager.dispatch_raw(websocket, raw_text, ctx)
+            await manager.dispatch_raw(websocket, raw, ctx)
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected for user %s", user_id)
         try:
@@ -1,10 +1,11 @@
 
 
-from .user import LoginRequest, SignupRequest, Preferences, UserOut
+from .user import LoginRequest, SignupRequest, Preferences, UserOut, ProfileSnapshot
 from .report import AssessRequest, ReportResponse, UpdateReportRequest, ViewReportRequest
 from .horoscope import HoroscopeRequest
 from .match import MatchRequest, MatchResponse
-from .chat import ConversationItem
+from .chat import ConversationItem, ConversationPage, HistoryMessage, ChatHistoryPage
+from .ws import ChatPayload, AssessPayload, ViewReportPayload
 
 __all__ = [
     "Preferences",
@@ -18,5 +19,12 @@ __all__ = [
     "MatchRequest",
     "MatchResponse",
     "UserOut",
-    "ConversationItem"
+    "ProfileSnapshot",
+    "ConversationItem",
+    "ConversationPage",
+    "HistoryMessage",
+    "ChatHistoryPage",
+    "ChatPayload",
+    "AssessPayload",
+    "ViewReportPayload",
 ]
\ No newline at end of file
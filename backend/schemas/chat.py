@@ -1,5 +1,5 @@
 # app/schemas/conversation.py
-from typing import Optional, Union
+from typing import List, Optional, Union
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -13,6 +13,10 @@ class ConversationItem(BaseModel):
     user_name: str = Field(..., description="User display name")
     avatar_url: Optional[str] = Field(None, description="Avatar / image URL")
     topic: Optional[str] = Field(None, description="Conversation topic")
+    last_message: Optional[str] = Field(None, description="Snippet of the last persisted message")
+    last_sender: Optional[str] = Field(None, description="Sender user id of the last message")
+    last_message_at: Optional[datetime] = Field(None, description="When the last message was sent")
+    unread_count: int = Field(0, description="Messages from the peer not yet marked read")
 
     @classmethod
     def from_raw(cls, raw: dict):
@@ -24,4 +28,30 @@ class ConversationItem(BaseModel):
             user_name=raw.get("user_name") or raw.get("name") or raw.get("full_name"),
             avatar_url=raw.get("avatar_url") or raw.get("photo_url") or raw.get("image") or raw.get("avatar"),
             topic=raw.get("topic") or raw.get("conversation_topic") or raw.get("last_topic"),
+            last_message=raw.get("last_message"),
+            last_sender=raw.get("last_sender"),
+            last_message_at=raw.get("last_message_at"),
+            unread_count=raw.get("unread_count") or 0,
         )
+
+
+class ConversationPage(BaseModel):
+    """Most-recent-first page of the conversation list; pass `next_cursor` back for the next page."""
+    items: List[ConversationItem]
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page; None on the last page")
+
+
+class HistoryMessage(BaseModel):
+    """A single chat message in a history page; `pending` ones are not yet persisted."""
+    seq: Optional[int] = Field(None, description="Per-pair sequence number (None while pending)")
+    id: Optional[str] = Field(None, description="Redis stream id while pending")
+    sender: Optional[str] = Field(None, description="Sender user id")
+    text: str = Field(..., description="Message text")
+    timestamp: Optional[str] = Field(None, description="ISO timestamp")
+    pending: bool = Field(False, description="Still in the Redis buffer")
+
+
+class ChatHistoryPage(BaseModel):
+    """Newest-first page of a conversation; pass `next_cursor` back to get older messages."""
+    messages: List[HistoryMessage]
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next (older) page; None at the start")
@@ -59,4 +59,13 @@ class UserOut(BaseModel):
 
     model_config = {
         "from_attributes": True
-    } 
+    }
+
+
+class ProfileSnapshot(UserOut):
+    """Immutable copy of a user's public profile, safe to share from the profile cache."""
+    model_config = {
+        "from_attributes": True,
+        "frozen": True,
+    }
+
@@ -0,0 +1,46 @@
+# schemas/ws.py
+from typing import Optional
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field, field_validator
+
+
+class WsPayload(BaseModel):
+    """
+    Base for WebSocket message payloads. Validators are built once per class,
+    so decoding a frame is a single compiled validation instead of ad-hoc dict probing.
+    Free-form ids are accepted as numbers and normalised to strings, user ids are
+    validated as positive integers (numeric strings included); unknown keys are ignored.
+    """
+    model_config = ConfigDict(coerce_numbers_to_str=True, frozen=True, extra="ignore")
+
+
+class ChatPayload(WsPayload):
+    to: Optional[str] = Field(None, validation_alias=AliasChoices("to", "receiver", "recipient"))
+    text: str = ""
+    topic: str = Field("general", validation_alias=AliasChoices("topic", "topic_name"))
+    room_id: Optional[str] = Field(None, validation_alias=AliasChoices("room_id", "room"))
+
+    @field_validator("text", mode="before")
+    @classmethod
+    def _strip_text(cls, v):
+        if v is None:
+            return ""
+        return v.strip() if isinstance(v, str) else v
+
+    @field_validator("topic", mode="before")
+    @classmethod
+    def _default_topic(cls, v):
+        return v or "general"
+
+
+class AssessPayload(WsPayload):
+    partner_id: int = Field(..., gt=0, validation_alias=AliasChoices("partner_id", "partner", "to"))
+    topic: str = "general"
+
+    @field_validator("topic", mode="before")
+    @classmethod
+    def _default_topic(cls, v):
+        return v or "general"
+
+
+class ViewReportPayload(WsPayload):
+    partner_id: int = Field(..., gt=0, validation_alias=AliasChoices("partner_id", "partner", "to"))
@@ -0,0 +1,209 @@
+# services/db_telemetry.py
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from core.config import get_settings
+from services.llm_telemetry import Histogram
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+QUERY_COUNT_BUCKETS: List[float] = [0, 1, 2, 5, 10, 20, 50, 100, 250]
+DB_TIME_BUCKETS_MS: List[float] = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000]
+CHECKOUT_WAIT_BUCKETS_MS: List[float] = [0.1, 1, 5, 10, 50, 100, 500, 1000, 5000]
+
+
+class QueryScope:
+    """Queries run on behalf of one HTTP request / WebSocket message (shared by its child tasks)."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.queries = 0
+        self.db_ms = 0.0
+        self.statements: Counter = Counter()
+
+
+_scope: contextvars.ContextVar[Optional[QueryScope]] = contextvars.ContextVar("db_query_scope", default=None)
+
+
+def _redact(params: Any) -> Any:
+    """Parameter shapes without values: {"email_id": "<str>"}, ("<int>", "<int>"), "<executemany: 40 rows>"."""
+    if isinstance(params, dict):
+        return {k: f"<{type(v).__name__}>" for k, v in params.items()}
+    if isinstance(params, (list, tuple)):
+        if params and isinstance(params[0], (dict, list, tuple)):
+            return f"<executemany: {len(params)} rows>"
+        return tuple(f"<{type(v).__name__}>" for v in params)
+    return params if params is None else f"<{type(params).__name__}>"
+
+
+def _short(statement: str, limit: int = 300) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+
+class _ScopeStats:
+    def __init__(self) -> None:
+        self.scopes = 0
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.db_ms = Histogram(DB_TIME_BUCKETS_MS)
+        self.slow_queries = 0
+        self.n_plus_one = 0
+
+
+class DBTelemetry:
+    """
+    SQLAlchemy event hooks attributing DB work to the HTTP route or WebSocket message
+    type being served (see `scope`):
+    - per-scope histograms of query count and total DB time
+    - slow statements (>= DB_SLOW_QUERY_MS) logged with parameter values redacted
+    - N+1 detection: the same statement run DB_N_PLUS_ONE_THRESHOLD times in one scope
+    - pool gauges (size / checked out / overflow) and a checkout wait histogram per engine
+    """
+
+    def __init__(self) -> None:
+        self._scopes: Dict[str, _ScopeStats] = {}
+        self._engines: Dict[str, Engine] = {}
+        self._checkout_wait: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+        self.unscoped_queries = 0
+
+    # ---------------- Scopes ----------------
+    @contextmanager
+    def scope(self, name: str) -> Iterator[QueryScope]:
+        """Attribute the queries run inside the block (and tasks / threads it starts) to `name`."""
+        current = QueryScope(name)
+        token = _scope.set(current)
+        try:
+            yield current
+        finally:
+            _scope.reset(token)
+            self._finish(current)
+
+    def _finish(self, scope: QueryScope) -> None:
+        with self._lock:
+            stats = self._stats(scope.name)
+            stats.scopes += 1
+            stats.queries.observe(scope.queries)
+            stats.db_ms.observe(scope.db_ms)
+
+    def _stats(self, name: str) -> _ScopeStats:
+        """Stats of a scope name; the caller holds self._lock."""
+        return self._scopes.setdefault(name, _ScopeStats())
+
+    # ---------------- Engine hooks ----------------
+    def instrument(self, engine: Engine, name: str) -> None:
+        """Attach the hooks to a sync Engine (for an AsyncEngine pass `async_engine.sync_engine`)."""
+        if name in self._engines:
+            return
+        self._engines[name] = engine
+        wait = self._checkout_wait[name] = Histogram(CHECKOUT_WAIT_BUCKETS_MS)
+
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+
+        # the pool has no "before checkout" event, so time Pool.connect() itself; dispose()
+        # swaps in a new pool, which is wrapped again from the engine_disposed event
+        self._time_checkouts(engine.pool, wait)
+        event.listen(engine, "engine_disposed", lambda eng: self._time_checkouts(eng.pool, wait))
+
+    def _time_checkouts(self, pool, wait: Histogram) -> None:
+        if getattr(pool, "_checkout_timed", False):
+            return
+        connect = pool.connect
+
+        def _timed_connect():
+            started = time.perf_counter()
+            try:
+                return connect()
+            finally:
+                # called from threadpool threads; Histogram itself is not thread-safe
+                with self._lock:
+                    wait.observe((time.perf_counter() - started) * 1000)
+
+        pool.connect = _timed_connect
+        pool._checkout_timed = True
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @staticmethod
+    def _handle_error(exception_context) -> None:
+        started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+        if started:
+            started.pop()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        elapsed_ms = (time.perf_counter() - conn.info["query_started"].pop()) * 1000
+        scope = _scope.get()
+
+        # scopes are shared with threads started inside them; count under the lock
+        n_plus_one = False
+        with self._lock:
+            if scope is None:
+                self.unscoped_queries += 1
+            else:
+                scope.queries += 1
+                scope.db_ms += elapsed_ms
+                scope.statements[statement] += 1
+                if scope.statements[statement] == settings.DB_N_PLUS_ONE_THRESHOLD:  # flag once per scope
+                    n_plus_one = True
+                    self._stats(scope.name).n_plus_one += 1
+            slow = elapsed_ms >= settings.DB_SLOW_QUERY_MS
+            if slow:
+                name = scope.name if scope else "unscoped"
+                self._stats(name).slow_queries += 1
+
+        if n_plus_one:
+            logger.warning(
+                f"Possible N+1 in {scope.name}: statement ran {settings.DB_N_PLUS_ONE_THRESHOLD} times: "
+                f"{_short(statement)}"
+            )
+        if slow:
+            logger.warning(
+                f"Slow query ({elapsed_ms:.1f} ms) in {name}: {_short(statement)} "
+                f"params={_redact(parameters)}"
+            )
+
+    # ---------------- Introspection ----------------
+    def pool_snapshot(self) -> Dict[str, Any]:
+        pools = {}
+        for name, engine in self._engines.items():
+            pool = engine.pool
+            with self._lock:
+                checkout_wait = self._checkout_wait[name].snapshot()
+            pools[name] = {
+                "size": pool.size() if hasattr(pool, "size") else None,
+                "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+                "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+                "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+                "checkout_wait_ms": checkout_wait,
+            }
+        return pools
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            scopes = {
+                name: {
+                    "count": s.scopes,
+                    "queries": s.queries.snapshot(),
+                    "db_ms": s.db_ms.snapshot(),
+                    "slow_queries": s.slow_queries,
+                    "n_plus_one": s.n_plus_one,
+                }
+                for name, s in self._scopes.items()
+            }
+        return {"scopes": scopes, "unscoped_queries": self.unscoped_queries, "pools": self.pool_snapshot()}
+
+
+db_telemetry = DBTelemetry()
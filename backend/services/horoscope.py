@@ -1,18 +1,20 @@
 import re
 import logging
-from typing import Dict, Optional
+from typing import Dict, Optional, Callable
 from services.llm_api import LLMService
-from models import User
+from schemas import ProfileSnapshot
 
 logger = logging.getLogger(__name__)
 llm = LLMService()
 
 def horoscope_score(
-    user1_data: User,
-    user2_data: User
+    user1_data: ProfileSnapshot,
+    user2_data: ProfileSnapshot,
+    on_token: Optional[Callable[[str], None]] = None,
 ) -> str:
     """
     Query an LLM to compute horoscope compatibility.
+    If `on_token` is given the completion is streamed and each delta is passed to it.
     Returns 'XX.XX %' or 'Invalid result'.
     """
 
@@ -25,7 +27,10 @@ def horoscope_score(
     )
    
     try:
-        result = llm.send_query(prompt).strip()
+        if on_token is not None:
+            result = llm.stream_query(prompt, on_token, tag="horoscope").strip()
+        else:
+            result = llm.send_query(prompt, tag="horoscope").strip()
     except Exception as exc:
         logger.error(f"LLM query failed in horoscope_score: {exc}")
         return "Invalid result"
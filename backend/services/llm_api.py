@@ -1,33 +1,159 @@
 # services/llm_api.py
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+import openai
 from openai import OpenAI
 from core.config import get_settings
+from services.llm_resilience import LLMResilience
+from services.llm_telemetry import telemetry
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+DEGRADED_RESPONSE = "Sorry, something went wrong generating a response."
+
+_RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+def _is_retryable(exc: Exception) -> bool:
+    return isinstance(exc, _RETRYABLE_ERRORS)
+
+
+# Shared by every LLMService instance: the provider's capacity is global, not per caller.
+_resilience = LLMResilience(
+    min_in_flight=settings.LLM_MIN_IN_FLIGHT,
+    max_in_flight=settings.LLM_MAX_IN_FLIGHT,
+    queue_timeout=settings.LLM_QUEUE_TIMEOUT,
+    max_retries=settings.LLM_MAX_RETRIES,
+    base_delay=settings.LLM_RETRY_BASE_DELAY,
+    max_delay=settings.LLM_RETRY_MAX_DELAY,
+    breaker_failures=settings.LLM_BREAKER_FAILURES,
+    breaker_reset=settings.LLM_BREAKER_RESET_SECONDS,
+    cache_size=settings.LLM_CACHE_SIZE,
+    is_retryable=_is_retryable,
+)
+
+# Dedicated threads for blocking LLM work so slow provider calls cannot exhaust the
+# default executor that DB calls (run_in_executor(None, ...)) rely on.
+llm_executor = ThreadPoolExecutor(
+    max_workers=settings.LLM_MAX_IN_FLIGHT * 2,
+    thread_name_prefix="llm",
+)
+
+
+def resilience_snapshot() -> Dict[str, object]:
+    """Current limiter/breaker state and counters of the shared resilience layer."""
+    return _resilience.snapshot()
+
+
 class LLMService:
     """
     Wrapper for OpenAI/OpenRouter chat completion API.
+    Calls go through a shared resilience layer (in-flight limit, retry with jittered
+    backoff, circuit breaker) and fall back to a cached or degraded answer.
     """
     def __init__(self):
         self.client = OpenAI(base_url=settings.LLM_BASE_URL,
-                             api_key=settings.OPENROUTER_API_KEY)
+                             api_key=settings.OPENROUTER_API_KEY,
+                             timeout=settings.LLM_TIMEOUT,
+                             max_retries=0)  # retries are handled by the resilience layer
         self.model = settings.LLM_MODEL
 
-    def send_query(self, prompt: str) -> str:
+    def _record(self, tag: str, started: float, outcome: str, usage=None, ttfb_ms: Optional[float] = None) -> None:
+        telemetry.record(
+            tag=tag,
+            model=self.model,
+            latency_ms=(time.perf_counter() - started) * 1000,
+            outcome=outcome,
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+            ttfb_ms=ttfb_ms,
+        )
+
+    def send_query(self, prompt: str, tag: str = "default") -> str:
         """
         Send a chat completion request. Returns response text or error message.
+        `tag` names the calling feature (e.g. "horoscope", "sentiment") for telemetry.
         """
-        try:
+        started = time.perf_counter()
+        usage = None
+
+        def _call() -> str:
+            nonlocal usage
             completion = self.client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
             )
+            usage = completion.usage
             return completion.choices[0].message.content
-        except Exception as exc:
-            logger.error(f"LLM API error: {exc}")
-            return "Sorry, something went wrong generating a response."
+
+        return _resilience.call(
+            prompt, _call, DEGRADED_RESPONSE,
+            on_outcome=lambda outcome: self._record(tag, started, outcome, usage),
+        )
+
+    def stream_query(
+        self,
+        prompt: str,
+        on_token: Optional[Callable[[str], None]] = None,
+        tag: str = "default",
+    ) -> str:
+        """
+        Streaming variant of send_query. Calls `on_token(delta)` for every content delta as
+        it arrives and returns the full response text (or the same error message as send_query).
+        A failed attempt is only retried if nothing has been streamed yet.
+        Time-to-first-token and total time are logged and recorded under `tag`.
+        """
+        started = time.perf_counter()
+        first_token_at = None
+        usage = None
+
+        def _call() -> str:
+            nonlocal first_token_at, usage
+            parts = []
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                parts.append(delta)
+                if on_token is not None:
+                    try:
+                        on_token(delta)
+                    except Exception as exc:
+                        logger.warning(f"on_token callback failed: {exc}")
+            return "".join(parts)
+
+        def _ttfb_ms() -> Optional[float]:
+            return (first_token_at - started) * 1000 if first_token_at else None
+
+        try:
+            return _resilience.call(
+                prompt, _call, DEGRADED_RESPONSE,
+                retry=lambda: first_token_at is None,
+                on_outcome=lambda outcome: self._record(tag, started, outcome, usage, _ttfb_ms()),
+            )
+        finally:
+            total_ms = (time.perf_counter() - started) * 1000
+            logger.info(f"LLM stream finished: tag={tag}, ttfb_ms={_ttfb_ms()}, total_ms={total_ms:.1f}")
 
 if __name__ == "__main__":
     # Example usage (for local testing)
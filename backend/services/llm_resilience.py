@@ -0,0 +1,277 @@
+# services/llm_resilience.py
+import hashlib
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AdaptiveLimiter:
+    """
+    Thread-safe limit on in-flight LLM calls with AIMD adaptation:
+    - every successful call raises the limit by 1/limit (additive increase)
+    - every overload signal (timeout / 429 / 5xx) halves it (multiplicative decrease)
+    The limit stays within [min_limit, max_limit].
+    """
+
+    def __init__(self, min_limit: int, max_limit: int) -> None:
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self._limit = float(self.max_limit)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self._in_flight += 1
+            return True
+
+    def release(self, overloaded: bool = False) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            if overloaded:
+                self._limit = max(self.min_limit, self._limit / 2)
+            else:
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self._cond.notify_all()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker:
+    - closed: calls pass; `failure_threshold` consecutive failures open it
+    - open: calls are rejected until `reset_timeout` seconds have passed
+    - half_open: a single probe call is let through; success closes, failure re-opens
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, on_transition: Optional[Callable[[str], None]] = None) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._on_transition = on_transition
+
+    def _set_state(self, state: str) -> None:
+        if state != self._state:
+            logger.warning(f"LLM circuit breaker {self._state} -> {state}")
+            self._state = state
+            if self._on_transition:
+                self._on_transition(state)
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._set_state(self.HALF_OPEN)
+            if self._state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            self._set_state(self.CLOSED)
+
+    def release_probe(self) -> None:
+        """Give back a half-open probe slot without recording an outcome."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+
+class ResponseCache:
+    """Small thread-safe LRU of the last good response per prompt, used as a fallback."""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._items: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(prompt: str) -> str:
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+    def get(self, prompt: str) -> Optional[str]:
+        k = self.key(prompt)
+        with self._lock:
+            value = self._items.get(k)
+            if value is not None:
+                self._items.move_to_end(k)
+            return value
+
+    def put(self, prompt: str, value: str) -> None:
+        if self.max_size <= 0:
+            return
+        k = self.key(prompt)
+        with self._lock:
+            self._items[k] = value
+            self._items.move_to_end(k)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+class LLMResilience:
+    """
+    Resilience layer shared by all LLMService instances:
+    adaptive in-flight limit -> circuit breaker -> jittered exponential retry,
+    with a cached (or caller-supplied degraded) answer when the call cannot succeed.
+    """
+
+    def __init__(
+        self,
+        min_in_flight: int,
+        max_in_flight: int,
+        queue_timeout: float,
+        max_retries: int,
+        base_delay: float,
+        max_delay: float,
+        breaker_failures: int,
+        breaker_reset: float,
+        cache_size: int,
+        is_retryable: Callable[[Exception], bool],
+    ) -> None:
+        self.limiter = AdaptiveLimiter(min_in_flight, max_in_flight)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset, on_transition=self._count_transition)
+        self.cache = ResponseCache(cache_size)
+        self.queue_timeout = queue_timeout
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.is_retryable = is_retryable
+        self._metrics: Dict[str, int] = {
+            "calls": 0, "successes": 0, "failures": 0, "retries": 0,
+            "rejected_limiter": 0, "rejected_breaker": 0,
+            "fallback_cached": 0, "fallback_degraded": 0,
+            "breaker_opened": 0, "breaker_half_open": 0, "breaker_closed": 0,
+        }
+        self._metrics_lock = threading.Lock()
+
+    def _incr(self, name: str, n: int = 1) -> None:
+        with self._metrics_lock:
+            self._metrics[name] = self._metrics.get(name, 0) + n
+
+    def _count_transition(self, state: str) -> None:
+        self._incr({"open": "breaker_opened", "half_open": "breaker_half_open", "closed": "breaker_closed"}[state])
+
+    def _backoff(self, attempt: int) -> float:
+        # "full jitter": uniform in [0, min(max_delay, base * 2^attempt)]
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(
+        self,
+        prompt: str,
+        fn: Callable[[], T],
+        degraded: T,
+        retry: Callable[[], bool] = lambda: True,
+        on_outcome: Optional[Callable[[str], None]] = None,
+    ) -> T:
+        """
+        Run `fn()` for `prompt` under the limiter/breaker/retry policy.
+        `retry()` is consulted before each retry (streaming callers refuse once output was sent).
+        `on_outcome` receives "success", "error", "breaker_open" or "limiter_full".
+        Returns the provider result, else the cached answer for the prompt, else `degraded`.
+        """
+        report = on_outcome or (lambda outcome: None)
+        self._incr("calls")
+
+        if not self.breaker.allow():
+            self._incr("rejected_breaker")
+            report("breaker_open")
+            return self._fallback(prompt, degraded, "circuit open")
+
+        if not self.limiter.acquire(self.queue_timeout):
+            self._incr("rejected_limiter")
+            # not the provider's fault: give the half-open probe slot back without judging it
+            self.breaker.release_probe()
+            report("limiter_full")
+            return self._fallback(prompt, degraded, "in-flight limit reached")
+
+        overloaded = False
+        try:
+            attempt = 0
+            while True:
+                try:
+                    result = fn()
+                except Exception as exc:
+                    retryable = self.is_retryable(exc)
+                    overloaded = overloaded or retryable
+                    if retryable and attempt < self.max_retries and retry():
+                        delay = self._backoff(attempt)
+                        attempt += 1
+                        self._incr("retries")
+                        logger.warning(f"LLM call failed ({exc}); retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                        time.sleep(delay)
+                        continue
+                    self._incr("failures")
+                    self.breaker.record_failure()
+                    logger.error(f"LLM API error: {exc}")
+                    report("error")
+                    return self._fallback(prompt, degraded, str(exc))
+
+                self._incr("successes")
+                self.breaker.record_success()
+                self.cache.put(prompt, result)
+                report("success")
+                return result
+        finally:
+            self.limiter.release(overloaded=overloaded)
+
+    def _fallback(self, prompt: str, degraded: T, reason: str) -> T:
+        cached = self.cache.get(prompt)
+        if cached is not None:
+            self._incr("fallback_cached")
+            logger.warning(f"LLM fallback to cached answer: {reason}")
+            return cached
+        self._incr("fallback_degraded")
+        logger.warning(f"LLM fallback to degraded answer: {reason}")
+        return degraded
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._metrics_lock:
+            counters = dict(self._metrics)
+        return {
+            "breaker_state": self.breaker.state,
+            "in_flight": self.limiter.in_flight,
+            "in_flight_limit": self.limiter.limit,
+            **counters,
+        }
@@ -0,0 +1,145 @@
+# services/llm_telemetry.py
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional
+
+from core.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Latency bucket upper bounds in milliseconds (last bucket is +Inf)
+LATENCY_BUCKETS_MS: List[float] = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+
+class Histogram:
+    """Fixed-bucket histogram (Prometheus style) with approximate quantiles."""
+
+    def __init__(self, bounds: List[float]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th observation (None if empty / +Inf)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else None
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 1),
+            "avg": round(self.total / self.count, 1) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {
+                **{f"le_{b:g}": c for b, c in zip(self.bounds, self.counts)},
+                "le_inf": self.counts[-1],
+            },
+        }
+
+
+class _FeatureStats:
+    def __init__(self) -> None:
+        self.outcomes: Dict[str, int] = {}
+        self.models: Dict[str, int] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.latency = Histogram(LATENCY_BUCKETS_MS)
+        self.ttfb = Histogram(LATENCY_BUCKETS_MS)
+
+
+class LLMTelemetry:
+    """
+    In-process aggregation of LLM call metadata per caller tag (feature):
+    outcome counts, token usage, estimated cost and latency / TTFB histograms.
+    Every call is optionally appended to a JSONL trace file (LLM_TRACE_PATH).
+    """
+
+    def __init__(self, trace_path: Optional[str] = None) -> None:
+        self._features: Dict[str, _FeatureStats] = {}
+        self._lock = threading.Lock()
+        self._trace_path = trace_path
+        self._trace_lock = threading.Lock()
+
+    def record(
+        self,
+        tag: str,
+        model: str,
+        latency_ms: float,
+        outcome: str,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+        ttfb_ms: Optional[float] = None,
+    ) -> None:
+        cost = (
+            (prompt_tokens or 0) / 1000 * settings.LLM_PROMPT_COST_PER_1K
+            + (completion_tokens or 0) / 1000 * settings.LLM_COMPLETION_COST_PER_1K
+        )
+        with self._lock:
+            stats = self._features.setdefault(tag, _FeatureStats())
+            stats.outcomes[outcome] = stats.outcomes.get(outcome, 0) + 1
+            stats.models[model] = stats.models.get(model, 0) + 1
+            stats.prompt_tokens += prompt_tokens or 0
+            stats.completion_tokens += completion_tokens or 0
+            stats.cost_usd += cost
+            stats.latency.observe(latency_ms)
+            if ttfb_ms is not None:
+                stats.ttfb.observe(ttfb_ms)
+
+        if self._trace_path:
+            self._write_trace({
+                "ts": time.time(),
+                "tag": tag,
+                "model": model,
+                "outcome": outcome,
+                "latency_ms": round(latency_ms, 1),
+                "ttfb_ms": round(ttfb_ms, 1) if ttfb_ms is not None else None,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cost_usd": round(cost, 6),
+            })
+
+    def _write_trace(self, entry: Dict[str, Any]) -> None:
+        try:
+            with self._trace_lock, open(self._trace_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as exc:
+            logger.warning(f"Failed to write LLM trace to {self._trace_path}: {exc}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                tag: {
+                    "calls": sum(s.outcomes.values()),
+                    "outcomes": dict(s.outcomes),
+                    "models": dict(s.models),
+                    "prompt_tokens": s.prompt_tokens,
+                    "completion_tokens": s.completion_tokens,
+                    "cost_usd": round(s.cost_usd, 6),
+                    "latency_ms": s.latency.snapshot(),
+                    "ttfb_ms": s.ttfb.snapshot(),
+                }
+                for tag, s in self._features.items()
+            }
+
+
+telemetry = LLMTelemetry(trace_path=settings.LLM_TRACE_PATH)
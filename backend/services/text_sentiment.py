@@ -1,12 +1,46 @@
 # services/text_sentiment.py
-from services.llm_api import LLMService
+from services.llm_api import LLMService, llm_executor
+from core.config import get_settings
 import re
+import asyncio
+import logging
+from decimal import Decimal
+from typing import Optional, List, Dict, Any, Callable
 
+try:  # exact token counts when tiktoken is installed, otherwise a ~4 chars/token estimate
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
 llm = LLMService()
 
-def analyze_text(text: str, topic: str) -> str:
+
+def _carried_state(prior_score: Optional[Decimal], prior_count: int) -> str:
+    """Compact summary of earlier assessments, prepended when only new messages are sent."""
+    if prior_score is None or not prior_count:
+        return ""
+    return (
+        f"Previous assessments: {prior_count} earlier scoring(s) of this couple averaged {prior_score}%.\n"
+        "The conversation below contains ONLY the messages exchanged since then. "
+        "Score these new messages, using the previous average as context for the trend.\n"
+    )
+
+
+def analyze_text(
+    text: str,
+    topic: str,
+    prior_score: Optional[Decimal] = None,
+    prior_count: int = 0,
+    on_token: Optional[Callable[[str], None]] = None,
+) -> str:
     """
     Analyze a conversation using the Gottman Method to determine compatibility score.
+    When `prior_score`/`prior_count` are given, `text` is treated as the new messages
+    since the last assessment and the carried-over state is included in the prompt.
+    If `on_token` is given the completion is streamed and each delta is passed to it.
     Returns the score as "XX.XX %" or "Invalid result".
     """
     prompt = f"""
@@ -29,13 +63,129 @@ Important Instructions:
 - Evaluate the tone, patterns, and content of the conversation.
 - ONLY RETURN the number in the format XX.XX% (example: 57.32%). Do NOT include any text, explanation, tables, or markdown.\n"
 
+{_carried_state(prior_score, prior_count)}
 Conversation topic: {topic}
 Conversation: {text}
 """
-    result = llm.send_query(prompt).strip()
+    if on_token is not None:
+        result = llm.stream_query(prompt, on_token, tag="sentiment").strip()
+    else:
+        result = llm.send_query(prompt, tag="sentiment").strip()
     match = re.search(r"(\d+(?:\.\d+)?)\s*%?", result)
     if match:
         value = float(match.group(1))
         if 0 <= value <= 100:
             return f"{value:.2f} %"
     return "Invalid result"
+
+
+# ---------------- Chunked (map-reduce) scoring ----------------
+def count_tokens(text: str) -> int:
+    """Token count of `text` for the prompt budget (tiktoken if available, else estimate)."""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def _split_oversized(line: str, max_tokens: int) -> List[str]:
+    """Split a single message that alone exceeds the budget into budget-sized pieces."""
+    if _encoding is not None:
+        tokens = _encoding.encode(line)
+        return [_encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+    step = max_tokens * 4
+    return [line[i:i + step] for i in range(0, len(line), step)]
+
+
+def chunk_messages(messages: List[Dict[str, Any]], max_tokens: int) -> List[str]:
+    """
+    Split a conversation into chunks of at most `max_tokens`, breaking only on message
+    boundaries (a single message larger than the budget is split on its own).
+    Each message is rendered as "<sender>: <text>" on its own line.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    for msg in messages:
+        text = (msg.get("text") or "").strip()
+        if not text:
+            continue
+        line = f"{msg.get('sender', 'unknown')}: {text}"
+        line_tokens = count_tokens(line) + 1
+
+        if line_tokens > max_tokens:
+            pieces = _split_oversized(line, max_tokens)
+        else:
+            pieces = [line]
+
+        for piece in pieces:
+            piece_tokens = line_tokens if len(pieces) == 1 else count_tokens(piece) + 1
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _parse_score(result: str) -> Optional[float]:
+    match = re.search(r"(\d+(?:\.\d+)?)", result or "")
+    return float(match.group(1)) if match else None
+
+
+async def analyze_conversation(
+    messages: List[Dict[str, Any]],
+    topic: str,
+    prior_score: Optional[Decimal] = None,
+    prior_count: int = 0,
+    on_token: Optional[Callable[[str], None]] = None,
+    on_partial: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> str:
+    """
+    Score a conversation of any length without exceeding the prompt budget.
+    - Map: split into SENTIMENT_CHUNK_TOKENS-sized chunks and score them concurrently on
+      the shared llm_executor, at most SENTIMENT_MAX_CONCURRENCY at a time
+    - Reduce: average the valid chunk scores weighted by chunk token count
+    Progress: a single chunk streams its tokens to `on_token`; with several chunks each
+    finished chunk is reported to `on_partial` as {"chunk", "chunks", "score"}.
+    Returns "XX.XX %" or "Invalid result", like analyze_text.
+    """
+    chunks = chunk_messages(messages, settings.SENTIMENT_CHUNK_TOKENS)
+    if not chunks:
+        return "Invalid result"
+    loop = asyncio.get_running_loop()
+    if len(chunks) == 1:
+        return await loop.run_in_executor(
+            llm_executor, analyze_text, chunks[0], topic, prior_score, prior_count, on_token
+        )
+
+    slots = asyncio.Semaphore(max(1, settings.SENTIMENT_MAX_CONCURRENCY))
+
+    async def _score_chunk(index: int) -> str:
+        async with slots:
+            result = await loop.run_in_executor(
+                llm_executor, analyze_text, chunks[index], topic, prior_score, prior_count
+            )
+        if on_partial is not None:
+            on_partial({"chunk": index + 1, "chunks": len(chunks), "score": result})
+        return result
+
+    results = await asyncio.gather(*(_score_chunk(i) for i in range(len(chunks))))
+
+    weighted_sum = 0.0
+    total_weight = 0
+    for chunk, result in zip(chunks, results):
+        value = _parse_score(result) if result != "Invalid result" else None
+        if value is None:
+            continue
+        weight = count_tokens(chunk)
+        weighted_sum += value * weight
+        total_weight += weight
+
+    logger.info(f"Scored {len(chunks)} chunks, {sum(r != 'Invalid result' for r in results)} valid")
+    if not total_weight:
+        return "Invalid result"
+    return f"{weighted_sum / total_weight:.2f} %"
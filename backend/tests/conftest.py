@@ -0,0 +1,124 @@
+# tests/conftest.py
+import asyncio
+import os
+import sys
+
+import pytest
+
+# modules import each other from the backend root (e.g. `from utils.helpers import ...`);
+# settings come from backend/.env as for the app itself
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy as sa  # noqa: E402
+from sqlalchemy.dialects.postgresql import JSONB  # noqa: E402
+from sqlalchemy.ext.compiler import compiles  # noqa: E402
+
+
+# the models are Postgres-only; render them for an in-memory SQLite database
+@compiles(JSONB, "sqlite")
+def _jsonb_on_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+@compiles(sa.BigInteger, "sqlite")
+def _bigint_on_sqlite(type_, compiler, **kw):
+    return "INTEGER"  # so BIGINT primary keys autoincrement as rowid aliases
+
+
+def _greatest(*values):
+    present = [v for v in values if v is not None]
+    return max(present) if present else None
+
+
+def _least(*values):
+    present = [v for v in values if v is not None]
+    return min(present) if present else None
+
+
+def _make_sqlite_engine(url: str, **kw):
+    """SQLite engine with GREATEST/LEAST, enforced foreign keys and users 1, 2 and 3."""
+    engine = sa.create_engine(url, **kw)
+
+    @sa.event.listens_for(engine, "connect")
+    def _register_functions(dbapi_conn, _):
+        dbapi_conn.create_function("greatest", -1, _greatest, deterministic=True)
+        dbapi_conn.create_function("least", -1, _least, deterministic=True)
+        dbapi_conn.execute("PRAGMA foreign_keys=ON")
+
+    # only the ids matter to the foreign keys of the tables under test
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE users (id INTEGER PRIMARY KEY)")
+        conn.exec_driver_sql("INSERT INTO users (id) VALUES (1), (2), (3)")
+    return engine
+
+
+@pytest.fixture()
+def sqlite_engine():
+    """In-memory SQLite with GREATEST/LEAST, enforced foreign keys and users 1, 2 and 3."""
+    engine = _make_sqlite_engine("sqlite://")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture()
+def sqlite_file_engine(tmp_path):
+    """As sqlite_engine, but file-backed so several threads can each hold a connection."""
+    engine = _make_sqlite_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"timeout": 30})
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture()
+def fake_redis():
+    """In-process async Redis (fakeredis); patch it over the `redis_client` a module imported."""
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+class FakeSocket:
+    """Records what a Connection writes; `stall` makes every send hang (a slow consumer)."""
+
+    def __init__(self, stall: bool = False):
+        self.sent = []
+        self.closed = False
+        self.stall = stall
+
+    async def send_text(self, data):
+        if self.stall:
+            await asyncio.Event().wait()
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        await self.send_text(data)
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+
+@pytest.fixture()
+def make_manager(monkeypatch):
+    """
+    Factory for a fresh SocketManager singleton (call it inside the event loop).
+    The cluster bus is off unless `cluster=True`, and disconnect flushes are recorded
+    in `manager.flushed` instead of reaching Redis and the DB.
+    """
+    from ws import socket_manager
+    from ws.chat_flusher import ChatFlusher
+
+    flushed = []
+
+    class _Flusher:
+        async def flush_rooms(self, room_ids):
+            flushed.extend(room_ids)
+            return 0
+
+    monkeypatch.setattr(ChatFlusher, "instance", classmethod(lambda cls: _Flusher()))
+
+    def make(cluster: bool = False):
+        monkeypatch.setattr(socket_manager.settings, "CLUSTER_ENABLED", cluster)
+        manager = socket_manager.SocketManager()
+        monkeypatch.setattr(socket_manager.SocketManager, "_instance", manager)
+        manager.flushed = flushed
+        return manager
+
+    return make
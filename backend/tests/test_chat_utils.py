@@ -0,0 +1,128 @@
+# tests/test_chat_utils.py
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import Session
+
+from models.chat import ChatEntry, ChatMessage, ChatReadState
+from utils.chat_utils import (
+    advance_sentiment_watermark, get_messages_since, get_sentiment_watermark, merge_unscored,
+    persist_room_batches,
+)
+
+
+@pytest.fixture()
+def db(sqlite_engine):
+    ChatMessage.__table__.create(sqlite_engine)
+    ChatEntry.__table__.create(sqlite_engine)
+    ChatReadState.__table__.create(sqlite_engine)
+    with Session(sqlite_engine) as session:
+        yield session
+
+
+def _conversation(db: Session, topic: str, sent: list) -> None:
+    chat = ChatMessage(user1_id=1, user2_id=2, topic=topic, messages=[])
+    db.add(chat)
+    db.flush()
+    for seq, sent_at in sent:
+        db.add(ChatEntry(user1_id=1, user2_id=2, seq=seq, chat_id=chat.id, sender_id=1,
+                         text=f"{topic} {seq}", sent_at=sent_at))
+    db.commit()
+
+
+def test_sentiment_watermark_is_kept_per_topic(db):
+    t0 = datetime(2026, 1, 1, 12, 0)
+    _conversation(db, "travel", [(1, t0), (3, t0 + timedelta(minutes=10))])
+    _conversation(db, "family", [(2, t0 + timedelta(minutes=5)), (4, t0 + timedelta(minutes=20))])
+
+    # score "family" up to its newest message
+    advance_sentiment_watermark(db, 2, 1, "Family", 4)
+    db.commit()
+
+    # "travel" still has all of its (older) messages to score
+    assert get_sentiment_watermark(db, 1, 2, "travel") == 0
+    travel = get_messages_since(db, 1, 2, "travel", get_sentiment_watermark(db, 1, 2, "travel"))
+    assert [m["seq"] for m in travel] == [1, 3]
+
+    family_after = get_sentiment_watermark(db, 1, 2, "family")
+    assert get_messages_since(db, 1, 2, "family", family_after) == []
+
+    # scoring "travel" part-way only moves its own watermark
+    advance_sentiment_watermark(db, 1, 2, "travel", 1)
+    db.commit()
+    travel = get_messages_since(db, 1, 2, "travel", get_sentiment_watermark(db, 1, 2, "travel"))
+    assert [m["seq"] for m in travel] == [3]
+
+
+def test_sentiment_watermark_never_moves_back(db):
+    t0 = datetime(2026, 1, 1, 12, 0)
+    _conversation(db, "travel", [(1, t0), (2, t0 + timedelta(minutes=10))])
+
+    advance_sentiment_watermark(db, 1, 2, "travel", 2)
+    advance_sentiment_watermark(db, 1, 2, "travel", 1)
+    db.commit()
+
+    assert get_messages_since(db, 1, 2, "travel", get_sentiment_watermark(db, 1, 2, "travel")) == []
+
+
+def test_message_flushed_after_a_later_one_was_scored_is_still_picked_up(db):
+    t0 = datetime(2026, 1, 1, 12, 0)
+    _conversation(db, "travel", [(1, t0)])
+    # seq 2 is still buffered (its flush is being retried) while seq 3 has been scored
+    buffered = [
+        {"seq": 2, "sender": "2", "text": "late", "topic": "travel", "ts": (t0 + timedelta(minutes=1)).isoformat()},
+        {"seq": 3, "sender": "1", "text": "newer", "topic": "Travel", "ts": (t0 + timedelta(minutes=2)).isoformat()},
+        {"seq": 4, "sender": "1", "text": "other topic", "topic": "family", "ts": t0.isoformat()},
+    ]
+    unscored = merge_unscored(get_messages_since(db, 1, 2, "travel", 0), buffered, "travel", 0)
+    assert [m["seq"] for m in unscored] == [1, 2, 3]
+
+    # only seq 1 was scored: the buffered ones wait, whenever they reach the table
+    advance_sentiment_watermark(db, 1, 2, "travel", 1, t0 + timedelta(minutes=2))
+    db.commit()
+    after = get_sentiment_watermark(db, 1, 2, "travel")
+    assert [m["seq"] for m in merge_unscored(get_messages_since(db, 1, 2, "travel", after), buffered, "travel", after)] == [2, 3]
+
+    # seq 2 lands in the table after the watermark time already passed its sent_at
+    chat = db.query(ChatMessage).one()
+    db.add(ChatEntry(user1_id=1, user2_id=2, seq=2, chat_id=chat.id, sender_id=2,
+                     text="late", sent_at=t0 + timedelta(minutes=1)))
+    db.commit()
+    assert [m["seq"] for m in get_messages_since(db, 1, 2, "travel", after)] == [2]
+
+
+def test_watermark_is_created_for_a_conversation_still_buffered(db):
+    advance_sentiment_watermark(db, 2, 1, "travel", 5, datetime(2026, 1, 1, 12, 0))
+    db.commit()
+    assert get_sentiment_watermark(db, 1, 2, "Travel") == 5
+
+
+def _buffered(seq: int, sender: int, text: str) -> dict:
+    return {"seq": seq, "sender": str(sender), "text": text, "timestamp": "2026-01-01T12:00:00"}
+
+
+def test_room_batches_isolate_a_failing_room(db):
+    rooms = {
+        "1_2": [(1, 2, "travel", [_buffered(1, 1, "hi"), _buffered(2, 2, "hello")])],
+        "1_99": [(1, 99, "travel", [_buffered(1, 1, "to nobody")])],  # unknown user: FK violation
+        "2_3": [(2, 3, "family", [_buffered(1, 3, "hey")]), (2, 3, "travel", [_buffered(2, 2, "yo")])],
+    }
+
+    written, failed = persist_room_batches(db, rooms)
+
+    assert written == 4
+    assert list(failed) == ["1_99"]
+    assert [m["seq"] for m in get_messages_since(db, 1, 2, "travel", None)] == [1, 2]
+    assert [m["seq"] for m in get_messages_since(db, 2, 3, "family", None)] == [1]
+    assert [m["seq"] for m in get_messages_since(db, 2, 3, "travel", None)] == [2]
+    assert db.query(ChatEntry).filter(ChatEntry.user2_id == 99).count() == 0
+
+
+def test_room_batches_commit_together_when_all_rooms_are_valid(db):
+    rooms = {
+        "1_2": [(1, 2, "travel", [_buffered(1, 1, "hi")])],
+        "2_3": [(2, 3, "travel", [_buffered(1, 2, "hey")])],
+    }
+
+    assert persist_room_batches(db, rooms) == (2, {})
+    assert db.query(ChatEntry).count() == 2
@@ -0,0 +1,96 @@
+# tests/test_cluster.py
+import asyncio
+import time
+
+import pytest
+
+from conftest import FakeSocket
+from ws import cluster
+from ws.cluster import NODES_KEY, ClusterBus
+
+
+@pytest.fixture()
+def redis(fake_redis, monkeypatch):
+    monkeypatch.setattr(cluster, "redis_client", fake_redis)
+    return fake_redis
+
+
+async def _until(predicate, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+
+def test_frames_reach_users_on_other_nodes_once_per_node(redis):
+    async def run():
+        delivered = []
+
+        async def deliver(user_id, obj):
+            delivered.append((user_id, obj["n"]))
+            return 1
+
+        sender, other = ClusterBus(deliver=deliver), ClusterBus(deliver=deliver)
+        await sender.start()
+        await other.start()
+        await other.set_presence("2", 1)
+        await other.set_presence("3", 2)
+        await sender.set_presence("4", 1)  # local to the sender: never published
+
+        nodes = await sender.publish_to_users(["2", "3", "4", "5"], {"n": 1})
+        await _until(lambda: len(delivered) == 2)
+        stats = sender.stats(), other.stats()
+        await sender.stop()
+        await other.stop()
+        return nodes, delivered, stats
+
+    nodes, delivered, (sender_stats, other_stats) = asyncio.run(run())
+
+    assert nodes == 1
+    assert sorted(delivered) == [("2", 1), ("3", 1)]
+    assert sender_stats["published"] == 1 and other_stats["received"] == 1
+
+
+def test_presence_of_dead_nodes_is_pruned_but_new_nodes_are_kept(redis):
+    async def run():
+        bus = ClusterBus(deliver=None)
+        await bus._heartbeat_once()
+        # a node that started after our last heartbeat, and one that died
+        await redis.zadd(NODES_KEY, {"new-node": time.time() + 30, "dead-node": time.time() - 1})
+        await redis.hset("presence:2", mapping={"new-node": 1, "dead-node": 1, "gone-node": 1})
+        nodes = await bus.remote_nodes("2")
+        return nodes, await redis.hkeys("presence:2")
+
+    nodes, left = asyncio.run(run())
+    assert nodes == {"new-node"}
+    assert left == ["new-node"]
+
+
+def test_room_broadcast_queues_locally_and_publishes_once_per_node(make_manager, redis, monkeypatch):
+    async def run():
+        manager = make_manager(cluster=True)
+        published = []
+        original = manager._bus.publish_to_users
+
+        async def spy(user_ids, obj):
+            published.append(list(user_ids))
+            return await original(user_ids, obj)
+
+        monkeypatch.setattr(manager._bus, "publish_to_users", spy)
+        local = FakeSocket()
+        await manager.register_connection("1", local)
+        for uid in ("1", "2", "3", "4"):
+            await manager.add_user_to_room(uid, "room")
+        # users 2 and 3 are connected to another worker
+        await redis.zadd(NODES_KEY, {"worker-b": time.time() + 30})
+        await redis.hset("presence:2", "worker-b", 1)
+        await redis.hset("presence:3", "worker-b", 1)
+
+        sent = await manager.broadcast_to_room("room", {"type": "chat"}, exclude_user="4")
+        await manager.flush_connection(local)
+        return sent, published, local
+
+    sent, published, local = asyncio.run(run())
+
+    assert sent == 2  # one local socket + one remote node
+    assert len(published) == 1 and sorted(published[0]) == ["1", "2", "3"]
+    assert len(local.sent) == 1
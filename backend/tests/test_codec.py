@@ -0,0 +1,33 @@
+# tests/test_codec.py
+import pytest
+
+pytest.importorskip("msgpack")
+
+from ws.codec import MsgPackCodec
+
+
+def test_msgpack_round_trip_keeps_payload_keys_that_look_like_tags():
+    codec = MsgPackCodec()
+    frame = {
+        "type": "chat",
+        "request_id": "r-1",
+        "payload": {
+            "to": "42",
+            "message": "hi",
+            "t": "user key", "r": 1, "m": 2, "s": 3, "st": 4, "msg": 5, "d": 6, "p": 7,
+            "~d": "already escaped",
+            "stage": "llm_stream",
+        },
+        "meta": {"topic": "travel", "t": "meta key"},
+    }
+
+    assert codec.decode(codec.encode(frame)) == frame
+
+
+def test_msgpack_shortens_envelope_and_hot_payload_keys():
+    import msgpack
+
+    codec = MsgPackCodec()
+    raw = msgpack.unpackb(codec.encode({"type": "assess", "payload": {"stage": "done", "d": 1}}), raw=False)
+
+    assert raw == {"t": "assess", "p": {"s": "done", "~d": 1}}
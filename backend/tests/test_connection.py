@@ -0,0 +1,88 @@
+# tests/test_connection.py
+import asyncio
+import json
+
+from conftest import FakeSocket
+from ws.connection import Connection
+
+
+def _connection(websocket, dead, **options):
+    async def on_dead(ws):
+        dead.append(ws)
+    return Connection(websocket, "1", on_dead=on_dead, **options)
+
+
+def test_full_queue_disconnects_the_slow_consumer_by_default():
+    async def run():
+        dead = []
+        socket = FakeSocket(stall=True)
+        conn = _connection(socket, dead, max_queue=2, policy="disconnect")
+        conn.start()
+        accepted = [conn.enqueue({"n": 0})]
+        await asyncio.sleep(0.01)  # the writer is stuck sending frame 0
+        accepted += [conn.enqueue({"n": n}) for n in range(1, 4)]
+        await asyncio.sleep(0)  # let the on_dead task run
+        conn.stop()
+        return conn, accepted, dead, socket
+
+    conn, accepted, dead, socket = asyncio.run(run())
+
+    assert accepted == [True, True, True, False]
+    assert dead == [socket]
+    assert conn.dropped == 1 and not conn.alive
+    assert not conn.enqueue({"n": 5})  # nothing is queued for a dead connection
+
+
+def test_drop_oldest_keeps_the_newest_frames():
+    async def run():
+        dead = []
+        socket = FakeSocket()
+        conn = _connection(socket, dead, max_queue=2, policy="drop_oldest")
+        accepted = [conn.enqueue({"n": n}) for n in range(5)]  # writer not started yet
+        conn.start()
+        await conn.drain()
+        conn.stop()
+        return conn, accepted, dead, socket
+
+    conn, accepted, dead, socket = asyncio.run(run())
+
+    assert accepted == [True] * 5
+    assert [json.loads(f)["n"] for f in socket.sent] == [3, 4]
+    assert conn.dropped == 3 and dead == []
+
+
+def test_a_send_that_times_out_marks_the_connection_dead():
+    async def run():
+        dead = []
+        socket = FakeSocket(stall=True)
+        conn = _connection(socket, dead, send_timeout=0.01)
+        conn.start()
+        conn.enqueue({"n": 1})
+        await asyncio.sleep(0.05)
+        conn.stop()
+        return conn, dead, socket
+
+    conn, dead, socket = asyncio.run(run())
+    assert dead == [socket] and not conn.alive and conn.sent == 0
+
+
+def test_metrics_aggregate_queue_depths_without_user_ids(make_manager):
+    async def run():
+        manager = make_manager()
+        for uid in ("1", "2", "3"):
+            await manager.register_connection(uid, FakeSocket(stall=True))
+        for n, conn in enumerate(manager._conns.values()):
+            for _ in range(n * 40):
+                conn.enqueue({"n": n})
+        return manager.connection_stats(), manager.connection_stats(detail=True)
+
+    stats, detailed = asyncio.run(run())
+
+    assert "per_connection" not in stats and '"user_id"' not in json.dumps(stats)
+    assert stats["max_queue_depth"] == 80
+    assert stats["queued_frames"] == 40 + 80
+    assert stats["backed_up"] == 1  # WS_QUEUE_DEPTH_ALERT = 64
+    assert stats["queue_depth"]["buckets"]["le_0"] == 1
+    assert stats["queue_depth"]["buckets"]["le_64"] == 1
+    assert stats["queue_depth"]["buckets"]["le_128"] == 1
+    assert sorted(c["user_id"] for c in detailed["per_connection"]) == ["1", "2", "3"]
@@ -0,0 +1,56 @@
+# tests/test_handler_tasks.py
+import asyncio
+
+from ws.handler_tasks import HandlerTasks
+
+
+def test_spawn_refuses_work_over_the_connection_and_user_limits():
+    async def run():
+        tasks = HandlerTasks(conn_limits={"assess": 1}, user_limits={"assess": 2}, default_limit=3)
+        hold = asyncio.Event()
+        phone, laptop, tablet = object(), object(), object()
+
+        def spawn(ws, user="1", msg_type="assess"):
+            return tasks.spawn(ws, user, msg_type, hold.wait())
+
+        started = [
+            spawn(phone) is not None,
+            spawn(phone) is not None,   # over the per-connection limit
+            spawn(laptop) is not None,
+            spawn(tablet) is not None,  # over the per-user limit
+            spawn(tablet, user="2") is not None,
+        ]
+        chats = [spawn(phone, msg_type="chat") is not None for _ in range(4)]  # default limit
+        stats = tasks.stats()
+        hold.set()
+        await asyncio.sleep(0.01)  # tasks finish, then their done callbacks run
+        return started, chats, stats, tasks.stats()
+
+    started, chats, busy, idle = asyncio.run(run())
+
+    assert started == [True, False, True, False, True]
+    assert chats == [True, True, True, False]
+    assert busy["rejected"] == 3 and busy["in_flight"] == 6
+    assert busy["by_type"] == {"assess": 3, "chat": 3}
+    assert idle["in_flight"] == 0 and idle["users_busy"] == 0
+
+
+def test_disconnect_cancels_only_that_sockets_tasks():
+    async def run():
+        tasks = HandlerTasks(conn_limits={}, user_limits={}, default_limit=4)
+        gone, staying = object(), object()
+        cancelled = tasks.spawn(gone, "1", "assess", asyncio.Event().wait())
+        kept = tasks.spawn(staying, "1", "assess", asyncio.Event().wait())
+        await asyncio.sleep(0)
+
+        count = tasks.cancel_connection(gone)
+        await asyncio.sleep(0.01)
+        # the freed slot is usable again
+        replacement = tasks.spawn(staying, "1", "assess", asyncio.sleep(0))
+        result = count, cancelled.cancelled(), kept.done(), replacement is not None, tasks.stats()
+        kept.cancel()
+        return result
+
+    count, cancelled, kept_done, replaced, stats = asyncio.run(run())
+    assert (count, cancelled, kept_done, replaced) == (1, True, False, True)
+    assert stats["cancelled"] == 1 and stats["connections_busy"] == 1
@@ -0,0 +1,77 @@
+# tests/test_heartbeat.py
+import asyncio
+import time
+
+from ws.heartbeat import HeartbeatWheel
+
+
+class _Conn:
+    def __init__(self, user_id, idle):
+        self.user_id = user_id
+        self.last_seen = time.monotonic() - idle
+        self.frames = []
+
+    def enqueue(self, frame):
+        self.frames.append(frame)
+        return True
+
+
+def test_silent_peers_are_dropped_idle_ones_pinged_and_active_ones_left_alone():
+    async def run():
+        dropped = []
+
+        async def on_dead(conn):
+            dropped.append(conn.user_id)
+
+        wheel = HeartbeatWheel(interval=30, tick=30, dead_after=90, on_dead=on_dead)  # one slot
+        dead, idle, active = _Conn("dead", 95), _Conn("idle", 40), _Conn("active", 1)
+        for conn in (dead, idle, active):
+            wheel.add(conn)
+
+        wheel._visit(0)
+        await asyncio.sleep(0)  # drops run as their own tasks
+        return wheel, dropped, dead, idle, active
+
+    wheel, dropped, dead, idle, active = asyncio.run(run())
+
+    assert dropped == ["dead"]
+    assert dead.frames == [] and idle.frames == ["__ping__"] and active.frames == []
+    stats = wheel.stats()
+    assert stats["dead_detected"] == 1 and stats["tracked"] == 2
+    assert stats["pings_sent"] == 1 and stats["pings_skipped"] == 1
+    assert 4.9 <= stats["detection_latency_max_s"] <= 5.5
+
+
+def test_connections_are_spread_over_the_slots():
+    wheel = HeartbeatWheel(interval=10, tick=1, dead_after=30, on_dead=None)
+    conns = [_Conn(str(n), 0) for n in range(25)]
+    for conn in conns:
+        wheel.add(conn)
+
+    assert sorted(len(slot) for slot in wheel._slots) == [2] * 5 + [3] * 5
+    wheel.remove(conns[0])
+    assert wheel.stats()["tracked"] == 24
+
+
+def test_drops_are_bounded_and_never_block_the_tick():
+    async def run():
+        release = asyncio.Event()
+        running = []
+
+        async def on_dead(conn):
+            running.append(conn.user_id)
+            await release.wait()
+
+        wheel = HeartbeatWheel(interval=1, tick=1, dead_after=5, on_dead=on_dead, max_concurrent_drops=2)
+        for n in range(5):
+            wheel.add(_Conn(str(n), 10))
+        wheel._visit(0)  # returns at once although no drop has finished
+        await asyncio.sleep(0.01)
+        in_flight = (len(running), wheel.stats()["drops_in_flight"])
+        release.set()
+        await asyncio.sleep(0.01)
+        return in_flight, len(running), wheel.stats()["drops_in_flight"]
+
+    (started, scheduled), finished, left = asyncio.run(run())
+    assert (started, scheduled) == (2, 5)
+    assert finished == 5 and left == 0
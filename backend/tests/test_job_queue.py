@@ -0,0 +1,180 @@
+# tests/test_job_queue.py
+import asyncio
+import json
+import time
+
+import pytest
+
+from conftest import FakeSocket
+from ws import job_queue
+from ws.job_queue import PENDING_KEY, PROCESSING_KEY, JobQueue
+
+
+async def _noop(websocket, user_id, request_id, payload, meta, ctx):
+    return None
+
+
+@pytest.fixture()
+def queue(fake_redis, monkeypatch):
+    monkeypatch.setattr(job_queue, "redis_client", fake_redis)
+    queue = JobQueue()  # registers its Lua scripts on the patched client
+    queue.register("assess", _noop, priority=1)
+    return queue
+
+
+def _claim(queue, lease_until):
+    return queue._claim(keys=[PENDING_KEY, PROCESSING_KEY], args=[lease_until])
+
+
+def test_expired_lease_is_requeued_at_the_top_of_its_priority(queue, fake_redis):
+    async def run():
+        first, _ = await queue.enqueue("assess", "1", "r-1", {"partner_id": 2}, {})
+        second, _ = await queue.enqueue("assess", "1", "r-2", {"partner_id": 3}, {})
+        assert await _claim(queue, time.time() - 1) == first  # its worker died
+        assert await _claim(queue, time.time() + 60) == second  # still running
+        moved = await queue._reclaim_expired()
+        return (
+            first, second, moved,
+            await fake_redis.zrange(PENDING_KEY, 0, -1, withscores=True),
+            await fake_redis.zrange(PROCESSING_KEY, 0, -1),
+            await _claim(queue, time.time() + 60),
+        )
+
+    first, second, moved, pending, processing, next_claimed = asyncio.run(run())
+
+    assert moved == [first]
+
+    assert pending == [(first, 1e13)]  # ahead of anything enqueued later at priority 1
+    assert processing == [second]
+    assert next_claimed == first
+
+
+def test_a_renewed_lease_is_not_reclaimed(queue, fake_redis):
+    async def run():
+        job_id, _ = await queue.enqueue("assess", "1", "r-1", {"partner_id": 2}, {})
+        await _claim(queue, time.time() - 1)
+        # listed as expired, renewed by its worker before the script runs
+        await fake_redis.zadd(PROCESSING_KEY, {job_id: time.time() + 60}, xx=True)
+        return await queue._reclaim(keys=[PROCESSING_KEY, PENDING_KEY, f"job:{job_id}"],
+                                    args=[time.time(), job_id])
+
+    assert asyncio.run(run()) == []
+
+
+def test_interrupted_job_is_requeued_without_spending_an_attempt(queue, fake_redis):
+    async def run():
+        job_id, _ = await queue.enqueue("assess", "1", "r-1", {"partner_id": 2}, {})
+        await _claim(queue, time.time() + 60)
+        await fake_redis.hincrby(f"job:{job_id}", "attempts", 1)
+        await queue._requeue(job_id, await fake_redis.hgetall(f"job:{job_id}"))
+        return (
+            await fake_redis.zrange(PENDING_KEY, 0, -1),
+            await fake_redis.zcard(PROCESSING_KEY),
+            await fake_redis.hget(f"job:{job_id}", "attempts"),
+        )
+
+    pending, processing, attempts = asyncio.run(run())
+    assert len(pending) == 1 and processing == 0 and attempts == "0"
+
+
+def test_same_pair_and_topic_is_deduplicated_until_the_job_finishes(queue, fake_redis):
+    async def run():
+        first, dup = await queue.enqueue("assess", "1", "r-1", {"partner_id": 2, "topic": "travel"}, {})
+        assert not dup
+        # the partner asks too: same unordered pair, joins as a subscriber
+        joined, dup = await queue.enqueue("assess", "2", "r-2", {"partner_id": 1, "topic": "travel"}, {})
+        assert (joined, dup) == (first, True)
+        other_topic, dup = await queue.enqueue("assess", "1", "r-3", {"partner_id": 2, "topic": "family"}, {})
+        assert other_topic != first and not dup
+
+        subscribers = await fake_redis.lrange(f"job:{first}:subs", 0, -1)
+        await queue._finish(first, await fake_redis.hgetall(f"job:{first}"), "done")
+        after, dup = await queue.enqueue("assess", "1", "r-4", {"partner_id": 2, "topic": "travel"}, {})
+        return first, subscribers, after, dup, await fake_redis.ttl(f"job:{first}")
+
+    first, subscribers, after, dup, ttl = asyncio.run(run())
+
+    assert subscribers == [
+        '{"user_id": "1", "request_id": "r-1"}',
+        '{"user_id": "2", "request_id": "r-2"}',
+    ]
+    assert after != first and not dup
+    assert 0 < ttl <= job_queue.settings.JOB_RESULT_TTL
+
+
+def test_a_stale_dedupe_key_is_taken_over(queue, fake_redis):
+    async def run():
+        first, _ = await queue.enqueue("assess", "1", "r-1", {"partner_id": 2}, {})
+        # finished but its dedupe key outlived it (e.g. the worker died in _finish)
+        await fake_redis.hset(f"job:{first}", "status", "done")
+        second, dup = await queue.enqueue("assess", "1", "r-2", {"partner_id": 2}, {})
+        return first, second, dup, await fake_redis.get("jobs:dedupe:assess:1_2")
+
+    first, second, dup, key = asyncio.run(run())
+    assert second != first and not dup
+    assert key == second
+
+
+def test_a_user_over_their_limit_gets_busy_until_a_job_finishes(queue, fake_redis, make_manager):
+    async def run():
+        manager = make_manager()
+        socket = FakeSocket()
+        await manager.register_connection("1", socket)
+        enqueue = queue.register("view_report", _noop, priority=1, dedupe=None)
+        limit = job_queue.settings.WS_USER_HANDLER_LIMITS["view_report"]
+        for n in range(limit + 1):
+            await enqueue(socket, "1", f"r-{n}", {}, {}, {"user_id": "1"})
+        await manager.flush_connection(socket)
+        acks = [json.loads(frame)["payload"] for frame in socket.sent]
+
+        first = acks[0]["job_id"]
+        await queue._finish(first, await fake_redis.hgetall(f"job:{first}"), "done")
+        again, _ = await queue.enqueue("view_report", "1", "r-again", {}, {})
+        return limit, acks, again, await fake_redis.get("jobs:active:view_report:1")
+
+    limit, acks, again, active = asyncio.run(run())
+
+    assert [a.get("status") for a in acks[:limit]] == ["queued"] * limit
+    assert acks[limit] == {"message": "busy", "msg_type": "view_report"}
+    assert again is not None and active == str(limit)
+
+
+def test_busy_request_does_not_keep_the_dedupe_key(queue, fake_redis):
+    async def run():
+        for partner in (2, 3):
+            await queue.enqueue("assess", "1", f"r-{partner}", {"partner_id": partner}, {})
+        busy, _ = await queue.enqueue("assess", "1", "r-4", {"partner_id": 4}, {})
+        return busy, await fake_redis.exists("jobs:dedupe:assess:1_4")
+
+    assert asyncio.run(run()) == (None, 0)
+
+
+def test_job_whose_subscribers_all_left_is_dropped_when_claimed(queue, fake_redis, make_manager):
+    ran = []
+
+    async def record(websocket, user_id, request_id, payload, meta, ctx):
+        ran.append(request_id)
+
+    queue.register("assess", record, priority=1)
+
+    async def run():
+        manager = make_manager()
+        await manager.register_connection("2", FakeSocket())
+        gone, _ = await queue.enqueue("assess", "1", "r-gone", {"partner_id": 3}, {})
+        # user 1 asked, user 2 joined as a duplicate and is still connected
+        shared, _ = await queue.enqueue("assess", "1", "r-shared", {"partner_id": 2}, {})
+        await queue.enqueue("assess", "2", "r-joined", {"partner_id": 1}, {})
+        for _ in range(2):
+            await queue._run(await _claim(queue, time.time() + 60))
+        return (
+            gone, shared,
+            await fake_redis.hget(f"job:{gone}", "status"),
+            await fake_redis.hget(f"job:{shared}", "status"),
+            await fake_redis.exists("jobs:active:assess:1"),
+        )
+
+    gone, shared, gone_status, shared_status, active = asyncio.run(run())
+
+    assert ran == ["r-shared"]
+    assert (gone_status, shared_status) == ("abandoned", "done")
+    assert active == 0 and queue.abandoned == 1
@@ -0,0 +1,134 @@
+# tests/test_llm_resilience.py
+import pytest
+
+from services import llm_resilience
+from services.llm_resilience import AdaptiveLimiter, CircuitBreaker, LLMResilience
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(llm_resilience.time, "monotonic", clock)
+    return clock
+
+
+def test_breaker_opens_probes_and_closes(clock):
+    transitions = []
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, on_transition=transitions.append)
+
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()  # the single half-open probe
+    assert breaker.state == "half_open"
+    assert not breaker.allow()  # a second caller waits for the probe's outcome
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+    assert transitions == ["open", "half_open", "closed"]
+
+
+def test_failed_probe_reopens_and_a_released_probe_is_not_judged(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+
+    assert breaker.allow()
+    breaker.release_probe()  # e.g. the limiter was full: no outcome recorded
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 9
+    assert not breaker.allow()
+
+
+def test_limiter_grows_additively_and_halves_on_overload():
+    limiter = AdaptiveLimiter(min_limit=2, max_limit=16)
+    assert limiter.limit == 16
+
+    for expected in (8, 4, 2, 2):
+        assert limiter.acquire(timeout=0)
+        limiter.release(overloaded=True)
+        assert limiter.limit == expected
+
+    # +1/limit per success: 2 -> 2.5 -> 2.9 -> 3.24, one slot more after three successes
+    for _ in range(3):
+        assert limiter.acquire(timeout=0)
+        limiter.release()
+    assert limiter.limit == 3
+    assert limiter.in_flight == 0
+
+
+def test_limiter_rejects_beyond_the_limit():
+    limiter = AdaptiveLimiter(min_limit=1, max_limit=2)
+    assert limiter.acquire(timeout=0) and limiter.acquire(timeout=0)
+    assert not limiter.acquire(timeout=0.01)
+    limiter.release()
+    assert limiter.acquire(timeout=0)
+
+
+def _resilience(**overrides):
+    options = dict(
+        min_in_flight=1, max_in_flight=4, queue_timeout=0.01, max_retries=2,
+        base_delay=0, max_delay=0, breaker_failures=2, breaker_reset=60, cache_size=8,
+        is_retryable=lambda exc: isinstance(exc, TimeoutError),
+    )
+    options.update(overrides)
+    return LLMResilience(**options)
+
+
+def test_retries_then_serves_the_cached_answer_once_the_breaker_opens(clock):
+    resilience = _resilience()
+    assert resilience.call("p", lambda: "72.00%", degraded="Invalid result") == "72.00%"
+
+    attempts = []
+
+    def timing_out():
+        attempts.append(1)
+        raise TimeoutError("provider timeout")
+
+    outcomes = []
+    for _ in range(2):
+        assert resilience.call("p", timing_out, degraded="Invalid result", on_outcome=outcomes.append) == "72.00%"
+    assert len(attempts) == 2 * 3  # first try + max_retries, per call
+    assert resilience.breaker.state == "open"
+
+    assert resilience.call("q", timing_out, degraded="Invalid result", on_outcome=outcomes.append) == "Invalid result"
+    assert len(attempts) == 6  # rejected by the open breaker, the provider is not called
+    assert outcomes == ["error", "error", "breaker_open"]
+
+    stats = resilience.snapshot()
+    assert stats["retries"] == 4
+    assert stats["fallback_cached"] == 2 and stats["fallback_degraded"] == 1
+    assert stats["breaker_opened"] == 1
+    assert stats["in_flight_limit"] == 1  # halved on every overloaded call
+
+
+def test_non_retryable_errors_are_not_retried():
+    resilience = _resilience()
+    attempts = []
+
+    def bad_request():
+        attempts.append(1)
+        raise ValueError("400")
+
+    assert resilience.call("p", bad_request, degraded=None) is None
+    assert len(attempts) == 1
+    assert resilience.limiter.limit == 4  # not an overload signal
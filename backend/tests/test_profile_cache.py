@@ -0,0 +1,36 @@
+# tests/test_profile_cache.py
+import pytest
+from sqlalchemy.orm import Session
+
+from schemas import ProfileSnapshot
+from utils.profile_cache import ProfileCache
+
+
+@pytest.fixture()
+def cache(monkeypatch):
+    cache = ProfileCache()
+    monkeypatch.setattr(ProfileCache, "_instance", cache)
+    cache._local_put([ProfileSnapshot(id=1, user_name="old name")])
+    return cache
+
+
+def test_invalidation_waits_for_the_commit(sqlite_engine, cache):
+    with Session(sqlite_engine) as session:
+        session.connection()  # open the transaction the profile write would run in
+        cache.invalidate_on_commit(session, [1])
+        # until the write commits, readers may still cache and see the old row
+        assert 1 in cache._local_get([1])
+
+        session.commit()
+        assert cache._local_get([1]) == {}
+
+
+def test_rolled_back_write_invalidates_nothing(sqlite_engine, cache):
+    with Session(sqlite_engine) as session:
+        session.connection()
+        cache.invalidate_on_commit(session, [1])
+        session.rollback()
+
+        session.connection()  # a later transaction of the same session
+        session.commit()
+        assert 1 in cache._local_get([1])
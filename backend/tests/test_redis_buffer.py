@@ -0,0 +1,57 @@
+# tests/test_redis_buffer.py
+import asyncio
+
+import pytest
+
+from core import redis as redis_buffer
+
+
+@pytest.fixture()
+def redis(fake_redis, monkeypatch):
+    monkeypatch.setattr(redis_buffer, "redis_client", fake_redis)
+    monkeypatch.setattr(redis_buffer.settings, "CHAT_HISTORY_SCAN_CHUNKS", 4)
+    return fake_redis
+
+
+async def _fill(room, topics):
+    for seq, topic in enumerate(topics, start=1):
+        await redis_buffer.save_message_to_cache(room, {"seq": seq, "topic": topic, "text": f"m{seq}"})
+
+
+def test_pages_are_newest_first_and_resume_from_the_cursor(redis):
+    async def run():
+        await _fill("1_2", ["travel", "family"] * 15)
+        pages, cursor = [], None
+        while True:
+            page, cursor = await redis_buffer.get_cached_page("1_2", "Travel", cursor, limit=6)
+            pages.append([m["seq"] for m in page])
+            if cursor is None:
+                return pages
+
+    assert asyncio.run(run()) == [[29, 27, 25, 23, 21, 19], [17, 15, 13, 11, 9, 7], [5, 3, 1]]
+
+
+def test_a_rare_topic_does_not_make_one_request_scan_the_whole_buffer(redis):
+    async def run():
+        await _fill("1_2", ["travel"] * 3 + ["family"] * 200)
+        calls = []
+        original = redis.xrevrange
+
+        async def counting(*args, **kwargs):
+            calls.append(kwargs.get("count"))
+            return await original(*args, **kwargs)
+
+        redis.xrevrange = counting
+        first, cursor = await redis_buffer.get_cached_page("1_2", "travel", None, limit=10)
+        scanned = len(calls)
+        pages = [first]
+        while cursor is not None:
+            page, cursor = await redis_buffer.get_cached_page("1_2", "travel", cursor, limit=10)
+            pages.append(page)
+        return scanned, pages
+
+    scanned, pages = asyncio.run(run())
+
+    assert scanned == 4  # CHAT_HISTORY_SCAN_CHUNKS chunks of `limit` entries
+    assert pages[0] == []  # short page, with a cursor to continue from
+    assert [m["seq"] for page in pages for m in page] == [3, 2, 1]
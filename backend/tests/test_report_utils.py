@@ -0,0 +1,152 @@
+# tests/test_report_utils.py
+import os
+import threading
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from models import Report, User
+from models.chat import ChatEntry, ChatMessage
+from utils.report_utils import accumulate_report_score, get_assessment_inputs, get_report, get_sentiment_state
+
+# a Postgres database the race test may create its tables in, e.g. postgresql://u:p@localhost/janamsaathi_test
+PG_TEST_DSN = os.environ.get("TEST_DATABASE_URL")
+
+
+@pytest.fixture()
+def db(sqlite_engine):
+    Report.__table__.create(sqlite_engine)
+    ChatMessage.__table__.create(sqlite_engine)
+    ChatEntry.__table__.create(sqlite_engine)
+    with Session(sqlite_engine) as session:
+        yield session
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def race_db(request):
+    """(engine, u1, u2) the race test runs on: file-backed SQLite, and Postgres when configured."""
+    if request.param == "sqlite":
+        engine = request.getfixturevalue("sqlite_file_engine")
+        u1, u2 = 1, 2
+    else:
+        if not PG_TEST_DSN:
+            pytest.skip("set TEST_DATABASE_URL to a Postgres test database")
+        engine = sa.create_engine(PG_TEST_DSN, pool_size=4)
+        u1, u2 = 900001, 900002
+        User.__table__.create(engine, checkfirst=True)
+        with engine.begin() as conn:
+            conn.execute(sa.delete(User).where(User.id.in_([u1, u2])))
+            conn.execute(sa.insert(User), [
+                {"id": u, "user_name": f"race-{u}", "password": "x", "email_id": f"race-{u}@test"} for u in (u1, u2)
+            ])
+    ChatMessage.__table__.create(engine, checkfirst=True)
+    Report.__table__.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.execute(sa.delete(Report).where(Report.user1_id == u1, Report.user2_id == u2))
+    yield engine, u1, u2
+    if request.param == "postgresql":
+        with engine.begin() as conn:
+            conn.execute(sa.delete(Report).where(Report.user1_id == u1, Report.user2_id == u2))
+            conn.execute(sa.delete(User).where(User.id.in_([u1, u2])))
+        engine.dispose()
+
+
+def _statements(session: Session) -> list:
+    """Record every statement the session executes."""
+    seen = []
+    sa.event.listen(session, "do_orm_execute", lambda state: seen.append(state.statement))
+    return seen
+
+
+def test_accumulate_is_one_upsert_on_the_pair_index(db):
+    seen = _statements(db)
+
+    accumulate_report_score(db, 2, 1, Decimal("60"), datetime(2026, 1, 1), horoscope_val=Decimal("70"))
+
+    assert len(seen) == 1
+    sql = " ".join(str(seen[0].compile(dialect=postgresql.dialect())).split())
+    assert sql.startswith("INSERT INTO report")
+    assert "ON CONFLICT (LEAST(user1_id, user2_id), GREATEST(user1_id, user2_id)) DO UPDATE SET" in sql
+    # the running totals are computed from the locked row, not from values read earlier
+    assert "sentiment_sum = (coalesce(report.sentiment_sum," in sql
+    assert "sentiment_count = (coalesce(report.sentiment_count," in sql
+    assert "RETURNING report.horoscope_score, report.sentiment_count, report.sentiment_avg" in sql
+
+
+def test_accumulate_creates_then_adds_to_the_running_average(db):
+    first = accumulate_report_score(db, 2, 1, Decimal("60"), datetime(2026, 1, 2), horoscope_val=Decimal("70"))
+    second = accumulate_report_score(db, 1, 2, Decimal("81"), datetime(2026, 1, 1), horoscope_val=Decimal("10"))
+
+    assert first == {"status": "success", "horoscope_score": "70.00", "compatibility_score": "60.00"}
+    # an existing horoscope score is kept
+    assert second == {"status": "success", "horoscope_score": "70.00", "compatibility_score": "70.50"}
+    assert get_report(db, 2, 1) == second
+    state = get_sentiment_state(db, 1, 2)
+    assert state["sentiment_count"] == 2
+    assert Decimal(str(state["sentiment_avg"])) == Decimal("70.50")
+    assert state["last_sentiment_at"].replace(tzinfo=None) == datetime(2026, 1, 2)  # never moves back
+    assert db.query(Report).count() == 1
+
+
+def test_assessment_inputs_are_one_select(db):
+    seen = _statements(db)
+    state, report, after_seq, messages = get_assessment_inputs(db, 2, 1, "travel")
+
+    assert len(seen) == 1 and seen[0].is_select
+    assert (state, report, after_seq, messages) == (None, {"status": "fail", "error": "Report does not exist"}, 0, [])
+
+
+def test_assessment_inputs_match_the_separate_reads(db):
+    travel = ChatMessage(user1_id=1, user2_id=2, topic="Travel", messages=[])
+    family = ChatMessage(user1_id=2, user2_id=1, topic="family", messages=[])
+    db.add_all([travel, family])
+    db.flush()
+    for seq, chat, text in [(1, travel, "a"), (2, travel, "b"), (3, travel, ""), (4, travel, "c"), (5, family, "f")]:
+        db.add(ChatEntry(user1_id=1, user2_id=2, seq=seq, chat_id=chat.id, sender_id=1,
+                         text=text, sent_at=datetime(2026, 1, 1, 10, seq)))
+    db.commit()
+    accumulate_report_score(db, 1, 2, Decimal("60"), datetime(2026, 1, 1), horoscope_val=Decimal("70"),
+                            topic="travel", scored_seq=2)
+
+    state, report, after_seq, messages = get_assessment_inputs(db, 2, 1, "TRAVEL")
+
+    assert state == get_sentiment_state(db, 1, 2)
+    assert report == get_report(db, 1, 2)
+    assert after_seq == 2
+    # the empty message and the other topic are left out, as get_messages_since() does
+    assert [(m["seq"], m["text"]) for m in messages] == [(4, "c")]
+    # a topic without a header still returns the report
+    assert get_assessment_inputs(db, 1, 2, "work") == (state, report, 0, [])
+
+
+def test_concurrent_accumulates_lose_no_updates(race_db):
+    engine, u1, u2 = race_db
+    rounds = 25
+    barrier = threading.Barrier(2)
+    errors = []
+
+    def _assess(first: int, second: int) -> None:
+        try:
+            with Session(engine) as session:
+                barrier.wait()
+                for _ in range(rounds):
+                    accumulate_report_score(session, first, second, Decimal("50"))
+        except Exception as exc:  # surfaced below; a thread cannot fail the test itself
+            errors.append(exc)
+
+    # the two sessions see the pair in opposite order, as both users can assess
+    threads = [threading.Thread(target=_assess, args=pair) for pair in ((u1, u2), (u2, u1))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    with Session(engine) as session:
+        state = get_sentiment_state(session, u1, u2)
+    assert state["sentiment_count"] == 2 * rounds
+    assert Decimal(str(state["sentiment_avg"])) == Decimal("50.00")
@@ -0,0 +1,110 @@
+# tests/test_socket_manager.py
+import asyncio
+
+from conftest import FakeSocket
+
+
+def test_disconnect_leaves_only_the_users_rooms(make_manager):
+    async def run():
+        manager = make_manager()
+        alice, bob = FakeSocket(), FakeSocket()
+        await manager.register_connection("1", alice)
+        await manager.register_connection("2", bob)
+        for room in ("1_2", "1_3"):
+            await manager.add_user_to_room("1", room)
+        await manager.add_user_to_room("2", "1_2")
+        await manager.add_user_to_room("2", "2_3")
+
+        assert await manager.unregister_connection(alice) == "1"
+        return manager
+
+    manager = asyncio.run(run())
+
+    assert manager.user_rooms("1") == set()
+    assert manager.user_rooms("2") == {"1_2", "2_3"}
+    assert manager.room_members("1_2") == {"2"}
+    assert "1_3" not in manager._rooms  # emptied rooms are removed
+    assert sorted(manager.flushed) == ["1_2", "1_3"]
+
+
+def test_a_user_keeps_their_rooms_until_the_last_socket_closes(make_manager):
+    async def run():
+        manager = make_manager()
+        phone, laptop = FakeSocket(), FakeSocket()
+        await manager.register_connection("1", phone)
+        await manager.register_connection("1", laptop)
+        await manager.add_user_to_room("1", "1_2")
+
+        await manager.unregister_connection(phone)
+        still_in = manager.room_members("1_2")
+        await manager.unregister_connection(laptop)
+        return manager, still_in
+
+    manager, still_in = asyncio.run(run())
+
+    assert still_in == {"1"}
+    assert manager.room_members("1_2") == set()
+    assert manager.user_rooms("1") == set()
+    assert manager.flushed == ["1_2", "1_2"]  # rooms are flushed on every disconnect
+
+
+def test_leaving_a_room_updates_both_indexes(make_manager):
+    async def run():
+        manager = make_manager()
+        await manager.add_user_to_room("1", "1_2")
+        await manager.add_user_to_room("2", "1_2")
+        await manager.remove_user_from_room("1", "1_2")
+        return manager
+
+    manager = asyncio.run(run())
+    assert manager.room_members("1_2") == {"2"}
+    assert manager.user_rooms("1") == set() and "1" not in manager._user_rooms
+
+
+class _BrokenPresence:
+    async def remote_nodes(self, user_id):
+        raise ConnectionError("redis down")
+
+
+def test_unknown_presence_counts_as_offline_unless_asked_otherwise(make_manager):
+    async def run():
+        manager = make_manager()
+        manager._bus = _BrokenPresence()
+        await manager.register_connection("1", FakeSocket())
+        return (
+            await manager.is_connected("1"),
+            await manager.is_connected("2"),
+            await manager.is_connected("2", if_unknown=True),
+        )
+
+    assert asyncio.run(run()) == (True, False, True)
+
+
+def test_chat_goes_to_the_offline_queue_when_presence_is_unknown(make_manager, monkeypatch):
+    from schemas.ws import ChatPayload
+    from ws.handlers import chat
+
+    offline = []
+
+    async def next_seq(room_id, seed):
+        return 7
+
+    async def save(room_id, msg):
+        return "1-0"
+
+    async def push(user_id, payload):
+        offline.append((user_id, payload["seq"]))
+
+    monkeypatch.setattr(chat, "next_room_seq", next_seq)
+    monkeypatch.setattr(chat, "save_message_to_cache", save)
+    monkeypatch.setattr(chat, "push_offline_message", push)
+
+    async def run():
+        manager = make_manager()
+        manager._bus = _BrokenPresence()
+        sender = FakeSocket()
+        await manager.register_connection("1", sender)
+        await chat.handle_chat(sender, "1", "r-1", ChatPayload(to="2", text="hi"), {}, {"user_id": "1"})
+
+    asyncio.run(run())
+    assert offline == [("2", 7)]
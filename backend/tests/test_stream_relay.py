@@ -0,0 +1,90 @@
+# tests/test_stream_relay.py
+import asyncio
+import threading
+
+from ws.stream_relay import StreamRelay
+
+
+class _Recorder:
+    """Stands in for SocketManager: records the frames in the order they are sent."""
+
+    def __init__(self):
+        self.frames = []
+
+    async def safe_send_json(self, websocket, frame):
+        await asyncio.sleep(0)  # a real send yields to the loop
+        self.frames.append(frame)
+
+
+def _payloads(manager):
+    return [f["payload"] for f in manager.frames]
+
+
+def test_first_token_goes_out_at_once_and_the_rest_is_coalesced():
+    async def run():
+        manager = _Recorder()
+        relay = StreamRelay(manager, None, "assess", "r-1", flush_interval=0.05)
+
+        def produce():  # the LLM worker thread
+            for delta in ["Sco", "re", ": ", "72"]:
+                relay.token(delta)
+
+        worker = threading.Thread(target=produce)
+        worker.start()
+        worker.join()
+        await asyncio.sleep(0.01)
+        first = _payloads(manager)
+        await relay.close()
+        return first, manager, relay.timings()
+
+    first, manager, timings = asyncio.run(run())
+
+    assert first == [{"stage": "llm_stream", "delta": "Sco"}]
+    assert _payloads(manager) == [
+        {"stage": "llm_stream", "delta": "Sco"},
+        {"stage": "llm_stream", "delta": "re: 72"},
+    ]
+    assert {f["type"] for f in manager.frames} == {"assess"}
+    assert {f["request_id"] for f in manager.frames} == {"r-1"}
+    assert timings["ttfb_ms"] is not None
+
+
+def test_partials_flush_pending_text_first_and_keep_order():
+    async def run():
+        manager = _Recorder()
+        relay = StreamRelay(manager, None, "assess", "r-2", flush_interval=10)
+        relay.token("a")
+        relay.token("b")
+        relay.partial({"chunk": 1, "chunks": 2, "score": "60.00 %"})
+        relay.token("c")
+        relay.partial({"chunk": 2, "chunks": 2, "score": "70.00 %"})
+        await relay.close()
+        return manager
+
+    manager = asyncio.run(run())
+
+    assert _payloads(manager) == [
+        {"stage": "llm_stream", "delta": "a"},
+        {"stage": "llm_stream", "delta": "b"},
+        {"stage": "partial_score", "chunk": 1, "chunks": 2, "score": "60.00 %"},
+        {"stage": "llm_stream", "delta": "c"},
+        {"stage": "partial_score", "chunk": 2, "chunks": 2, "score": "70.00 %"},
+    ]
+
+
+def test_a_failed_send_does_not_stop_the_stream():
+    class _Flaky(_Recorder):
+        async def safe_send_json(self, websocket, frame):
+            if frame["payload"].get("delta") == "x":
+                raise ConnectionError("socket closed")
+            await super().safe_send_json(websocket, frame)
+
+    async def run():
+        manager = _Flaky()
+        relay = StreamRelay(manager, None, "report", "r-3", flush_interval=10)
+        relay.token("x")
+        relay.partial({"chunk": 1})
+        await relay.close()
+        return manager
+
+    assert _payloads(asyncio.run(run())) == [{"stage": "partial_score", "chunk": 1}]
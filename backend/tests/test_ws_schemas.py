@@ -0,0 +1,30 @@
+# tests/test_ws_schemas.py
+import pytest
+from pydantic import ValidationError
+
+from schemas.ws import AssessPayload, ChatPayload, ViewReportPayload
+
+
+@pytest.mark.parametrize("schema", [AssessPayload, ViewReportPayload])
+@pytest.mark.parametrize("raw", [42, "42", " 42 "])
+def test_partner_id_accepts_numeric_ids(schema, raw):
+    assert schema.model_validate({"partner_id": raw}).partner_id == 42
+
+
+@pytest.mark.parametrize("schema", [AssessPayload, ViewReportPayload])
+@pytest.mark.parametrize("raw", ["abc", "", "4 2", 0, -3, 4.5, None])
+def test_partner_id_rejects_non_ids(schema, raw):
+    with pytest.raises(ValidationError) as info:
+        schema.model_validate({"partner_id": raw})
+    assert info.value.errors()[0]["loc"] == ("partner_id",)
+
+
+def test_partner_id_aliases_and_topic_default():
+    payload = AssessPayload.model_validate({"partner": "7", "topic": None})
+    assert (payload.partner_id, payload.topic) == (7, "general")
+    assert ViewReportPayload.model_validate({"to": 7}).partner_id == 7
+
+
+def test_chat_ids_stay_strings():
+    payload = ChatPayload.model_validate({"to": 7, "text": "  hi  ", "room": "5_7"})
+    assert (payload.to, payload.text, payload.room_id, payload.topic) == ("7", "hi", "5_7", "general")
@@ -1,15 +1,60 @@
 # app/utils/chat_utils.py
 
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 import sqlalchemy as sa
-from datetime import datetime
-from typing import List, Dict, Any
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
 
-from .helpers import ordered_pair
-from models.chat import ChatMessage
-from utils.profile_utils import find_profile_by_id
-from schemas import ConversationItem
+from .helpers import ordered_pair, parse_timestamp
+from models.chat import ChatMessage, ChatEntry, ChatReadState
+from models.user import User
+
+# characters of the last message shown in the conversation list
+CONVERSATION_SNIPPET_CHARS = 120
+
+
+def _find_conversation(db: Session, u1: int, u2: int, topic: str) -> Optional[ChatMessage]:
+    """Conversation header row for an ordered pair and topic (case-insensitive)."""
+    return (
+        db.query(ChatMessage)
+        .filter(
+            sa.text("LEAST(user1_id, user2_id) = :u1"),
+            sa.text("GREATEST(user1_id, user2_id) = :u2"),
+            sa.func.lower(ChatMessage.topic) == topic.lower(),
+        )
+        .params(u1=u1, u2=u2)
+        .first()
+    )
+
+
+def _as_user_id(v) -> Optional[int]:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _entry_to_dict(entry: ChatEntry) -> Dict[str, Any]:
+    return {
+        "seq": entry.seq,
+        "sender": str(entry.sender_id) if entry.sender_id is not None else None,
+        "text": entry.text,
+        "timestamp": entry.sent_at.isoformat() if entry.sent_at else None,
+    }
+
+
+def _messages_query(db: Session, user1_id: int, user2_id: int, topic: str):
+    u1, u2 = ordered_pair(user1_id, user2_id)
+    return (
+        db.query(ChatEntry)
+        .join(ChatMessage, ChatMessage.id == ChatEntry.chat_id)
+        .filter(
+            ChatEntry.user1_id == u1,
+            ChatEntry.user2_id == u2,
+            sa.func.lower(ChatMessage.topic) == topic.lower(),
+        )
+    )
 
 
 def create_or_update_chat(
@@ -21,144 +66,493 @@ def create_or_update_chat(
 ):
     """
     Create a new chat or update existing one for a couple and topic.
-    - If chat exists → append new messages to JSON list
+    - If chat exists → append new messages
     - Else create new chat with provided messages
     """
+    chat = _append_messages(db, user1_id, user2_id, topic, messages)
+    db.commit()
+    db.refresh(chat)
+    return chat
+
+
+def get_chat(db: Session, user1_id: int, user2_id: int, topic: str) -> List[Dict[str, Any]]:
+    """Retrieve all messages of a couple's conversation on a topic, oldest first."""
+    entries = _messages_query(db, user1_id, user2_id, topic).order_by(ChatEntry.seq).all()
+    return [_entry_to_dict(e) for e in entries]
+
+
+def get_messages_since(
+    db: Session,
+    user1_id: int,
+    user2_id: int,
+    topic: str,
+    after_seq: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Return the stored messages for a couple and topic with seq > `after_seq`, oldest first.
+    Keyed on the pair's seq rather than on sent_at, so a message that reaches the table
+    late (retried or remote flush, clock skew) is still picked up.
+    """
+    query = (
+        _messages_query(db, user1_id, user2_id, topic)
+        .filter(ChatEntry.text != "", ChatEntry.seq > (after_seq or 0))
+    )
+    return [_entry_to_dict(e) for e in query.order_by(ChatEntry.seq).all()]
+
+
+def merge_unscored(
+    persisted: List[Dict[str, Any]],
+    buffered: List[Dict[str, Any]],
+    topic: str,
+    after_seq: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Messages of `topic` with seq > `after_seq`: the persisted ones plus the entries still
+    in the room's Redis stream (decoded stream entries of every topic), deduplicated by
+    seq, oldest first. Buffered entries without a seq are skipped.
+    """
+    topic = (topic or "general").lower()
+    merged: Dict[int, Dict[str, Any]] = {m["seq"]: m for m in persisted}
+    for m in buffered:
+        seq = m.get("seq")
+        if seq is None or seq <= (after_seq or 0) or not (m.get("text") or "").strip():
+            continue
+        if (m.get("topic") or "general").lower() != topic:
+            continue
+        merged.setdefault(int(seq), {
+            "seq": int(seq),
+            "sender": str(m["sender"]) if m.get("sender") is not None else None,
+            "text": m["text"],
+            "timestamp": m.get("ts") or m.get("timestamp"),
+        })
+    return [merged[seq] for seq in sorted(merged)]
+
+
+def get_sentiment_watermark(db: Session, user1_id: int, user2_id: int, topic: str) -> int:
+    """Highest seq of the couple's conversation on `topic` already scored (0 if none)."""
     u1, u2 = ordered_pair(user1_id, user2_id)
+    chat = _find_conversation(db, u1, u2, topic)
+    return (chat.last_sentiment_seq or 0) if chat is not None else 0
 
-    chat = (
-        db.query(ChatMessage)
-        .filter(
-            and_(
-                ChatMessage.user1_id == u1,
-                ChatMessage.user2_id == u2,
-                ChatMessage.topic == topic,
-            )
-        )
-        .first()
+
+def advance_sentiment_watermark(
+    db: Session,
+    user1_id: int,
+    user2_id: int,
+    topic: str,
+    scored_seq: int,
+    scored_at: Optional[datetime] = None,
+) -> None:
+    """
+    Move the conversation's watermark forward to `scored_seq` (never backwards); the
+    header is created if the scored messages were still buffered. `last_sentiment_at`
+    is kept alongside for reference. Does not commit; callers commit it together with
+    the score it belongs to.
+    """
+    u1, u2 = ordered_pair(user1_id, user2_id)
+    topic = topic or "general"
+    stmt = pg_insert(ChatMessage).values(
+        user1_id=u1, user2_id=u2, topic=topic, messages=[],
+        last_sentiment_seq=scored_seq, last_sentiment_at=scored_at,
     )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[
+            sa.text("LEAST(user1_id, user2_id)"),
+            sa.text("GREATEST(user1_id, user2_id)"),
+            sa.text("lower(topic)"),
+        ],
+        set_={
+            "last_sentiment_seq": sa.func.greatest(ChatMessage.last_sentiment_seq, stmt.excluded.last_sentiment_seq),
+            "last_sentiment_at": sa.func.greatest(ChatMessage.last_sentiment_at, stmt.excluded.last_sentiment_at),
+        },
+    ))
 
-    if chat:
-        existing = chat.messages or []
-        existing.extend(messages)
-        chat.messages = existing
-        chat.updated_at = datetime.utcnow()
-    else:
-        chat = ChatMessage(
-            user1_id=u1,
-            user2_id=u2,
-            topic=topic,
-            messages=messages,
-        )
-        db.add(chat)
 
-    db.commit()
-    db.refresh(chat)
-    return chat
+def get_history_page(
+    db: Session,
+    user1_id: int,
+    user2_id: int,
+    topic: str,
+    before_seq: Optional[int] = None,
+    limit: int = 50,
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    One page of persisted messages, newest first, with seq < `before_seq` (keyset).
+    Served from ix_chat_messages_chat_seq, so the cost does not grow with history length.
+    Returns (messages, has_more).
+    """
+    u1, u2 = ordered_pair(user1_id, user2_id)
+    chat = _find_conversation(db, u1, u2, topic)
+    if chat is None:
+        return [], False
+    query = db.query(ChatEntry).filter(ChatEntry.chat_id == chat.id)
+    if before_seq is not None:
+        query = query.filter(ChatEntry.seq < before_seq)
+    rows = query.order_by(ChatEntry.seq.desc()).limit(limit + 1).all()
+    return [_entry_to_dict(e) for e in rows[:limit]], len(rows) > limit
+
+
+def get_max_seq(db: Session, user1_id: int, user2_id: int) -> int:
+    """Highest persisted sequence number of a pair (0 when there are no messages)."""
+    u1, u2 = ordered_pair(user1_id, user2_id)
+    return db.query(sa.func.coalesce(sa.func.max(ChatEntry.seq), 0)).filter(
+        ChatEntry.user1_id == u1, ChatEntry.user2_id == u2,
+    ).scalar()
 
 
-def get_chat(db: Session, user1_id: int, user2_id: int, topic: str) -> ChatMessage | None:
-    """Retrieve chat for given couple and topic."""
+def get_messages_after_seq(
+    db: Session,
+    user1_id: int,
+    user2_id: int,
+    after_seq: int,
+    limit: int = 500,
+) -> List[Dict[str, Any]]:
+    """Persisted messages of a pair (all topics) with seq > `after_seq`, oldest first."""
     u1, u2 = ordered_pair(user1_id, user2_id)
-    messages = db.query(ChatMessage).filter(and_(ChatMessage.user1_id == u1, ChatMessage.user2_id == u2,ChatMessage.topic == topic,)).all() 
-    return messages
-    
+    rows = (
+        db.query(ChatEntry, ChatMessage.topic)
+        .join(ChatMessage, ChatMessage.id == ChatEntry.chat_id)
+        .filter(ChatEntry.user1_id == u1, ChatEntry.user2_id == u2, ChatEntry.seq > after_seq)
+        .order_by(ChatEntry.seq)
+        .limit(limit)
+        .all()
+    )
+    return [{**_entry_to_dict(entry), "topic": topic} for entry, topic in rows]
 
 
 def clear_chat(db: Session, user1_id: int, user2_id: int, topic: str):
-    """Clear chat messages but keep row."""
-    chat = get_chat(db, user1_id, user2_id, topic)
+    """Delete a conversation's messages but keep its header row."""
+    u1, u2 = ordered_pair(user1_id, user2_id)
+    chat = _find_conversation(db, u1, u2, topic)
     if chat:
-        chat.messages = []
+        db.query(ChatEntry).filter(ChatEntry.chat_id == chat.id).delete(synchronize_session=False)
         chat.updated_at = datetime.utcnow()
         db.commit()
         db.refresh(chat)
     return chat
 
 
-def persist_messages_bulk(
+def _touch_read_state(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """
+    Advance both participants' `chat_read_state` for inserted message rows, in one
+    upsert: the pair's last seq / activity time, and the sender's own read position.
+    Re-applying the same rows is harmless (every column only moves forward).
+    """
+    states: Dict[Tuple[int, int], Dict[str, Any]] = {}
+    for row in rows:
+        for user_id, peer_id in ((row["user1_id"], row["user2_id"]), (row["user2_id"], row["user1_id"])):
+            st = states.setdefault((user_id, peer_id), {
+                "user_id": user_id, "peer_id": peer_id,
+                "last_seq": 0, "last_read_seq": 0, "last_message_at": row["sent_at"],
+            })
+            st["last_seq"] = max(st["last_seq"], row["seq"])
+            st["last_message_at"] = max(st["last_message_at"], row["sent_at"])
+            if row["sender_id"] == user_id:
+                st["last_read_seq"] = max(st["last_read_seq"], row["seq"])
+    if not states:
+        return
+    stmt = pg_insert(ChatReadState).values([states[key] for key in sorted(states)])  # stable lock order
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id", "peer_id"],
+        set_={
+            "last_seq": sa.func.greatest(ChatReadState.last_seq, stmt.excluded.last_seq),
+            "last_read_seq": sa.func.greatest(ChatReadState.last_read_seq, stmt.excluded.last_read_seq),
+            "last_message_at": sa.func.greatest(ChatReadState.last_message_at, stmt.excluded.last_message_at),
+        },
+    ))
+
+
+def _append_messages(
     db: Session,
     sender_id: int,
     receiver_id: int,
     topic: str,
     messages: List[Dict[str, str]],
-):
+) -> ChatMessage:
     """
-    Insert or update a chat conversation with multiple messages:
-    - If (user1, user2, topic) exists → append all messages to JSON list
-    - Else create new conversation row with messages
+    Append messages to the (user1, user2, topic) conversation without committing:
+    the header row in `chat` is created if missing, and the messages are inserted
+    into `chat_messages` in one executemany. Messages keep the per-room `seq` they were
+    given when buffered; any without one get the next free per-pair numbers. Rows whose
+    (pair, seq) already exists are skipped, so re-flushing the same entries is harmless.
     """
-    u1, u2 = sorted([sender_id,  receiver_id])  # ensure consistency
+    u1, u2 = sorted([int(sender_id), int(receiver_id)])  # ensure consistency
 
-    conversation = (
-        db.query(ChatMessage)
-        .filter(
-            sa.text("LEAST(user1_id, user2_id) = :u1"),
-            sa.text("GREATEST(user1_id, user2_id) = :u2"),
-            sa.func.lower(ChatMessage.topic) == topic.lower(),
-        )
-        .params(u1=u1, u2=u2)
-        .first()
-    )
+    # serialise sequence assignment for the pair until the transaction ends
+    db.execute(sa.text("SELECT pg_advisory_xact_lock(hashtextextended(:key, 0))"), {"key": f"chat:{u1}:{u2}"})
+
+    conversation = _find_conversation(db, u1, u2, topic)
+    if conversation is None:
+        conversation = ChatMessage(user1_id=u1, user2_id=u2, topic=topic, messages=[])
+        db.add(conversation)
+        db.flush()
 
-    new_msgs = []
+    seq = get_max_seq(db, u1, u2)
+
+    rows = []
+    now = datetime.utcnow()
     for msg in messages:
-        new_msgs.append({
-            "sender": msg.get("sender", sender_id),
+        if msg.get("seq") is not None:
+            msg_seq = int(msg["seq"])
+            seq = max(seq, msg_seq)
+        else:
+            seq += 1
+            msg_seq = seq
+        sent_at = parse_timestamp(msg.get("timestamp") or msg.get("ts")) or now
+        rows.append({
+            "user1_id": u1,
+            "user2_id": u2,
+            "seq": msg_seq,
+            "chat_id": conversation.id,
+            "sender_id": _as_user_id(msg.get("sender", sender_id)),
             "text": msg.get("text", ""),
-            "timestamp": msg.get("timestamp") or datetime.utcnow().isoformat(),
+            "sent_at": sent_at.replace(tzinfo=timezone.utc),
         })
-
-    if conversation:
-        msgs = conversation.messages or []
-        msgs.extend(new_msgs)
-        conversation.messages = msgs
-        conversation.updated_at = datetime.utcnow()
-    else:
-        conversation = ChatMessage(
-            user1_id=u1,
-            user2_id=u2,
-            topic=topic,
-            messages=new_msgs,
+    if rows:
+        db.execute(
+            pg_insert(ChatEntry).on_conflict_do_nothing(index_elements=["user1_id", "user2_id", "seq"]),
+            rows,
         )
-        db.add(conversation)
+        _touch_read_state(db, rows)
+    conversation.updated_at = now
+    db.flush()
+    return conversation
 
+
+def persist_messages_bulk(
+    db: Session,
+    sender_id: int,
+    receiver_id: int,
+    topic: str,
+    messages: List[Dict[str, str]],
+):
+    """
+    Append multiple messages to a chat conversation:
+    - If (user1, user2, topic) exists → insert the messages under it
+    - Else create the conversation header, then insert the messages
+    """
+    conversation = _append_messages(db, sender_id, receiver_id, topic, messages)
     db.commit()
     db.refresh(conversation)
     return conversation
 
 
+def persist_conversations_bulk(
+    db: Session,
+    batches: List[Tuple[int, int, str, List[Dict[str, str]]]],
+) -> int:
+    """
+    Persist many conversations' buffered messages in ONE transaction.
+    `batches` holds (user1_id, user2_id, topic, messages); batches of the same pair and
+    topic (case-insensitive) are merged. Either everything is committed or nothing.
+
+    The number of statements does not grow with the number of conversations:
+      1. one multi-row upsert of all conversation headers (RETURNING their ids)
+      2. only if some messages have no seq: one advisory-lock and one max(seq) query
+      3. one executemany insert of all messages (existing (pair, seq) rows are skipped)
+      4. one upsert advancing both participants' read state (inbox order, unread counts)
+    Returns the number of messages written.
+    """
+    groups: Dict[Tuple[int, int, str], Tuple[str, List[Dict[str, Any]]]] = {}
+    for user1_id, user2_id, topic, messages in batches:
+        if not messages:
+            continue
+        u1, u2 = ordered_pair(user1_id, user2_id)
+        topic = topic or "general"
+        groups.setdefault((u1, u2, topic.lower()), (topic, []))[1].extend(messages)
+    if not groups:
+        return 0
+
+    # 1. create missing headers, touch existing ones
+    upsert = (
+        pg_insert(ChatMessage)
+        .values([
+            {"user1_id": u1, "user2_id": u2, "topic": topic, "messages": []}
+            for (u1, u2, _), (topic, _) in groups.items()
+        ])
+        .on_conflict_do_update(
+            index_elements=[
+                sa.text("LEAST(user1_id, user2_id)"),
+                sa.text("GREATEST(user1_id, user2_id)"),
+                sa.text("lower(topic)"),
+            ],
+            set_={"updated_at": sa.func.now()},
+        )
+        .returning(ChatMessage.id, ChatMessage.user1_id, ChatMessage.user2_id, ChatMessage.topic)
+    )
+    chat_ids = {
+        (*ordered_pair(row.user1_id, row.user2_id), row.topic.lower()): row.id
+        for row in db.execute(upsert)
+    }
+
+    # 2. next free seq per pair, only needed for messages buffered without one
+    last_seq: Dict[Tuple[int, int], int] = {}
+    unnumbered = set()
+    for (u1, u2, _), (_, messages) in groups.items():
+        for msg in messages:
+            if msg.get("seq") is None:
+                unnumbered.add((u1, u2))
+            else:
+                last_seq[(u1, u2)] = max(last_seq.get((u1, u2), 0), int(msg["seq"]))
+    if unnumbered:
+        pairs = sorted(unnumbered)  # fixed lock order, so concurrent flushes cannot deadlock
+        db.execute(
+            sa.text("SELECT pg_advisory_xact_lock(hashtextextended(k, 0)) FROM unnest(CAST(:keys AS text[])) AS k"),
+            {"keys": [f"chat:{u1}:{u2}" for u1, u2 in pairs]},
+        )
+        persisted = (
+            db.query(ChatEntry.user1_id, ChatEntry.user2_id, sa.func.max(ChatEntry.seq))
+            .filter(sa.tuple_(ChatEntry.user1_id, ChatEntry.user2_id).in_(pairs))
+            .group_by(ChatEntry.user1_id, ChatEntry.user2_id)
+            .all()
+        )
+        for u1, u2, max_seq in persisted:
+            last_seq[(u1, u2)] = max(last_seq.get((u1, u2), 0), max_seq or 0)
+
+    # 3. all messages in one executemany
+    rows = []
+    now = datetime.utcnow()
+    for (u1, u2, topic_key), (_, messages) in groups.items():
+        for msg in messages:
+            if msg.get("seq") is not None:
+                seq = int(msg["seq"])
+            else:
+                seq = last_seq[(u1, u2)] = last_seq.get((u1, u2), 0) + 1
+            sent_at = parse_timestamp(msg.get("timestamp") or msg.get("ts")) or now
+            rows.append({
+                "user1_id": u1,
+                "user2_id": u2,
+                "seq": seq,
+                "chat_id": chat_ids[(u1, u2, topic_key)],
+                "sender_id": _as_user_id(msg.get("sender")),
+                "text": msg.get("text", ""),
+                "sent_at": sent_at.replace(tzinfo=timezone.utc),
+            })
+    db.execute(
+        pg_insert(ChatEntry).on_conflict_do_nothing(index_elements=["user1_id", "user2_id", "seq"]),
+        rows,
+    )
+    _touch_read_state(db, rows)
+    db.commit()
+    return len(rows)
 
 
-def fetch_conversations(db: Session, user_id: int) -> List[Dict[str, Any]]:
+def persist_room_batches(
+    db: Session,
+    rooms: Dict[str, List[Tuple[int, int, str, List[Dict[str, str]]]]],
+) -> Tuple[int, Dict[str, str]]:
     """
-    Fetch and deduplicate recent conversations for a given user.
-    Returns a list of dicts compatible with ConversationItem.from_raw().
+    Persist the conversations of several rooms (room_id -> persist_conversations_bulk
+    batches). All rooms go in one transaction; if that fails it is rolled back and every
+    room is retried in its own transaction, so one bad room (e.g. an unknown user id
+    tripping a foreign key) cannot hold back the others.
+    Returns (messages written, {room_id: error} for the rooms that were not committed).
     """
-    conversations = (
-        db.query(ChatMessage)
-        .filter((ChatMessage.user1_id == user_id) | (ChatMessage.user2_id == user_id))
-        .order_by(ChatMessage.updated_at.desc())
-        .all()
+    batches = [batch for room_batches in rooms.values() for batch in room_batches]
+    try:
+        return persist_conversations_bulk(db, batches), {}
+    except Exception as exc:
+        db.rollback()
+        if len(rooms) == 1:
+            return 0, {room_id: str(exc) for room_id in rooms}
+
+    written = 0
+    failed: Dict[str, str] = {}
+    for room_id, room_batches in rooms.items():
+        try:
+            written += persist_conversations_bulk(db, room_batches)
+        except Exception as exc:
+            db.rollback()
+            failed[room_id] = str(exc)
+    return written, failed
+
+
+def fetch_conversations(
+    db: Session,
+    user_id: int,
+    before: Optional[Tuple[datetime, int]] = None,
+    limit: int = 50,
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    One page of the user's conversations, most recently active first, in ONE query:
+    the user's `chat_read_state` rows (an index range on (user_id, last_message_at)),
+    joined to the peer's profile, plus LATERAL lookups of the pair's last message
+    (with its topic) and of the unread count. `before` is the (last_message_at, peer_id)
+    of the last row of the previous page. Returns (rows, has_more).
+    """
+    state = ChatReadState
+    pair_u1 = sa.func.least(state.user_id, state.peer_id)
+    pair_u2 = sa.func.greatest(state.user_id, state.peer_id)
+
+    last_message = (
+        sa.select(
+            ChatMessage.topic,
+            sa.func.left(ChatEntry.text, CONVERSATION_SNIPPET_CHARS).label("text"),
+            ChatEntry.sender_id,
+        )
+        .join(ChatMessage, ChatMessage.id == ChatEntry.chat_id)
+        .where(ChatEntry.user1_id == pair_u1, ChatEntry.user2_id == pair_u2, ChatEntry.seq == state.last_seq)
+        .lateral("last_message")
+    )
+    unread = (
+        sa.select(sa.func.count().label("n"))
+        .select_from(ChatEntry)
+        .where(
+            ChatEntry.user1_id == pair_u1,
+            ChatEntry.user2_id == pair_u2,
+            ChatEntry.seq > state.last_read_seq,
+            ChatEntry.sender_id == state.peer_id,
+        )
+        .lateral("unread")
+    )
+    query = (
+        sa.select(
+            state.peer_id, state.last_message_at, User.user_name, User.photo_url,
+            last_message.c.topic, last_message.c.text, last_message.c.sender_id, unread.c.n,
+        )
+        .join(User, User.id == state.peer_id)
+        .outerjoin(last_message, sa.true())
+        .join(unread, sa.true())
+        .where(state.user_id == user_id, state.last_seq > 0)
+        .order_by(state.last_message_at.desc(), state.peer_id.desc())
+        .limit(limit + 1)
     )
+    if before is not None:
+        query = query.where(sa.tuple_(state.last_message_at, state.peer_id) < before)
+
+    rows = db.execute(query).all()
+    return [
+        {
+            "id": row.peer_id,
+            "name": row.user_name,
+            "avatar_url": row.photo_url,
+            "topic": row.topic,
+            "last_message": row.text,
+            "last_sender": str(row.sender_id) if row.sender_id is not None else None,
+            "last_message_at": row.last_message_at,
+            "unread_count": row.n,
+        }
+        for row in rows[:limit]
+    ], len(rows) > limit
 
-    # Deduplicate by user pair
-    pair_map = {}
-    for conv in conversations:
-        pair_key = tuple(sorted([conv.user1_id, conv.user2_id]))
-        if pair_key not in pair_map:
-            pair_map[pair_key] = conv
-
-    results: List[Dict[str, Any]] = []
-    for conv in pair_map.values():
-        other_user_id = conv.user1_id if conv.user2_id == user_id else conv.user2_id
-        profile = find_profile_by_id(db, other_user_id)
-        if profile:
-            results.append({
-              "id": other_user_id,
-              "name": profile.user_name,
-              "avatar_url": profile.photo_url,
-              "topic": conv.topic,
-            })
 
-    return results
\ No newline at end of file
+def mark_conversation_read(db: Session, user_id: int, peer_id: int, seq: Optional[int] = None) -> int:
+    """
+    Record that the user has read the pair's messages up to `seq` (default: the last
+    persisted one). Never moves backwards. Returns the stored last_read_seq.
+    """
+    state = ChatReadState
+    stmt = pg_insert(state).values(
+        user_id=int(user_id), peer_id=int(peer_id), last_seq=0, last_read_seq=seq or 0,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "peer_id"],
+        set_={
+            "last_read_seq": sa.func.greatest(
+                state.last_read_seq, sa.func.coalesce(sa.bindparam("read_seq", seq, type_=sa.BigInteger), state.last_seq)
+            ),
+        },
+    ).returning(state.last_read_seq)
+    last_read = db.execute(stmt).scalar_one()
+    db.commit()
+    return last_read
@@ -1,8 +1,9 @@
 # utils/helpers.py
 import logging
+from datetime import datetime, timezone
 from decimal import Decimal, InvalidOperation
 from typing import Optional, Tuple, Callable, Any
-from core.database import SessionLocal
+from core.database import SessionLocal, AsyncSessionLocal
 
 # Define logger for this module
 logger = logging.getLogger(__name__)
@@ -30,6 +31,25 @@ def to_decimal(v) -> Optional[Decimal]:
         logger.warning(f"Cannot convert {v!r} to Decimal, returning None")
         return None
 
+def parse_timestamp(v) -> Optional[datetime]:
+    """
+    Parse an ISO timestamp string or datetime into a naive UTC datetime.
+    Returns None if the value is missing or unparseable.
+    """
+    if v is None:
+        return None
+    if isinstance(v, datetime):
+        dt = v
+    else:
+        try:
+            dt = datetime.fromisoformat(str(v).strip().replace("Z", "+00:00"))
+        except ValueError:
+            logger.warning(f"Cannot parse timestamp {v!r}, returning None")
+            return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
 def format_decimal(d: Optional[Decimal]) -> str:
     """Format Decimal to string with 2 decimal places, or 'None' if missing."""
     if d is None:
@@ -58,3 +78,22 @@ def db_call(fn: Callable[..., Any], *args, **kwargs) -> Any:
             db.close()
         except Exception:
             logger.exception("Error closing DB session in db_call")
+
+
+async def async_db_call(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Async counterpart of `db_call`: open an AsyncSession and run the sync-style
+    `fn(db, ...)` through `run_sync`. The query helpers are reused unchanged, but
+    their I/O runs on the event loop over asyncpg instead of in a worker thread.
+    Ensures rollback and logs any DB errors.
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            return await db.run_sync(fn, *args, **kwargs)
+        except Exception as exc:
+            try:
+                await db.rollback()
+            except Exception:
+                logger.exception("Rollback failed in async_db_call")
+            logger.exception(f"DB call failed in {fn.__name__}: {exc}")
+            raise
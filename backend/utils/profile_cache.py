@@ -0,0 +1,205 @@
+# utils/profile_cache.py
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from core.config import get_settings
+from core.redis import redis_client, sync_redis_client
+from models import User
+from schemas import ProfileSnapshot
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+# Session.info key collecting ids to invalidate once the session's transaction commits
+_PENDING_INVALIDATIONS = "profile_cache_invalidate"
+
+
+def _profile_key(user_id: int) -> str:
+    return f"profile:{user_id}"
+
+
+def _as_ids(user_ids: Iterable[Any]) -> List[int]:
+    return list(dict.fromkeys(int(i) for i in user_ids if i is not None))
+
+
+class ProfileCache:
+    """
+    Read-through cache of immutable ProfileSnapshot objects keyed by user id.
+
+    - tier 1: in-process LRU (PROFILE_CACHE_SIZE entries, PROFILE_CACHE_TTL seconds)
+    - tier 2 (optional, PROFILE_CACHE_REDIS): JSON snapshots in Redis shared by workers,
+      read and written with the async client by `get_shared` / `put_shared`
+    - misses of a batch are loaded from Postgres in ONE `IN` query (`get_many`, which
+      runs inside a session and never touches Redis, so it cannot block the event loop)
+
+    Profile writes must call `invalidate_on_commit(session, ids)`; once the transaction
+    commits the ids are dropped from this worker's LRU and from Redis, so a concurrent
+    reader cannot re-cache the old row. Other workers' LRU tiers pick up the change
+    within the TTL. Missing users are not cached, so a new signup is visible immediately.
+    """
+    _instance: Optional["ProfileCache"] = None
+
+    def __init__(self) -> None:
+        self._entries: "OrderedDict[int, Tuple[float, ProfileSnapshot]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+        self._pending: Set[asyncio.Task] = set()  # Redis invalidations started on the event loop
+
+    @classmethod
+    def instance(cls) -> "ProfileCache":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    # ---------------- Lookups ----------------
+    def get(self, session: Session, user_id: Any) -> Optional[ProfileSnapshot]:
+        """Snapshot of one profile, or None if the user does not exist."""
+        if user_id is None:
+            return None
+        return self.get_many(session, [user_id]).get(int(user_id))
+
+    def get_many(self, session: Session, user_ids: Iterable[Any]) -> Dict[int, ProfileSnapshot]:
+        """Snapshots for the given ids ({id: snapshot}) from the LRU, else Postgres; unknown ids are left out."""
+        ids = _as_ids(user_ids)
+        found = self._local_get(ids)
+        missing = [i for i in ids if i not in found]
+        if missing:
+            self.misses += len(missing)
+            rows = session.query(User).filter(User.id.in_(missing)).all()
+            loaded = {row.id: ProfileSnapshot.model_validate(row) for row in rows}
+            self._local_put(loaded.values())
+            found.update(loaded)
+        return found
+
+    async def get_shared(self, user_ids: Iterable[Any]) -> Dict[int, ProfileSnapshot]:
+        """Snapshots found in the LRU or, with PROFILE_CACHE_REDIS, in Redis; no DB access."""
+        ids = _as_ids(user_ids)
+        found = self._local_get(ids)
+        missing = [i for i in ids if i not in found]
+        if missing and settings.PROFILE_CACHE_REDIS:
+            shared = await self._redis_get(missing)
+            self._local_put(shared.values())
+            found.update(shared)
+        return found
+
+    async def put_shared(self, snapshots: Iterable[ProfileSnapshot]) -> None:
+        """Publish snapshots loaded from Postgres to the Redis tier (no-op without it)."""
+        snapshots = list(snapshots)
+        if not snapshots or not settings.PROFILE_CACHE_REDIS:
+            return
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for snapshot in snapshots:
+                    pipe.set(_profile_key(snapshot.id), snapshot.model_dump_json(), ex=settings.PROFILE_CACHE_TTL)
+                await pipe.execute()
+        except Exception as exc:
+            self.redis_errors += 1
+            logger.error(f"Profile cache Redis write failed: {exc}")
+
+    def invalidate_on_commit(self, session: Session, user_ids: Iterable[Any]) -> None:
+        """Invalidate the ids after `session` commits (dropped if it rolls back)."""
+        session.info.setdefault(_PENDING_INVALIDATIONS, set()).update(_as_ids(user_ids))
+
+    def invalidate(self, user_ids: Iterable[Any]) -> None:
+        ids = _as_ids(user_ids)
+        with self._lock:
+            for user_id in ids:
+                self._entries.pop(user_id, None)
+        if not ids or not settings.PROFILE_CACHE_REDIS:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            # committed on the event loop (AsyncSession): delete without blocking it
+            task = loop.create_task(self._redis_delete(ids))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+            return
+        try:
+            sync_redis_client.delete(*(_profile_key(i) for i in ids))
+        except Exception as exc:
+            self.redis_errors += 1
+            logger.error(f"Failed to invalidate cached profiles {ids} in Redis: {exc}")
+
+    # ---------------- In-process tier ----------------
+    def _local_get(self, ids: List[int]) -> Dict[int, ProfileSnapshot]:
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for user_id in ids:
+                entry = self._entries.get(user_id)
+                if entry is None:
+                    continue
+                if entry[0] <= now:
+                    del self._entries[user_id]
+                    continue
+                self._entries.move_to_end(user_id)
+                found[user_id] = entry[1]
+            self.hits += len(found)
+        return found
+
+    def _local_put(self, snapshots: Iterable[ProfileSnapshot]) -> None:
+        expires = time.monotonic() + settings.PROFILE_CACHE_TTL
+        with self._lock:
+            for snapshot in snapshots:
+                self._entries[snapshot.id] = (expires, snapshot)
+                self._entries.move_to_end(snapshot.id)
+            while len(self._entries) > settings.PROFILE_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    # ---------------- Redis tier ----------------
+    async def _redis_get(self, ids: List[int]) -> Dict[int, ProfileSnapshot]:
+        try:
+            values = await redis_client.mget([_profile_key(i) for i in ids])
+        except Exception as exc:
+            self.redis_errors += 1
+            logger.error(f"Profile cache Redis read failed: {exc}")
+            return {}
+        found = {
+            user_id: ProfileSnapshot.model_validate_json(value)
+            for user_id, value in zip(ids, values) if value
+        }
+        self.redis_hits += len(found)
+        return found
+
+    async def _redis_delete(self, ids: List[int]) -> None:
+        try:
+            await redis_client.delete(*(_profile_key(i) for i in ids))
+        except Exception as exc:
+            self.redis_errors += 1
+            logger.error(f"Failed to invalidate cached profiles {ids} in Redis: {exc}")
+
+    # ---------------- Introspection ----------------
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "redis_errors": self.redis_errors,
+        }
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    ids = session.info.pop(_PENDING_INVALIDATIONS, None)
+    if ids:
+        ProfileCache.instance().invalidate(ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session: Session) -> None:
+    session.info.pop(_PENDING_INVALIDATIONS, None)
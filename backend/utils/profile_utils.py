@@ -6,8 +6,10 @@ from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
 from routes.deps import get_db
-from schemas import UserOut, SignupRequest
+from schemas import UserOut, ProfileSnapshot, SignupRequest
 from models import User
+from utils.helpers import async_db_call
+from utils.profile_cache import ProfileCache
 
 
 def load_profiles(session: Session, limit: int = 100) -> List[UserOut]:
@@ -67,6 +69,9 @@ def add_profile(session: Session = None, profile: Union[SignupRequest, dict] = N
         session.rollback()
         raise HTTPException(status_code=400, detail="Email already exists") from exc
 
+    # after the caller's commit, so a concurrent read cannot re-cache the old row
+    ProfileCache.instance().invalidate_on_commit(session, [user.id])
+
     return {
         "status": "success",
         "id": user.id,
@@ -88,6 +93,39 @@ def find_profile_by_id(session: Session = None, id: Union[int, str] = None) -> O
     return session.query(User).filter(User.id == int(id)).first()
 
 
+def get_profile(session: Session = None, id: Union[int, str] = None) -> Optional[ProfileSnapshot]:
+    """
+    Cached, read-only profile snapshot for the given id, or None if not found.
+    Prefer this over find_profile_by_id() on hot read paths; use the ORM lookup
+    only when the row itself is needed (e.g. password checks or writes).
+    """
+    if session is None:
+        raise ValueError("session is required")
+    return ProfileCache.instance().get(session, id)
+
+
+def get_profiles(session: Session = None, ids: List[Union[int, str]] = None) -> Dict[int, ProfileSnapshot]:
+    """Cached snapshots for many ids ({id: snapshot}); cache misses are loaded in one IN query."""
+    if session is None:
+        raise ValueError("session is required")
+    return ProfileCache.instance().get_many(session, ids or [])
+
+
+async def async_get_profiles(ids: List[Union[int, str]]) -> Dict[int, ProfileSnapshot]:
+    """
+    get_profiles() for code on the event loop: the LRU and Redis tiers are read (and
+    filled) with the async client, and only the remaining misses go to Postgres.
+    """
+    cache = ProfileCache.instance()
+    found = await cache.get_shared(ids or [])
+    missing = [i for i in ids or [] if i is not None and int(i) not in found]
+    if missing:
+        loaded = await async_db_call(get_profiles, missing)
+        await cache.put_shared(loaded.values())
+        found.update(loaded)
+    return found
+
+
 def find_profile_by_email_id(session: Session = None, email_id: Optional[str] = None) -> Optional[User]:
     """
     Return the User ORM object for the given email_id, or None if not found.
@@ -1,15 +1,42 @@
 # app/utils/report_utils.py
 
-from typing import Optional, Union, Dict
+from typing import Any, Dict, List, Optional, Tuple, Union
 from datetime import datetime
 from decimal import Decimal
 
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 from models import Report, User
+from models.chat import ChatEntry, ChatMessage
 from .profile_utils import find_profile_by_id
+from .chat_utils import _entry_to_dict, advance_sentiment_watermark
 from services.horoscope import horoscope_score
 from .helpers import ordered_pair, to_decimal, format_decimal
 
+# conflict target matching the unique `ix_report` index
+REPORT_PAIR_INDEX = [sa.text("LEAST(user1_id, user2_id)"), sa.text("GREATEST(user1_id, user2_id)")]
+
+
+def _running_totals(score):
+    """SQL for the row's running (sum, count, avg) after adding `score` to it."""
+    new_sum = sa.func.coalesce(Report.sentiment_sum, 0) + score
+    new_count = sa.func.coalesce(Report.sentiment_count, 0) + 1
+    return new_sum, new_count, sa.func.round(new_sum / new_count, 2)
+
+
+def _scored_at(scored_at: Optional[datetime]):
+    return scored_at if scored_at is not None else sa.func.now()
+
+
+def _report_dict(row) -> Dict[str, str]:
+    """get_report()-shaped result from a RETURNING (horoscope_score, sentiment_count, sentiment_avg) row."""
+    return {
+        "status": "success",
+        "horoscope_score": format_decimal(row.horoscope_score) if row.horoscope_score is not None else "None",
+        "compatibility_score": format_decimal(row.sentiment_avg) if row.sentiment_count else "No data available",
+    }
+
 
 def create_report(
     session: Session,
@@ -19,40 +46,39 @@ def create_report(
 ) -> Dict[str, str]:
     """
     Create a report for user1 and user2 if missing.
-    - If report already exists -> return {"status": "already_exists", ... scores ...}
-    - If not exists -> create it using `horoscope_val` if provided, otherwise attempt to compute
-      horoscope_score(user1_obj, user2_obj) as before. Returns {"status": "success", ...}.
+    - If report already exists -> return {"status": "fail", "error": ...}
+    - If not exists -> create it with `horoscope_val` (may be None). Returns {"status": "success", ...}.
     Notes:
       - Accepts User objects or integer IDs for user1/user2.
       - Initializes horoscope_score (if available), sentiment_sum=0, sentiment_count=0, sentiment_avg=None.
     """
 
     u1, u2 = ordered_pair(user1_id, user2_id)
-    
-    report = None
 
-    report = session.query(Report).filter(Report.user1_id == u1, Report.user2_id == u2).first()
- 
-    if report is not None:
-        return {"status": "fail", "error": "Report already exists"}
-
-
-    report = Report(
-        user1_id=u1,
-        user2_id=u2,
-        horoscope_score=horoscope_val,
-        sentiment_sum=Decimal("0"),
-        sentiment_count=0,
-        sentiment_avg=None,
-        last_sentiment_at=None,
+    # one statement: insert unless the pair already has a report (race-free)
+    stmt = (
+        pg_insert(Report)
+        .values(
+            user1_id=u1,
+            user2_id=u2,
+            horoscope_score=horoscope_val,
+            sentiment_sum=Decimal("0"),
+            sentiment_count=0,
+            sentiment_avg=None,
+            last_sentiment_at=None,
+        )
+        .on_conflict_do_nothing(index_elements=REPORT_PAIR_INDEX)
+        .returning(Report.horoscope_score)
     )
-    session.add(report)
-    session.commit() 
+    created = session.execute(stmt).first()
+    session.commit()
 
+    if created is None:
+        return {"status": "fail", "error": "Report already exists"}
 
     return {
         "status": "success",
-        "horoscope_score": format_decimal(report.horoscope_score) if report.horoscope_score is not None else "None",
+        "horoscope_score": format_decimal(created.horoscope_score) if created.horoscope_score is not None else "None",
         "compatibility_score": "No data available",
     }
 
@@ -76,36 +102,125 @@ def get_report(session: Session, user1_id: int, user2_id: int) -> Dict[str, str]
     }
 
 
-def update_report(session: Session, user1_id: int, user2_id: int, new_score: Decimal) -> Dict[str, str]:
+def get_sentiment_state(session: Session, user1_id: int, user2_id: int) -> Optional[Dict]:
     """
-    Add a new sentiment score and update running sum/count/avg.
-    - If report does not exist -> return {"error": "Report does not exist"}.
-    - If exists -> perform the update and return {"status": "success", ...scores...}.
+    Return the running sentiment state for a pair (order-agnostic), or None if no report.
+    The state is what incremental assessment carries over between runs:
+    {"sentiment_avg", "sentiment_count", "last_sentiment_at"}.
     """
     u1, u2 = ordered_pair(user1_id, user2_id)
-
     report = session.query(Report).filter(Report.user1_id == u1, Report.user2_id == u2).first()
     if report is None:
-        return {"status": "fail", "error": "Report does not exist"}
-
-
-    new_score_dec = to_decimal(new_score)
+        return None
 
-    current_sum = report.sentiment_sum or Decimal("0")
-    current_count = report.sentiment_count or 0
-
-    new_sum = current_sum + new_score_dec
-    new_count = current_count + 1
-    new_avg = (new_sum / Decimal(new_count)).quantize(Decimal("0.01"))
+    return {
+        "sentiment_avg": report.sentiment_avg if report.sentiment_count else None,
+        "sentiment_count": report.sentiment_count or 0,
+        "last_sentiment_at": report.last_sentiment_at,
+    }
 
-    report.sentiment_sum = new_sum
-    report.sentiment_count = new_count
-    report.sentiment_avg = new_avg
-    report.last_sentiment_at = datetime.utcnow()
 
+def get_assessment_inputs(
+    session: Session, user1_id: int, user2_id: int, topic: str
+) -> Tuple[Optional[Dict], Dict[str, str], int, List[Dict[str, Any]]]:
+    """
+    Everything an assessment reads, in ONE statement (a single DB round trip): the pair's
+    report LEFT JOINed to the topic's conversation header and to that conversation's
+    messages above its sentiment watermark.
+    Returns (state, report, after_seq, messages):
+    - state: as get_sentiment_state() (None if no report)
+    - report: as get_report()
+    - after_seq: as get_sentiment_watermark()
+    - messages: as get_messages_since(after_seq), oldest first
+    """
+    u1, u2 = ordered_pair(user1_id, user2_id)
+    watermark = sa.func.coalesce(ChatMessage.last_sentiment_seq, 0)
+    # one anchor row, so the report and watermark come back even with no new messages
+    anchor = sa.select(sa.literal(1).label("one")).subquery()
+    stmt = (
+        sa.select(
+            Report.id.label("report_id"), Report.horoscope_score, Report.sentiment_count,
+            Report.sentiment_avg, Report.last_sentiment_at, watermark.label("after_seq"),
+            ChatEntry.seq, ChatEntry.sender_id, ChatEntry.text, ChatEntry.sent_at,
+        )
+        .select_from(anchor)
+        .outerjoin(Report, sa.and_(Report.user1_id == u1, Report.user2_id == u2))
+        .outerjoin(ChatMessage, sa.and_(
+            sa.func.least(ChatMessage.user1_id, ChatMessage.user2_id) == u1,
+            sa.func.greatest(ChatMessage.user1_id, ChatMessage.user2_id) == u2,
+            sa.func.lower(ChatMessage.topic) == (topic or "general").lower(),
+        ))
+        .outerjoin(ChatEntry, sa.and_(
+            ChatEntry.chat_id == ChatMessage.id,
+            ChatEntry.seq > watermark,
+            ChatEntry.text != "",
+        ))
+        .order_by(ChatEntry.seq)
+    )
+    rows = session.execute(stmt).all()
+    head = rows[0]
+
+    if head.report_id is None:
+        state, report = None, {"status": "fail", "error": "Report does not exist"}
+    else:
+        state = {
+            "sentiment_avg": head.sentiment_avg if head.sentiment_count else None,
+            "sentiment_count": head.sentiment_count or 0,
+            "last_sentiment_at": head.last_sentiment_at,
+        }
+        report = _report_dict(head)
+    messages = [_entry_to_dict(row) for row in rows if row.seq is not None]
+    return state, report, head.after_seq, messages
+
+
+def accumulate_report_score(
+    session: Session,
+    user1_id: int,
+    user2_id: int,
+    new_score: Decimal,
+    scored_at: Optional[datetime] = None,
+    horoscope_val: Optional[Decimal] = None,
+    topic: Optional[str] = None,
+    scored_seq: Optional[int] = None,
+) -> Dict[str, str]:
+    """
+    Create-or-accumulate in ONE statement (INSERT .. ON CONFLICT DO UPDATE .. RETURNING),
+    keyed on the `ix_report` LEAST/GREATEST index, then commit:
+    - no report yet -> created with `horoscope_val` and this score as its first sample
+    - report exists -> score added to the running sum/count/avg; last_sentiment_at only
+      moves forward; an existing horoscope_score is kept
+    - `topic` and `scored_seq` given -> that conversation's sentiment watermark moves to
+      `scored_seq` in the same transaction (the pair's report aggregates all topics)
+    Concurrent assessments of the same pair serialise on the row, so none is lost.
+    Returns the same shape as get_report().
+    """
+    u1, u2 = ordered_pair(user1_id, user2_id)
+    score = to_decimal(new_score)
 
-    return {
-        "status": "success",
-        "horoscope_score": format_decimal(report.horoscope_score) if report.horoscope_score is not None else "None",
-        "compatibility_score": format_decimal(report.sentiment_avg) if report.sentiment_count else "No data available",
-    }
+    stmt = pg_insert(Report).values(
+        user1_id=u1,
+        user2_id=u2,
+        horoscope_score=horoscope_val,
+        sentiment_sum=score,
+        sentiment_count=1,
+        sentiment_avg=score.quantize(Decimal("0.01")),
+        last_sentiment_at=_scored_at(scored_at),
+    )
+    new_sum, new_count, new_avg = _running_totals(stmt.excluded.sentiment_sum)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=REPORT_PAIR_INDEX,
+        set_={
+            "sentiment_sum": new_sum,
+            "sentiment_count": new_count,
+            "sentiment_avg": new_avg,
+            "last_sentiment_at": sa.func.greatest(Report.last_sentiment_at, stmt.excluded.last_sentiment_at),
+            "horoscope_score": sa.func.coalesce(Report.horoscope_score, stmt.excluded.horoscope_score),
+            "updated_at": sa.func.now(),
+        },
+    ).returning(Report.horoscope_score, Report.sentiment_count, Report.sentiment_avg)
+
+    row = session.execute(stmt).one()
+    if topic is not None and scored_seq is not None:
+        advance_sentiment_watermark(session, u1, u2, topic, scored_seq, _scored_at(scored_at))
+    session.commit()
+    return _report_dict(row)
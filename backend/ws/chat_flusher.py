@@ -0,0 +1,312 @@
+# ws/chat_flusher.py
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from core.config import get_settings
+from core.redis import (
+    CHAT_FLUSH_GROUP, CHAT_ROOMS_KEY, chat_stream_key, decode_stream_entry, redis_client,
+)
+from services.db_telemetry import db_telemetry
+from services.llm_telemetry import Histogram
+from utils.chat_utils import persist_room_batches
+from utils.helpers import async_db_call, parse_timestamp
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Flush lag (ms from a message being buffered to it being committed)
+LAG_BUCKETS_MS: List[float] = [100, 500, 1000, 5000, 10000, 30000, 60000, 300000, 900000]
+BATCH_ROOM_BUCKETS: List[float] = [1, 2, 5, 10, 25, 50, 100]
+BATCH_MESSAGE_BUCKETS: List[float] = [1, 10, 50, 100, 250, 500, 1000, 5000]
+
+# XACK + XDEL the committed entries (ARGV[4..]) of the room stream, then either drop the
+# empty stream and remove the room from the index, or re-arm it with the current time.
+_COMMIT_SCRIPT = """
+if #ARGV > 3 then
+  redis.call('XACK', KEYS[1], ARGV[1], unpack(ARGV, 4))
+  redis.call('XDEL', KEYS[1], unpack(ARGV, 4))
+end
+local left = redis.call('XLEN', KEYS[1])
+if left == 0 then
+  redis.call('DEL', KEYS[1])
+  redis.call('ZREM', KEYS[2], ARGV[2])
+else
+  redis.call('ZADD', KEYS[2], ARGV[3], ARGV[2])
+end
+return left
+"""
+
+# Release a lock only if we still own it
+_UNLOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+# HASH room_id -> consecutive failed flushes, drives the retry backoff of a failing room
+FAILURES_KEY = "chat:flush_failures"
+
+
+def _lock_key(room_id: str) -> str:
+    return f"chat:lock:{room_id}"
+
+
+def _room_pair(room_id: str, messages: List[Dict[str, Any]]) -> Optional[Tuple[int, int]]:
+    """Participants of a room as an ordered (int, int) pair, or None if undeterminable."""
+    participants = set()
+    for msg in messages:
+        if msg.get("sender"):
+            participants.add(str(msg["sender"]))
+        if msg.get("receiver"):
+            participants.add(str(msg["receiver"]))
+
+    # Fallback: derive participants from room_id if needed
+    if len(participants) < 2 and "_" in room_id:
+        for p in room_id.split("_")[:2]:
+            participants.add(str(p))
+
+    if len(participants) < 2:
+        logger.warning(f"Could not determine both participants for room {room_id}, skipping flush.")
+        return None
+    u1_str, u2_str = sorted(participants)[:2]
+    try:
+        return int(u1_str), int(u2_str)
+    except ValueError:
+        logger.warning(f"Non-numeric participant IDs in room {room_id}, skipping flush.")
+        return None
+
+
+class ChatFlusher:
+    """
+    Write-behind flusher for the Redis chat buffers.
+
+    Rooms are indexed in the `chat:rooms` ZSET by when their buffer became pending.
+    A background loop flushes rooms whose buffer is older than CHAT_FLUSH_MAX_AGE or
+    that were marked due for holding CHAT_FLUSH_MAX_MESSAGES. Disconnects flush the
+    user's rooms through the same path.
+
+    - a per-room Redis lock ensures only one worker flushes a room at a time
+    - up to CHAT_FLUSH_BATCH_ROOMS rooms are written in one DB transaction; messages
+      are grouped by (pair, topic), so every topic lands in its own conversation
+    - if that transaction fails every room is retried in its own transaction; rooms
+      that still fail are left unacked and re-armed with an exponential backoff
+      (CHAT_FLUSH_RETRY_BASE_DELAY .. CHAT_FLUSH_RETRY_MAX_DELAY) so they cannot keep
+      failing the batches of healthy rooms
+    - room streams are read incrementally through the `flusher` consumer group:
+      entries left pending by a crashed or failed flush are re-claimed first, then
+      new ones are read; only committed entries are XACKed and deleted, so a failed
+      batch leaves everything pending for the next pass
+    """
+    _instance: Optional["ChatFlusher"] = None
+
+    def __init__(self) -> None:
+        self._task: Optional[asyncio.Task] = None
+        self.consumer = f"{socket.gethostname()}:{os.getpid()}"
+        self._commit = redis_client.register_script(_COMMIT_SCRIPT)
+        self._unlock = redis_client.register_script(_UNLOCK_SCRIPT)
+        self.lag = Histogram(LAG_BUCKETS_MS)
+        self.batch_rooms = Histogram(BATCH_ROOM_BUCKETS)
+        self.batch_messages = Histogram(BATCH_MESSAGE_BUCKETS)
+        self.flushed_rooms = 0
+        self.flushed_conversations = 0
+        self.flushed_messages = 0
+        self.failed_batches = 0
+        self.failed_rooms = 0
+        self.lock_conflicts = 0
+
+    @classmethod
+    def instance(cls) -> "ChatFlusher":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    # ---------------- Lifecycle ----------------
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            logger.info("ChatFlusher started")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.CHAT_FLUSH_INTERVAL)
+            try:
+                await self.flush_due()
+            except Exception as exc:
+                logger.error(f"Chat flush pass failed: {exc}")
+
+    # ---------------- Flushing ----------------
+    async def flush_due(self) -> int:
+        """Flush every room that is past the age threshold or marked due; returns messages written."""
+        cutoff = time.time() - settings.CHAT_FLUSH_MAX_AGE
+        rooms = await redis_client.zrangebyscore(CHAT_ROOMS_KEY, "-inf", cutoff)
+        return await self.flush_rooms(rooms)
+
+    async def flush_rooms(self, room_ids: Iterable[str]) -> int:
+        """Flush the given rooms now, CHAT_FLUSH_BATCH_ROOMS per transaction."""
+        room_ids = list(dict.fromkeys(room_ids))
+        size = max(1, settings.CHAT_FLUSH_BATCH_ROOMS)
+        written = 0
+        for i in range(0, len(room_ids), size):
+            written += await self._flush_batch(room_ids[i:i + size])
+        return written
+
+    async def _flush_batch(self, room_ids: List[str]) -> int:
+        token = uuid.uuid4().hex
+        locked = []
+        for room_id in room_ids:
+            if await redis_client.set(_lock_key(room_id), token, nx=True, ex=settings.CHAT_FLUSH_LOCK_TTL):
+                locked.append(room_id)
+            else:
+                self.lock_conflicts += 1
+        if not locked:
+            return 0
+
+        try:
+            buffers = await self._read(locked)
+
+            batches: Dict[str, List[Tuple[int, int, str, List[Dict[str, Any]]]]] = {}
+            taken: Dict[str, List[str]] = {}  # room -> entry ids committed (acked afterwards)
+            oldest: Dict[str, datetime] = {}
+            for room_id, messages in zip(locked, buffers):
+                taken[room_id] = []
+                if not messages:
+                    continue
+                pair = _room_pair(room_id, messages)
+                if pair is None:
+                    continue  # stays pending; re-armed below so it is retried after MAX_AGE
+                # a room carries every topic of the pair; each topic is its own conversation
+                by_topic: Dict[str, List[Dict[str, Any]]] = {}
+                for msg in messages:
+                    by_topic.setdefault(msg.get("topic") or "general", []).append(msg)
+                batches[room_id] = [(pair[0], pair[1], topic, msgs) for topic, msgs in by_topic.items()]
+                taken[room_id] = [m["id"] for m in messages]
+                stamps = [ts for ts in (parse_timestamp(m.get("ts") or m.get("timestamp")) for m in messages) if ts]
+                if stamps:
+                    oldest[room_id] = min(stamps)
+
+            written = 0
+            failed: Dict[str, str] = {}
+            if batches:
+                try:
+                    with db_telemetry.scope("chat_flush"):
+                        written, failed = await async_db_call(persist_room_batches, batches)
+                except Exception as exc:
+                    failed = {room_id: str(exc) for room_id in batches}
+                if failed:
+                    self.failed_batches += 1
+                    self.failed_rooms += len(failed)
+                    for room_id, error in failed.items():
+                        logger.error(f"Flushing room {room_id} to DB failed, retrying later: {error}")
+                        del batches[room_id], taken[room_id]
+                        oldest.pop(room_id, None)
+                    await self._defer(list(failed))
+
+            # one round trip; each script call is still atomic for its room
+            now = time.time()
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for room_id, ids in taken.items():
+                    await self._commit(keys=[chat_stream_key(room_id), CHAT_ROOMS_KEY],
+                                       args=[CHAT_FLUSH_GROUP, room_id, now, *ids], client=pipe)
+                if batches:
+                    pipe.hdel(FAILURES_KEY, *batches)
+                await pipe.execute()
+
+            if batches:
+                committed_at = datetime.utcnow()
+                for ts in oldest.values():
+                    self.lag.observe(max(0.0, (committed_at - ts).total_seconds() * 1000))
+                conversations = sum(len(room_batches) for room_batches in batches.values())
+                self.batch_rooms.observe(len(batches))
+                self.batch_messages.observe(written)
+                self.flushed_rooms += len(batches)
+                self.flushed_conversations += conversations
+                self.flushed_messages += written
+                logger.info(f"Flushed {written} messages of {conversations} conversations from {len(batches)} rooms to DB")
+            return written
+        finally:
+            for room_id in locked:
+                try:
+                    await self._unlock(keys=[_lock_key(room_id)], args=[token])
+                except Exception as exc:
+                    logger.error(f"Failed to release flush lock for room {room_id}: {exc}")
+
+    async def _defer(self, room_ids: List[str]) -> None:
+        """
+        Re-arm failed rooms so they become due again only after a backoff that doubles
+        with each consecutive failure. Their entries stay pending in the stream.
+        """
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for room_id in room_ids:
+                pipe.hincrby(FAILURES_KEY, room_id, 1)
+            failures = await pipe.execute()
+
+        # flush_due picks rooms whose score is older than CHAT_FLUSH_MAX_AGE
+        due_from = time.time() - settings.CHAT_FLUSH_MAX_AGE
+        scores = {}
+        for room_id, count in zip(room_ids, failures):
+            delay = min(settings.CHAT_FLUSH_RETRY_MAX_DELAY,
+                        settings.CHAT_FLUSH_RETRY_BASE_DELAY * 2 ** (int(count) - 1))
+            scores[room_id] = due_from + delay
+        await redis_client.zadd(CHAT_ROOMS_KEY, scores)
+
+    async def _read(self, room_ids: List[str]) -> List[List[Dict[str, Any]]]:
+        """
+        Unacked entries of each room stream, oldest first: entries already delivered to
+        the group but never acked (failed or crashed flushes) are claimed, then new
+        entries are read. Safe because the caller holds the room lock.
+        """
+        count = settings.CHAT_FLUSH_READ_COUNT
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for room_id in room_ids:
+                # create the group at the start of the stream; BUSYGROUP when it exists
+                pipe.xgroup_create(chat_stream_key(room_id), CHAT_FLUSH_GROUP, id="0", mkstream=True)
+            await pipe.execute(raise_on_error=False)
+
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for room_id in room_ids:
+                key = chat_stream_key(room_id)
+                pipe.xautoclaim(key, CHAT_FLUSH_GROUP, self.consumer, min_idle_time=0,
+                                start_id="0-0", count=count)
+                pipe.xreadgroup(CHAT_FLUSH_GROUP, self.consumer, {key: ">"}, count=count)
+            replies = await pipe.execute()
+
+        buffers = []
+        for i in range(len(room_ids)):
+            claimed = replies[2 * i][1]
+            fresh = replies[2 * i + 1][0][1] if replies[2 * i + 1] else []
+            buffers.append([
+                decode_stream_entry(entry_id, fields)
+                for entry_id, fields in list(claimed) + list(fresh)
+                if fields  # claimed entries deleted meanwhile come back empty
+            ])
+        return buffers
+
+    # ---------------- Introspection ----------------
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "rooms_pending": await redis_client.zcard(CHAT_ROOMS_KEY),
+            "flushed_rooms": self.flushed_rooms,
+            "flushed_conversations": self.flushed_conversations,
+            "flushed_messages": self.flushed_messages,
+            "failed_batches": self.failed_batches,
+            "failed_rooms": self.failed_rooms,
+            "rooms_backing_off": await redis_client.hlen(FAILURES_KEY),
+            "lock_conflicts": self.lock_conflicts,
+            "lag_ms": self.lag.snapshot(),
+            "batch_rooms": self.batch_rooms.snapshot(),
+            "batch_messages": self.batch_messages.snapshot(),
+        }
@@ -0,0 +1,102 @@
+# ws/chat_replay.py
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import WebSocket
+
+from core.config import get_settings
+from core.redis import get_messages_from_cache, pop_offline_messages
+from utils.chat_utils import get_messages_after_seq
+from utils.helpers import async_db_call
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def parse_resume(resume: Optional[str]) -> Dict[str, int]:
+    """`?resume=1_2:41,1_7:3` -> {"1_2": 41, "1_7": 3} (last seq the client has per room)."""
+    cursors: Dict[str, int] = {}
+    for part in (resume or "").split(","):
+        room_id, _, seq = part.strip().rpartition(":")
+        if room_id and seq.isdigit():
+            cursors[room_id] = int(seq)
+    return cursors
+
+
+def _room_pair(room_id: str, user_id: str) -> Optional[tuple]:
+    """(u1, u2) of a pair room the user belongs to, else None."""
+    parts = room_id.split("_")
+    if len(parts) != 2 or not all(p.isdigit() for p in parts) or user_id not in parts:
+        return None
+    return int(parts[0]), int(parts[1])
+
+
+async def _missed_in_room(room_id: str, pair: tuple, after_seq: int) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Messages of the room with seq > after_seq, oldest first: persisted ones, then
+    still-buffered ones, at most CHAT_RESUME_MAX_MESSAGES. Returns (messages, has_more).
+    """
+    limit = settings.CHAT_RESUME_MAX_MESSAGES
+    # one extra row tells whether anything is left beyond the limit
+    persisted = await async_db_call(get_messages_after_seq, pair[0], pair[1], after_seq, limit + 1)
+    missed: Dict[int, Dict[str, Any]] = {}
+    for m in persisted:
+        missed[m["seq"]] = {
+            "room_id": room_id, "sender": m["sender"], "text": m["text"],
+            "topic": m.get("topic"), "ts": m["timestamp"], "seq": m["seq"],
+        }
+    for m in await get_messages_from_cache(room_id):
+        seq = m.get("seq")
+        if seq is not None and seq > after_seq:
+            missed.setdefault(seq, {"room_id": room_id, **m})
+    ordered = [missed[seq] for seq in sorted(missed)]
+    return ordered[:limit], len(ordered) > limit
+
+
+async def replay_missed(manager, websocket: WebSocket, user_id: str, resume: Optional[str]) -> int:
+    """
+    Send everything the user missed in ONE `chat_replay` frame: messages after the
+    client's last-seen seq for each room in `resume`, plus the user's offline queue.
+    Entries are deduplicated by (room_id, seq). Returns the number of messages sent.
+
+    A room with more than CHAT_RESUME_MAX_MESSAGES missed messages is replayed from
+    its oldest ones and listed in `has_more` with the seq to continue after; the client pages
+    the newer ones through /chat_history (or resumes again from that seq).
+    """
+    rooms: Dict[str, List[Dict[str, Any]]] = {}
+    has_more: Dict[str, int] = {}
+    seen = set()
+
+    def _add(msg: Dict[str, Any]) -> None:
+        key = (msg.get("room_id"), msg.get("seq"))
+        if msg.get("seq") is not None and key in seen:
+            return
+        seen.add(key)
+        rooms.setdefault(msg.get("room_id") or "", []).append(msg)
+
+    for room_id, after_seq in parse_resume(resume).items():
+        pair = _room_pair(room_id, user_id)
+        if pair is None:
+            logger.info(f"Ignoring resume for room {room_id} not belonging to user {user_id}")
+            continue
+        missed, truncated = await _missed_in_room(room_id, pair, after_seq)
+        for msg in missed:
+            _add(msg)
+        if truncated:
+            has_more[room_id] = missed[-1]["seq"]
+
+    for msg in await pop_offline_messages(user_id):
+        _add(msg)
+
+    if not rooms:
+        return 0
+    for msgs in rooms.values():
+        msgs.sort(key=lambda m: (m.get("seq") is None, m.get("seq") or 0))
+    count = sum(len(msgs) for msgs in rooms.values())
+    await manager.safe_send_json(websocket, {
+        "type": "chat_replay", "request_id": None,
+        "payload": {"rooms": rooms, "count": count, "has_more": has_more},
+    })
+    logger.info(f"Replayed {count} missed messages in {len(rooms)} rooms to user {user_id} "
+                f"({len(has_more)} rooms truncated)")
+    return count
@@ -0,0 +1,178 @@
+# ws/cluster.py
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Iterable, List, Set
+
+from core.config import get_settings
+from core.redis import redis_client
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+NODES_KEY = "cluster:nodes"  # ZSET node_id -> heartbeat expiry (unix seconds)
+
+
+def _presence_key(user_id: str) -> str:
+    return f"presence:{user_id}"  # HASH node_id -> local socket count
+
+
+def _node_channel(node_id: str) -> str:
+    return f"ws:node:{node_id}"
+
+
+Deliver = Callable[[str, dict], Awaitable[int]]
+
+
+class ClusterBus:
+    """
+    Cross-process delivery for SocketManager over Redis pub/sub.
+
+    - every process (node) subscribes to its own channel `ws:node:<node_id>`
+    - a user -> nodes presence registry records which nodes hold the user's sockets
+    - sending to users publishes once per *other* node that holds any of them (one
+      message listing that node's users, all in one pipeline); the sending node
+      delivers to its own sockets locally without touching Redis
+    - nodes heartbeat into `cluster:nodes`; presence entries of dead nodes are ignored
+      and cleaned up lazily
+    """
+
+    def __init__(self, deliver: Deliver) -> None:
+        self.node_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._deliver = deliver
+        self._alive_nodes: Set[str] = {self.node_id}
+        self._pubsub = None
+        self._tasks = []
+        self.published = 0
+        self.received = 0
+
+    # ---------------- Lifecycle ----------------
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        await self._heartbeat_once()
+        self._pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(_node_channel(self.node_id))
+        self._tasks = [
+            asyncio.create_task(self._listen()),
+            asyncio.create_task(self._heartbeat_loop()),
+        ]
+        logger.info(f"ClusterBus started as node {self.node_id}")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pubsub is not None:
+            await self._pubsub.unsubscribe()
+            await self._pubsub.aclose()
+        await redis_client.zrem(NODES_KEY, self.node_id)
+
+    async def _heartbeat_once(self) -> None:
+        now = time.time()
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.zadd(NODES_KEY, {self.node_id: now + settings.CLUSTER_NODE_TTL})
+            pipe.zremrangebyscore(NODES_KEY, "-inf", now)
+            pipe.zrange(NODES_KEY, 0, -1)
+            *_, nodes = await pipe.execute()
+        self._alive_nodes = set(nodes)
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(max(1, settings.CLUSTER_NODE_TTL / 3))
+            try:
+                await self._heartbeat_once()
+            except Exception as exc:
+                logger.error(f"Cluster heartbeat failed: {exc}")
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    data = json.loads(message["data"])
+                    self.received += 1
+                    # "user_id": single-user messages from workers still on the old format
+                    for user_id in data.get("user_ids") or [data["user_id"]]:
+                        await self._deliver(user_id, data["obj"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error(f"Cluster listener error: {exc}")
+                await asyncio.sleep(1)
+
+    # ---------------- Presence ----------------
+    async def set_presence(self, user_id: str, local_sockets: int) -> None:
+        """Record how many sockets this node holds for the user (0 removes the entry)."""
+        if local_sockets > 0:
+            await redis_client.hset(_presence_key(user_id), self.node_id, local_sockets)
+        else:
+            await redis_client.hdel(_presence_key(user_id), self.node_id)
+
+    async def remote_nodes(self, user_id: str) -> Set[str]:
+        return (await self.remote_nodes_many([user_id]))[user_id]
+
+    async def remote_nodes_many(self, user_ids: Iterable[str]) -> Dict[str, Set[str]]:
+        """Other live nodes holding sockets for each user, in one presence round trip."""
+        user_ids = list(dict.fromkeys(user_ids))
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hkeys(_presence_key(user_id))
+            found = await pipe.execute()
+        nodes_of = {user_id: set(nodes) - {self.node_id} for user_id, nodes in zip(user_ids, found)}
+        suspects = list(set().union(*nodes_of.values()) - self._alive_nodes)
+        if not suspects:
+            return nodes_of
+        # the cached view may predate a newly started node: confirm against the registry
+        # before pruning, so a live node's presence is never deleted
+        scores = await redis_client.zmscore(NODES_KEY, suspects)
+        now = time.time()
+        dead = {node for node, score in zip(suspects, scores) if score is None or score <= now}
+        self._alive_nodes.update(set(suspects) - dead)
+        if dead:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for user_id, nodes in nodes_of.items():
+                    if nodes & dead:
+                        pipe.hdel(_presence_key(user_id), *(nodes & dead))
+                        nodes -= dead
+                await pipe.execute()
+        return nodes_of
+
+    # ---------------- Delivery ----------------
+    async def publish_to_user(self, user_id: str, obj: dict) -> int:
+        """Publish `obj` to every other node holding sockets for the user; returns node count."""
+        return await self.publish_to_users([user_id], obj)
+
+    async def publish_to_users(self, user_ids: Iterable[str], obj: dict) -> int:
+        """
+        Publish `obj` for several users (e.g. a room) with one message per other node
+        holding any of them, in a single pipeline; returns the number of nodes.
+        """
+        users_of: Dict[str, List[str]] = {}
+        for user_id, nodes in (await self.remote_nodes_many(user_ids)).items():
+            for node in nodes:
+                users_of.setdefault(node, []).append(user_id)
+        if not users_of:
+            return 0
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for node, users in users_of.items():
+                pipe.publish(_node_channel(node), json.dumps(
+                    {"user_ids": users, "obj": obj, "from": self.node_id}, default=str,
+                ))
+            await pipe.execute()
+        self.published += len(users_of)
+        return len(users_of)
+
+    def stats(self) -> dict:
+        return {
+            "node_id": self.node_id,
+            "alive_nodes": len(self._alive_nodes),
+            "published": self.published,
+            "received": self.received,
+        }
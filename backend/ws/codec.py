@@ -0,0 +1,126 @@
+# ws/codec.py
+import json
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from fastapi import WebSocket
+
+try:  # optional: binary wire format
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack not installed
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+Encoded = Union[str, bytes]
+
+SUBPROTOCOL_PREFIX = "matrimai."
+
+# Envelope and hot payload keys shortened on the binary protocol.
+# Keys not listed here are sent unchanged.
+SHORT_TAGS: Dict[str, str] = {
+    "type": "t",
+    "request_id": "r",
+    "payload": "p",
+    "meta": "m",
+    "stage": "s",
+    "status": "st",
+    "message": "msg",
+    "delta": "d",
+}
+LONG_TAGS: Dict[str, str] = {v: k for k, v in SHORT_TAGS.items()}
+
+# A key that would read back as a tag (e.g. a payload key "t"), or that starts with the
+# escape character itself, is sent with ESCAPE prepended so decoding is lossless.
+ESCAPE = "~"
+_NESTED = ("payload", "meta")
+
+
+def _shorten_key(key: str) -> str:
+    if key in SHORT_TAGS:
+        return SHORT_TAGS[key]
+    if key in LONG_TAGS or key.startswith(ESCAPE):
+        return ESCAPE + key
+    return key
+
+
+def _expand_key(key: str) -> str:
+    if key.startswith(ESCAPE):
+        return key[len(ESCAPE):]
+    return LONG_TAGS.get(key, key)
+
+
+def _retag(obj: Dict[str, Any], rename: Callable[[str], str]) -> Dict[str, Any]:
+    """Rename envelope keys and the keys of a dict payload/meta (one level down)."""
+    out = {}
+    for key, value in obj.items():
+        new_key = rename(key) if isinstance(key, str) else key
+        if isinstance(value, dict) and (key in _NESTED or new_key in _NESTED):
+            value = {rename(k) if isinstance(k, str) else k: v for k, v in value.items()}
+        out[new_key] = value
+    return out
+
+
+class JsonCodec:
+    """Default wire format: one JSON object per text frame (what the Flutter client speaks)."""
+    name = "json"
+    binary = False
+
+    def encode(self, obj: Dict[str, Any]) -> Encoded:
+        return json.dumps(obj, separators=(",", ":"), default=str)
+
+    def decode(self, data: Encoded) -> Dict[str, Any]:
+        return json.loads(data)
+
+
+class MsgPackCodec:
+    """
+    Opt-in binary wire format: MessagePack in binary frames with short field tags
+    (see SHORT_TAGS and ESCAPE). Clients that send text frames are still understood as JSON.
+    """
+    name = "msgpack"
+    binary = True
+
+    def encode(self, obj: Dict[str, Any]) -> Encoded:
+        return msgpack.packb(_retag(obj, _shorten_key), use_bin_type=True, default=str)
+
+    def decode(self, data: Encoded) -> Dict[str, Any]:
+        if isinstance(data, str):
+            return json.loads(data)
+        obj = msgpack.unpackb(data, raw=False)
+        if not isinstance(obj, dict):
+            raise ValueError("frame is not a map")
+        return _retag(obj, _expand_key)
+
+
+Codec = Union[JsonCodec, MsgPackCodec]
+
+JSON_CODEC = JsonCodec()
+CODECS: Dict[str, Codec] = {"json": JSON_CODEC}
+if msgpack is not None:
+    CODECS["msgpack"] = MsgPackCodec()
+
+
+def negotiate(websocket: WebSocket, requested: Optional[str] = None) -> Tuple[Codec, Optional[str]]:
+    """
+    Pick the codec for a new socket; returns (codec, subprotocol_to_accept).
+
+    The client opts in with `?codec=msgpack` or the `matrimai.msgpack` subprotocol.
+    Unknown or unavailable codecs fall back to JSON.
+    """
+    offered = [
+        p.strip() for p in (websocket.headers.get("sec-websocket-protocol") or "").split(",") if p.strip()
+    ]
+    subprotocol = None
+    if not requested:
+        for proto in offered:
+            if proto.startswith(SUBPROTOCOL_PREFIX) and proto[len(SUBPROTOCOL_PREFIX):] in CODECS:
+                requested, subprotocol = proto[len(SUBPROTOCOL_PREFIX):], proto
+                break
+    codec = CODECS.get((requested or "json").lower())
+    if codec is None:
+        logger.info(f"Codec {requested!r} not available; falling back to json")
+        codec = JSON_CODEC
+    if subprotocol is None and f"{SUBPROTOCOL_PREFIX}{codec.name}" in offered:
+        subprotocol = f"{SUBPROTOCOL_PREFIX}{codec.name}"
+    return codec, subprotocol
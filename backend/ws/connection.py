@@ -0,0 +1,142 @@
+# ws/connection.py
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+from fastapi import WebSocket
+
+from core.config import get_settings
+from ws.codec import JSON_CODEC, Codec
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+Frame = Union[dict, str]  # dict -> encoded with the socket's codec, str -> send_text
+
+
+class Connection:
+    """
+    One registered WebSocket with its own bounded outbound queue and writer task.
+
+    Senders call `enqueue()` which never awaits socket I/O, so a slow client only
+    delays its own frames. The writer sends frames in order with a per-send timeout;
+    a send that times out or fails marks the connection dead. Dict frames are
+    encoded with the codec negotiated at connect (JSON text or MessagePack binary).
+    When the queue is full the slow-consumer policy applies:
+      - "disconnect": the connection is closed (default)
+      - "drop_oldest": the oldest queued frame is discarded to make room
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: str,
+        on_dead: Callable[[WebSocket], Awaitable[None]],
+        max_queue: Optional[int] = None,
+        send_timeout: Optional[float] = None,
+        policy: Optional[str] = None,
+        codec: Optional[Codec] = None,
+    ) -> None:
+        self.websocket = websocket
+        self.user_id = user_id
+        self.max_queue = max_queue or settings.WS_SEND_QUEUE_SIZE
+        self.send_timeout = send_timeout or settings.WS_SEND_TIMEOUT
+        self.policy = policy or settings.WS_SLOW_CONSUMER_POLICY
+        self.codec = codec or JSON_CODEC
+        self.bytes_sent = 0
+        self.sent = 0
+        self.dropped = 0
+        self.last_seen = time.monotonic()  # last inbound frame, used by the heartbeat
+        self._queue: "asyncio.Queue[Frame]" = asyncio.Queue(maxsize=self.max_queue)
+        self._on_dead = on_dead
+        self._dead = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._writer())
+
+    def stop(self) -> None:
+        self._dead = True
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+    def touch(self) -> None:
+        """Record inbound traffic from the client (proof of liveness)."""
+        self.last_seen = time.monotonic()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def alive(self) -> bool:
+        return not self._dead
+
+    def enqueue(self, frame: Frame) -> bool:
+        """Queue a frame for sending; returns False if it was not accepted."""
+        if self._dead:
+            return False
+        try:
+            self._queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if self.policy == "drop_oldest":
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+            self._queue.put_nowait(frame)
+            return True
+
+        logger.warning(f"Send queue full for user {self.user_id} ({self.max_queue}); disconnecting slow consumer")
+        self.dropped += 1
+        self._mark_dead()
+        return False
+
+    async def drain(self, timeout: Optional[float] = None) -> None:
+        """Wait until every queued frame has been handed to the socket (or timeout)."""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout or self.send_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Timed out draining send queue for user {self.user_id}")
+
+    def _mark_dead(self) -> None:
+        if self._dead:
+            return
+        self._dead = True
+        asyncio.create_task(self._on_dead(self.websocket))
+
+    async def _writer(self) -> None:
+        while not self._dead:
+            frame = await self._queue.get()
+            try:
+                data = frame if isinstance(frame, str) else self.codec.encode(frame)
+                if isinstance(data, bytes):
+                    await asyncio.wait_for(self.websocket.send_bytes(data), self.send_timeout)
+                else:
+                    await asyncio.wait_for(self.websocket.send_text(data), self.send_timeout)
+                self.sent += 1
+                self.bytes_sent += len(data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error(f"send failed for user {self.user_id}: {exc!r}. Closing websocket.")
+                self._mark_dead()
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "user_id": self.user_id,
+            "depth": self.depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "codec": self.codec.name,
+            "bytes_sent": self.bytes_sent,
+            "idle_s": round(time.monotonic() - self.last_seen, 1),
+        }
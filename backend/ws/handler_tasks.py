@@ -0,0 +1,103 @@
+# ws/handler_tasks.py
+import asyncio
+import logging
+from typing import Any, Coroutine, Dict, Optional, Set
+
+from fastapi import WebSocket
+
+from core.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class HandlerTasks:
+    """
+    Registry of in-flight handler tasks, indexed per connection and per user.
+
+    Each message type has a per-connection and a per-user concurrency limit
+    (WS_HANDLER_LIMITS / WS_USER_HANDLER_LIMITS, falling back to
+    WS_HANDLER_DEFAULT_LIMIT). `spawn()` refuses work over either limit so the
+    caller can answer with a `busy` frame, and `cancel_connection()` cancels
+    everything a socket started when it goes away.
+    """
+
+    def __init__(
+        self,
+        conn_limits: Optional[Dict[str, int]] = None,
+        user_limits: Optional[Dict[str, int]] = None,
+        default_limit: Optional[int] = None,
+    ) -> None:
+        self.conn_limits = conn_limits if conn_limits is not None else settings.WS_HANDLER_LIMITS
+        self.user_limits = user_limits if user_limits is not None else settings.WS_USER_HANDLER_LIMITS
+        self.default_limit = default_limit or settings.WS_HANDLER_DEFAULT_LIMIT
+        self._by_conn: Dict[WebSocket, Dict[str, Set[asyncio.Task]]] = {}
+        self._by_user: Dict[str, Dict[str, Set[asyncio.Task]]] = {}
+        self.rejected = 0
+        self.cancelled = 0
+
+    def _limit(self, limits: Dict[str, int], msg_type: str) -> int:
+        return limits.get(msg_type, self.default_limit)
+
+    def spawn(
+        self,
+        websocket: WebSocket,
+        user_id: str,
+        msg_type: str,
+        coro: Coroutine[Any, Any, None],
+    ) -> Optional[asyncio.Task]:
+        """Start `coro` as a tracked task; returns None (and closes coro) if over a limit."""
+        conn_running = len(self._by_conn.get(websocket, {}).get(msg_type, ()))
+        user_running = len(self._by_user.get(user_id, {}).get(msg_type, ()))
+        if (conn_running >= self._limit(self.conn_limits, msg_type)
+                or user_running >= self._limit(self.user_limits, msg_type)):
+            coro.close()
+            self.rejected += 1
+            return None
+
+        task = asyncio.create_task(coro)
+        self._by_conn.setdefault(websocket, {}).setdefault(msg_type, set()).add(task)
+        self._by_user.setdefault(user_id, {}).setdefault(msg_type, set()).add(task)
+        task.add_done_callback(lambda t: self._forget(websocket, user_id, msg_type, t))
+        return task
+
+    def _forget(self, websocket: WebSocket, user_id: str, msg_type: str, task: asyncio.Task) -> None:
+        for index, key in ((self._by_conn, websocket), (self._by_user, user_id)):
+            by_type = index.get(key)
+            if by_type is None:
+                continue
+            tasks = by_type.get(msg_type)
+            if tasks is not None:
+                tasks.discard(task)
+                if not tasks:
+                    by_type.pop(msg_type, None)
+            if not by_type:
+                index.pop(key, None)
+
+    def cancel_connection(self, websocket: WebSocket) -> int:
+        """Cancel every in-flight task started by this socket; returns how many."""
+        by_type = self._by_conn.get(websocket, {})
+        tasks = [t for ts in by_type.values() for t in ts if not t.done()]
+        for task in tasks:
+            task.cancel()
+        self.cancelled += len(tasks)
+        if tasks:
+            logger.info(f"Cancelled {len(tasks)} in-flight handler tasks on disconnect")
+        return len(tasks)
+
+    def stats(self) -> Dict[str, Any]:
+        by_type: Dict[str, int] = {}
+        for tasks_by_type in self._by_conn.values():
+            for msg_type, tasks in tasks_by_type.items():
+                by_type[msg_type] = by_type.get(msg_type, 0) + len(tasks)
+        return {
+            "in_flight": sum(by_type.values()),
+            "by_type": by_type,
+            "connections_busy": len(self._by_conn),
+            "users_busy": len(self._by_user),
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+        }
+
+    def connection_count(self, websocket: WebSocket) -> int:
+        return sum(len(ts) for ts in self._by_conn.get(websocket, {}).values())
@@ -1,24 +1,23 @@
 # app/ws/handlers/assess.py
-from datetime import datetime
-from typing import Dict, Any, Optional, List
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
 import asyncio
 import logging
 from decimal import Decimal
 
-import sqlalchemy as sa
 from fastapi import WebSocket
 
-from sqlalchemy.orm import Session
-
 from ws.socket_manager import SocketManager
-from core.database import SessionLocal
-from utils.profile_utils import find_profile_by_id
-from utils.chat_utils import get_chat
-from utils.report_utils import get_report, create_report, update_report
+from ws.stream_relay import StreamRelay
+from core.redis import get_messages_from_cache
+from utils.profile_utils import async_get_profiles
+from utils.chat_utils import merge_unscored
+from utils.report_utils import accumulate_report_score, get_assessment_inputs
 from services.horoscope import horoscope_score
-from services.text_sentiment import analyze_text
-from models.chat import ChatMessage  
-from utils.helpers import ordered_pair, to_decimal  
+from services.llm_api import llm_executor
+from services.text_sentiment import analyze_conversation
+from schemas.ws import AssessPayload
+from utils.helpers import async_db_call, ordered_pair, to_decimal, parse_timestamp
 
 logger = logging.getLogger(__name__)
 
@@ -27,7 +26,7 @@ async def handle_assess(
     websocket: WebSocket,
     user_id: str,
     request_id: str,
-    payload: Dict[str, Any],
+    payload: AssessPayload,
     meta: Dict[str, Any],
     ctx: Dict[str, Any],
 ) -> None:
@@ -36,22 +35,20 @@ async def handle_assess(
     followed by a final result.
 
     Flow:
-    - fetch chat history (non-blocking)
-    - analyze sentiment (AI)
-    - try update_report(score)
-      - if report does not exist -> compute horoscope, create_report with horoscope, then update_report(score)
+    - fetch only messages of the topic with a seq above its sentiment watermark, from the
+      DB and from the room's not-yet-flushed stream (non-blocking); each topic keeps its
+      own watermark, so scoring one topic never skips another's
+      - if there are none -> return the stored report without calling the LLM
+    - analyze sentiment (AI) of the new messages, carrying over the previous average
+    - first assessment of the pair (no report yet) -> compute the horoscope score
+    - create-or-accumulate the report in ONE statement (accumulate_report_score), so
+      concurrent assessments of the same pair cannot lose each other's scores
     - final result payload contains compatibility_score and horoscope_score
     """
     manager = SocketManager.instance()
-    partner_id = payload.get("partner_id")
-    topic = payload.get("topic", "general")
-
-    if not partner_id:
-        await manager.safe_send_json(websocket, {
-            "type": "assess", "request_id": request_id,
-            "payload": {"stage": "error", "message": "Missing partner_id"}
-        })
-        return
+    # partner_id presence is guaranteed by AssessPayload validation in dispatch_raw
+    partner_id = payload.partner_id
+    topic = payload.topic
 
     # Acknowledge start
     await manager.safe_send_json(websocket, {
@@ -61,215 +58,128 @@ async def handle_assess(
 
     try:
         # -------------------------
-        # 1) Fetch chat history from DB (non-blocking)
+        # 1) Fetch only the messages after the last scored seq (non-blocking), persisted
+        #    or still buffered in the room's stream
         # -------------------------
         await manager.safe_send_json(websocket, {
             "type": "assess", "request_id": request_id,
             "payload": {"stage": "Fetching_chat_history", "message": "Fetching chat history"}
         })
 
-        def _fetch_chats(u1: int, u2: int, t: str) -> List[ChatMessage]:
-            db = SessionLocal()
-            try:
-        
-                messages = get_chat(db,u1,u2,t)
-                
-                if messages is None:
-                    return []
-                    
-                for m in messages: print(m.__dict__)
-
-                return messages
-            finally:
-                db.close()
-
         loop = asyncio.get_running_loop()
-        msgs: List[ChatMessage] = await loop.run_in_executor(
-            None, _fetch_chats, int(user_id), int(partner_id), topic
+        # report state, topic watermark and unscored messages in one statement
+        state, current_report, after_seq, persisted = await async_db_call(
+            get_assessment_inputs, int(user_id), int(partner_id), topic
         )
+        try:
+            buffered = await get_messages_from_cache("{}_{}".format(*ordered_pair(int(user_id), int(partner_id))))
+        except Exception as exc:
+            logger.warning(f"Reading the buffered messages failed, scoring persisted ones only: {exc}")
+            buffered = []
+        new_msgs = merge_unscored(persisted, buffered, topic, after_seq)
+
+        await manager.safe_send_json(websocket, {"type": "assess", "request_id": request_id,"payload": {"stage": "fetched_chat_history","message": "Fetching chat messages complete", "new_messages": len(new_msgs)}})
 
-        if msgs is []:
-            await manager.safe_send_json(websocket, {"type": "assess", "request_id": request_id,"payload": {"stage": "fetched_chat_history", "message": "Failed to fetch chat messages"}})
-        
-        else:
-            await manager.safe_send_json(websocket, {"type": "assess", "request_id": request_id,"payload": {"stage": "fetched_chat_history","message": "Fetching chat messages complete" }})
+        # Nothing new since the last assessment -> reuse the stored score, skip the LLM
+        if not new_msgs:
+            await manager.safe_send_json(websocket, {
+                "type": "assess", "request_id": request_id,
+                "payload": {"stage": "no_new_messages", "message": "No new messages since last assessment", "report": current_report}
+            })
+            await manager.safe_send_json(websocket, {"type": "assess", "request_id": request_id,"payload": {"status": "done"}})
+            return
 
         # -------------------------
-        # 2) Analyze sentiment with AI
+        # 2) Analyze sentiment with AI (new messages + carried-over state)
         # -------------------------
         await manager.safe_send_json(websocket, {
             "type": "assess", "request_id": request_id,
             "payload": {"stage": "analysing_sentiment", "message": "Analyzing messages"}
         })
 
-        text_corpus = " ".join(msg_obj["text"] for m in msgs if m.messages for msg_obj in m.messages if isinstance(msg_obj, dict) and msg_obj.get("text"))
-        compatibility_score_raw = analyze_text(text_corpus, topic) 
+        scored_seq = new_msgs[-1]["seq"]
+        scored_at = max(
+            (ts for ts in (parse_timestamp(m.get("timestamp")) for m in new_msgs) if ts is not None),
+            default=datetime.utcnow(),
+        ).replace(tzinfo=timezone.utc)
+        relay = StreamRelay(manager, websocket, "assess", request_id, loop)
+        compatibility_score_raw = await analyze_conversation(
+            new_msgs, topic,
+            state["sentiment_avg"] if state else None,
+            state["sentiment_count"] if state else 0,
+            relay.token, relay.partial,
+        )
+        timings = await relay.close()
         await manager.safe_send_json(websocket, {
             "type": "assess", "request_id": request_id,
-            "payload": {"stage": "generated_score", "compatibility_score": compatibility_score_raw}
+            "payload": {"stage": "generated_score", "compatibility_score": compatibility_score_raw, "timings": timings}
         })
 
-     
-        # Ensure compatibility_score is a float numeric value for DB update calls
-        try:
-            compatibility_score_value = to_decimal(compatibility_score_raw)
-        except Exception as exc:
-            logger.warning(f"Failed to parse compatibility score '{compatibility_score_raw}': {exc}")
-            # fallback: treat as 0.0 to avoid crashing; you may prefer to return error instead
-            compatibility_score_value = 0.0
+        compatibility_score_value = to_decimal(compatibility_score_raw)
+        if compatibility_score_value is None:
+            raise ValueError(f"Unparseable compatibility score {compatibility_score_raw!r}")
 
         # -------------------------
-        # 3) Attempt to update report with the compatibility score
+        # 3) First assessment of the pair -> horoscope for the report about to be created
         # -------------------------
-        await manager.safe_send_json(websocket, {
-            "type": "assess", "request_id": request_id,
-            "payload": {"stage": "updating_report", "message": "Updating the report"}
-        })
-
-        def _update(u1: int, u2: int, score: float):
-            db = SessionLocal()
-            try:
-                 updated_report = update_report(db, u1, u2, float(score))
-                 
-                 db.commit()
-                 
-                 return updated_report
-            finally:
-                db.close()
-
-        updated_report = None
-        try:
-            updated_report = await loop.run_in_executor(
-                None, _update, int(user_id), int(partner_id), compatibility_score_value
-            )
-        except Exception as exc:
-            logger.exception(f"Error while attempting update_report: {exc}")
-            updated_report = {"error": str(exc)}
-
-        # Check if report did not exist per update_report's contract
-        if updated_report is None or updated_report.get("status") == "fail":
-            # Report is missing -> compute horoscope then create report, then update again.
-
-            # 4a) Fetch horoscope (profiles + horoscope)
+        hor_val_dec: Optional[Decimal] = None
+        if state is None:
             await manager.safe_send_json(websocket, {
                 "type": "assess", "request_id": request_id,
                 "payload": {"stage": "fetching_horoscope", "message": "Fetching horoscope score"}
             })
 
-            def _compute_horoscope(u1: int, u2: int) -> Optional[Decimal]:
-                db = SessionLocal()
-                try:
-                    u1_obj = find_profile_by_id(db, u1)
-                    u2_obj = find_profile_by_id(db, u2)
-                    
-                    if not (u1_obj and u2_obj):
-                        
-                        return None
-    
-                    try:
-                        hv = horoscope_score(u1_obj, u2_obj)
-                    except Exception as e:
-                        logger.exception(f"horoscope_score failed: {e}")
-                        hv = None
-                       
-                    if hv is None:                        
-                         return None
-                            
-                    return to_decimal(hv)
-                       
+            horoscope_relay = StreamRelay(manager, websocket, "assess", request_id, loop)
 
-                finally:
-                    db.close()
+            # profiles are loaded first so no DB connection is held during the LLM call
+            def _compute_horoscope(u1_obj, u2_obj) -> Optional[Decimal]:
+                if not (u1_obj and u2_obj):
+                    return None
+                try:
+                    hv = horoscope_score(u1_obj, u2_obj, on_token=horoscope_relay.token)
+                except Exception as e:
+                    logger.exception(f"horoscope_score failed: {e}")
+                    hv = None
+                if hv is None:
+                    return None
+                return to_decimal(hv)
 
-            hor_val_dec: Optional[Decimal] = None
             try:
-                hor_val_dec = await loop.run_in_executor(None, _compute_horoscope, int(user_id), int(partner_id))
+                profiles = await async_get_profiles([int(user_id), int(partner_id)])
+                u1_obj, u2_obj = profiles.get(int(user_id)), profiles.get(int(partner_id))
+                hor_val_dec = await loop.run_in_executor(llm_executor, _compute_horoscope, u1_obj, u2_obj)
             except Exception as exc:
                 logger.exception(f"Failed to compute horoscope: {exc}")
                 hor_val_dec = None
+            await horoscope_relay.close()
 
-        
-            # 4b) Create report with horoscope_val (may be None)
-            await manager.safe_send_json(websocket, {
-                "type": "assess", "request_id": request_id,
-                "payload": {"stage": "creating_report", "message": "Creating report"}
-            })
-
-            def _create(u1: int, u2: int, hor_val):
-                db = SessionLocal()
-                try:
-                    # create_report accepts horoscope_val optionally; pass Decimal or None
-                    
-                    created_report = create_report(db, u1, u2, horoscope_val=hor_val)
-                    
-                    db.commit()
-                    return created_report
-                finally:
-                    db.close()
-
-            
-            created_report = None
-            try:
-
-                created_report = await loop.run_in_executor(
-                    None, _create, int(user_id), int(partner_id), hor_val_dec
-                )
-            except Exception as exc:
-                logger.exception(f"Failed to create report: {exc}")
-                created_report = {"error": str(exc)}
-                
-                
-
-            await manager.safe_send_json(websocket, {"type": "assess", "request_id": request_id,"payload": {"stage": "created_report", "report": created_report}})
-
-            # Inform creation completed
-            await manager.safe_send_json(websocket, {
-                "type": "assess", "request_id": request_id,
-                "payload": {"stage": "creating_report_completed", "message": "Creating report completed"}
-            })
-
-            # 4c) Now update newly created report with compatibility score
-            await manager.safe_send_json(websocket, {
-                "type": "assess", "request_id": request_id,
-                "payload": {"stage": "updating_report", "message": "Updating the report (after creation)"}
-            })
-
-
-            updated_report_after_create = None
-            try:
-                updated_report_after_create = await loop.run_in_executor(
-                    None, _update, int(user_id), int(partner_id), compatibility_score_value
-                )
-            except Exception as exc:
-                logger.exception(f"Failed to update report after creation: {exc}")
-                updated_report_after_create = {"error": str(exc)}
-
-            await manager.safe_send_json(websocket, {
-                "type": "assess", "request_id": request_id,
-                "payload": {"stage": "updated_report", "report": updated_report_after_create}
-            })
+        # -------------------------
+        # 4) Create-or-accumulate the report in one statement
+        # -------------------------
+        await manager.safe_send_json(websocket, {
+            "type": "assess", "request_id": request_id,
+            "payload": {"stage": "updating_report", "message": "Updating the report"}
+        })
 
-            if updated_report_after_create and updated_report_after_create.get("status") =="success":
-                await manager.safe_send_json(websocket, {
-                    "type": "assess", "request_id": request_id,
-                    "payload": {"stage": "report_updation_complete", "message": "Report updation complete"}
-                })
-            # set final_report for response building
-            final_report = updated_report_after_create or created_report
+        try:
+            final_report = await async_db_call(
+                accumulate_report_score, int(user_id), int(partner_id), compatibility_score_value,
+                scored_at=scored_at, horoscope_val=hor_val_dec, topic=topic, scored_seq=scored_seq,
+            )
+        except Exception as exc:
+            logger.exception(f"Error while accumulating the report score: {exc}")
+            final_report = {"error": str(exc)}
 
-        else:
-            # initial update succeeded
-            await manager.safe_send_json(websocket, {
-                "type": "assess", "request_id": request_id,
-                "payload": {"stage": "updated_report", "report": updated_report}
-            })
+        await manager.safe_send_json(websocket, {
+            "type": "assess", "request_id": request_id,
+            "payload": {"stage": "updated_report", "report": final_report}
+        })
+        if final_report.get("status") == "success":
             await manager.safe_send_json(websocket, {
                 "type": "assess", "request_id": request_id,
                 "payload": {"stage": "report_updation_complete", "message": "Report updation complete"}
             })
-            final_report = updated_report
 
-    
         await manager.safe_send_json(websocket, {"type": "assess", "request_id": request_id,"payload": {"status": "done"}})
 
 
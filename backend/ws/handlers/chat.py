@@ -1,11 +1,16 @@
 # app/ws/handlers/chat.py
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import logging
 from sqlalchemy.dialects.postgresql import JSONB
 from fastapi import WebSocket
 from ws.socket_manager import SocketManager
-from core.redis import save_message_to_cache  # Redis cache helper
+from core.redis import (  # Redis cache helpers
+    save_message_to_cache, next_room_seq, last_buffered_seq, push_offline_message,
+)
+from schemas.ws import ChatPayload
+from utils.chat_utils import get_max_seq
+from utils.helpers import async_db_call
 
 logger = logging.getLogger(__name__)
 
@@ -18,20 +23,32 @@ def _canonical_room_id(a: str, b: str) -> str:
         pair = sorted([str(a), str(b)])
         return f"{pair[0]}_{pair[1]}"
 
+async def _seed_room_seq(room_id: str, sender: str, receiver: Optional[str]) -> int:
+    """
+    Highest seq already used: persisted for the pair (the flusher keys rows by
+    sender/receiver, falling back to the room id) or still buffered in the room.
+    """
+    persisted = 0
+    members = [sender, receiver] if receiver else room_id.split("_")
+    if len(members) == 2 and all(str(m).isdigit() for m in members):
+        persisted = await async_db_call(get_max_seq, int(members[0]), int(members[1]))
+    return max(persisted or 0, await last_buffered_seq(room_id))
+
 async def handle_chat(
     websocket: WebSocket,
     user_id: str,
     request_id: str,
-    payload: Dict[str, Any],
+    payload: ChatPayload,
     meta: Dict[str, Any],
     ctx: Dict[str, Any],
 ) -> None:
     """
-    Chat message handler. Persists to Redis and broadcasts to the room.
-    DB flush happens only on WebSocket disconnect.
+    Chat message handler. Numbers the message with the room's next seq, persists it
+    to Redis and broadcasts it to the room; a recipient with no open socket gets it
+    in their offline queue. The ChatFlusher writes it to the DB in the background.
     """
     manager = SocketManager.instance()
-    sender = str(ctx.get("user_id") or payload.get("sender") or "")
+    sender = str(ctx.get("user_id") or "")
     if not sender:
         await manager.safe_send_json(websocket, {
             "type": "error", "request_id": request_id,
@@ -39,7 +56,7 @@ async def handle_chat(
         })
         return
 
-    text = (payload.get("text") or "").strip()
+    text = payload.text
     if not text:
         await manager.safe_send_json(websocket, {
             "type": "ack", "request_id": request_id,
@@ -47,23 +64,28 @@ async def handle_chat(
         })
         return
 
-    topic = payload.get("topic") or payload.get("topic_name") or "general"
-    room_id = payload.get("room_id")
-
-    # derive receiver / to_id
-    to_id = payload.get("to") or payload.get("receiver") or payload.get("recipient") or None
+    topic = payload.topic
+    room_id = payload.room_id
+    to_id = payload.to
 
     if not room_id:
         if to_id:
             room_id = _canonical_room_id(sender, str(to_id))
         else:
-            room_id = payload.get("room") or meta.get("room_id")
+            room_id = meta.get("room_id")
     if not room_id:
         await manager.safe_send_json(websocket, {
             "type": "error", "request_id": request_id,
             "payload": {"message": "missing_room_or_to"}
         })
         return
+    # a pair has one seq space: a second room for it would reuse seqs the flush then drops
+    if to_id and room_id != _canonical_room_id(sender, str(to_id)):
+        await manager.safe_send_json(websocket, {
+            "type": "error", "request_id": request_id,
+            "payload": {"message": "non_canonical_room", "room_id": _canonical_room_id(sender, str(to_id))}
+        })
+        return
 
     msg_obj = {
         "sender": sender,
@@ -73,9 +95,11 @@ async def handle_chat(
         "ts": datetime.utcnow().isoformat(),
     }
 
-    # Persist to Redis (best-effort)
+    # Number and persist to Redis (best-effort); seq lets clients resume after a reconnect
+    # and the stream id lets them dedupe redelivered messages
     try:
-        await save_message_to_cache(room_id, msg_obj)
+        msg_obj["seq"] = await next_room_seq(room_id, lambda: _seed_room_seq(room_id, sender, msg_obj["receiver"]))
+        msg_obj["id"] = await save_message_to_cache(room_id, msg_obj)
     except Exception as exc:
         logger.error(f"Redis save failed for room {room_id}: {exc}")
         await manager.safe_send_json(websocket, {
@@ -95,7 +119,7 @@ async def handle_chat(
     try:
         await manager.safe_send_json(websocket, {
             "type": "ack", "request_id": request_id,
-            "payload": {"status": "received", "ts": msg_obj["ts"]}
+            "payload": {"status": "received", "ts": msg_obj["ts"], "id": msg_obj.get("id"), "seq": msg_obj.get("seq")}
         })
     except Exception as exc:
         logger.error(f"Failed to send ack to sender {sender}: {exc}")
@@ -110,11 +134,15 @@ async def handle_chat(
             "receiver": msg_obj["receiver"],  # added
             "text": msg_obj["text"],
             "topic": msg_obj["topic"],
-            "ts": msg_obj["ts"]
+            "ts": msg_obj["ts"],
+            "id": msg_obj.get("id"),
+            "seq": msg_obj.get("seq"),
         }
     }
     try:
         await manager.broadcast_to_room(room_id, broadcast_payload, exclude_user=sender)
+        if to_id and str(to_id) != sender and not await manager.is_connected(str(to_id)):
+            await push_offline_message(str(to_id), broadcast_payload["payload"])
     except Exception as exc:
         logger.error(f"Broadcast failed in room {room_id}: {exc}")
         await manager.safe_send_json(websocket, {
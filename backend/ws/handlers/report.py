@@ -6,12 +6,14 @@ import logging
 from decimal import Decimal
 
 from fastapi import WebSocket
-from core.database import SessionLocal
 from ws.socket_manager import SocketManager
-from utils.report_utils import get_report, create_report, update_report
+from ws.stream_relay import StreamRelay
+from utils.report_utils import get_report, create_report
 from services.horoscope import horoscope_score
-from utils.profile_utils import find_profile_by_id
-from utils.helpers import to_decimal
+from services.llm_api import llm_executor
+from utils.profile_utils import async_get_profiles
+from utils.helpers import async_db_call, to_decimal
+from schemas.ws import ViewReportPayload
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +21,7 @@ async def handle_report(
     websocket: WebSocket,
     user_id: str,
     request_id: str,
-    payload: Dict[str, Any],
+    payload: ViewReportPayload,
     meta: Dict[str, Any],
     ctx: Dict[str, Any],
 ) -> None:
@@ -54,14 +56,8 @@ async def handle_report(
         }
         await manager.safe_send_json(websocket, msg)
 
-    # Extract partner ID
-    partner = payload.get("partner_id") or payload.get("partner") or payload.get("to")
-    if not partner:
-        await manager.safe_send_json(websocket, {
-            "type": "report", "request_id": request_id,
-            "payload": {"stage": "error", "message": "missing_partner_id"}
-        })
-        return
+    # Partner ID (presence guaranteed by ViewReportPayload validation)
+    partner = payload.partner_id
 
     # Acknowledge start
     await manager.safe_send_json(websocket, {
@@ -74,10 +70,7 @@ async def handle_report(
         u1 = int(user_id)
     except (ValueError, TypeError):
         u1 = user_id
-    try:
-        u2 = int(partner)
-    except (ValueError, TypeError):
-        u2 = partner
+    u2 = partner  # an int, validated by ViewReportPayload
 
     loop = asyncio.get_running_loop()
     try:
@@ -85,15 +78,8 @@ async def handle_report(
         await send_stage("checking_report_exists", {"message": "Checking existing report"})
         await asyncio.sleep(1)
 
-        def _get_report(a, b):
-            db = SessionLocal()
-            try:
-                return get_report(db, a, b)
-            finally:
-                db.close()
-
         try:
-            existing = await loop.run_in_executor(None, _get_report, u1, u2)
+            existing = await async_db_call(get_report, u1, u2)
         except Exception as exc:
             logger.error(f"Error fetching report: {exc}")
             existing = None
@@ -114,36 +100,36 @@ async def handle_report(
         await send_stage("computing_horoscope_value", {"message": "Computing horoscope value"})
         await asyncio.sleep(0.5) 
 
-        def _compute_horoscope(a, b) -> Optional[Decimal]:
-            db = SessionLocal()
+        relay = StreamRelay(manager, websocket, "report", request_id, loop)
+
+        # profiles are loaded first so no DB connection is held during the LLM call
+        def _compute_horoscope(u1_obj, u2_obj) -> Optional[Decimal]:
+            if not (u1_obj and u2_obj):
+                return None
             try:
-                u1_obj = find_profile_by_id(db, a)
-                u2_obj = find_profile_by_id(db, b)
-                if not (u1_obj and u2_obj):
-                    return None
-                try:
-                    hv = horoscope_score(u1_obj, u2_obj)
-                except Exception as e:
-                    logger.exception(f"horoscope_score failed: {e}")
-                    hv = None
-                if hv is None:
-                    return None
-                return to_decimal(hv)
-            finally:
-                db.close()
+                hv = horoscope_score(u1_obj, u2_obj, on_token=relay.token)
+            except Exception as e:
+                logger.exception(f"horoscope_score failed: {e}")
+                hv = None
+            if hv is None:
+                return None
+            return to_decimal(hv)
 
         hor_val_dec: Optional[Decimal] = None
         try:
-            hor_val_dec = await loop.run_in_executor(None, _compute_horoscope, u1, u2)
+            profiles = await async_get_profiles([u1, u2])
+            u1_obj, u2_obj = profiles.get(int(u1)), profiles.get(int(u2))
+            hor_val_dec = await loop.run_in_executor(llm_executor, _compute_horoscope, u1_obj, u2_obj)
         except Exception as exc:
             logger.exception(f"Failed to compute horoscope: {exc}")
             hor_val_dec = None
+        timings = await relay.close()
 
         # --- CHANGED LINES START ---
         # Inform about horoscope result — send stage ONLY if computing a new horoscope
         if existing is None:
             if hor_val_dec is not None:
-                await send_stage("Horoscope socre generated")
+                await send_stage("Horoscope socre generated", {"timings": timings})
             else:
                 await send_stage("Horoscope score generation failed")
         # --- CHANGED LINES END ---
@@ -152,15 +138,8 @@ async def handle_report(
         await send_stage("creating_report", {"message": "Creating report"})
         await asyncio.sleep(0.5) 
 
-        def _create(a, b, hor_val):
-            db = SessionLocal()
-            try:
-                return create_report(db, a, b, horoscope_val=hor_val)
-            finally:
-                db.close()
-
         try:
-            created = await loop.run_in_executor(None, _create, u1, u2, hor_val_dec)
+            created = await async_db_call(create_report, u1, u2, horoscope_val=hor_val_dec)
         except Exception as exc:
             logger.error(f"create_report failed: {exc}")
             await manager.safe_send_json(websocket, {
@@ -183,18 +162,11 @@ async def handle_report(
         await send_stage("creating_report_completed", {"message": "Creating report completed"})
 
         # 3) Fetch latest and return
-        def _fetch_latest(a, b):
-            db = SessionLocal()
-            try:
-                return get_report(db, a, b)
-            finally:
-                db.close()
-
         try:
-            latest = await loop.run_in_executor(None, _fetch_latest, u1, u2)
+            latest = await async_db_call(get_report, u1, u2)
         except Exception as exc:
             logger.error(f"Failed to fetch latest report: {exc}")
-            latest = current_report or {}
+            latest = created or {}
 
         final_result = {
             "compatibility_score": latest.get("compatibility_score"),
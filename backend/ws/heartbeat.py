@@ -0,0 +1,114 @@
+# ws/heartbeat.py
+import asyncio
+import logging
+import math
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from ws.connection import Connection
+
+logger = logging.getLogger(__name__)
+
+
+class HeartbeatWheel:
+    """
+    Timing wheel that spreads heartbeats evenly over the ping interval.
+
+    Connections are assigned round-robin to `interval / tick` slots and the wheel
+    visits one slot per tick, so each connection is checked once per interval and
+    only ~1/slots of all connections are touched at any moment (no thundering herd).
+
+    For each visited connection:
+      - inbound traffic within the last interval proves liveness -> no ping
+      - silent for `dead_after` seconds -> considered dead; `on_dead` runs as a separate
+        task (at most `max_concurrent_drops` at once) so the tick never waits on it
+      - otherwise -> a "__ping__" frame is queued (never awaited)
+    Protocol-level ping/pong is left to the ASGI server (uvicorn --ws-ping-interval).
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        tick: float,
+        dead_after: float,
+        on_dead: Callable[[Connection], Awaitable[None]],
+        max_concurrent_drops: int = 32,
+    ) -> None:
+        self.interval = max(interval, tick)
+        self.tick = tick
+        self.dead_after = dead_after
+        self._on_dead = on_dead
+        self._drop_slots = asyncio.Semaphore(max(1, max_concurrent_drops))
+        self._drops: Set[asyncio.Task] = set()
+        self._slots: List[Set[Connection]] = [set() for _ in range(max(1, math.ceil(self.interval / tick)))]
+        self._slot_of: Dict[Connection, int] = {}
+        self._next_slot = 0
+        self._cursor = 0
+        self.pings_sent = 0
+        self.pings_skipped = 0
+        self.dead_detected = 0
+        self._detection_latencies: List[float] = []
+
+    def add(self, conn: Connection) -> None:
+        slot = self._next_slot
+        self._next_slot = (self._next_slot + 1) % len(self._slots)
+        self._slots[slot].add(conn)
+        self._slot_of[conn] = slot
+
+    def remove(self, conn: Connection) -> None:
+        slot = self._slot_of.pop(conn, None)
+        if slot is not None:
+            self._slots[slot].discard(conn)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                self._visit(self._cursor)
+            except Exception as exc:
+                logger.error(f"Heartbeat error: {exc}")
+            self._cursor = (self._cursor + 1) % len(self._slots)
+
+    def _visit(self, slot: int) -> None:
+        now = time.monotonic()
+        for conn in list(self._slots[slot]):
+            idle = now - conn.last_seen
+            if self.dead_after and idle >= self.dead_after:
+                # detection latency: how long after the dead_after deadline we noticed
+                latency = idle - self.dead_after
+                self.dead_detected += 1
+                self._detection_latencies.append(latency)
+                del self._detection_latencies[:-1000]
+                logger.info(f"Dropping silent connection of user {conn.user_id} (idle {idle:.1f}s, detected +{latency:.1f}s)")
+                self.remove(conn)
+                self._schedule_drop(conn)
+            elif idle >= self.interval:
+                if conn.enqueue("__ping__"):
+                    self.pings_sent += 1
+            else:
+                self.pings_skipped += 1
+
+    def _schedule_drop(self, conn: Connection) -> None:
+        task = asyncio.create_task(self._drop(conn))
+        self._drops.add(task)
+        task.add_done_callback(self._drops.discard)
+
+    async def _drop(self, conn: Connection) -> None:
+        async with self._drop_slots:
+            try:
+                await self._on_dead(conn)
+            except Exception as exc:
+                logger.error(f"Dropping connection of user {conn.user_id} failed: {exc}")
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        latencies = self._detection_latencies
+        return {
+            "slots": len(self._slots),
+            "tracked": len(self._slot_of),
+            "pings_sent": self.pings_sent,
+            "pings_skipped": self.pings_skipped,
+            "dead_detected": self.dead_detected,
+            "drops_in_flight": len(self._drops),
+            "detection_latency_avg_s": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            "detection_latency_max_s": round(max(latencies), 2) if latencies else None,
+        }
@@ -0,0 +1,409 @@
+# ws/job_queue.py
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from fastapi import WebSocket
+from pydantic import BaseModel
+
+from core.config import get_settings
+from core.redis import redis_client
+from services.db_telemetry import db_telemetry
+from utils.helpers import ordered_pair
+from ws.socket_manager import Handler, SocketManager
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+PENDING_KEY = "jobs:pending"        # ZSET job_id -> priority score
+PROCESSING_KEY = "jobs:processing"  # ZSET job_id -> lease deadline (unix seconds)
+SUBSCRIBERS_REFRESH_SECONDS = 1.0   # how often a running job picks up deduplicated subscribers
+
+# Atomically move the best pending job into processing with a lease
+_CLAIM_SCRIPT = """
+local item = redis.call('ZRANGE', KEYS[1], 0, 0)
+if #item == 0 then return false end
+redis.call('ZREM', KEYS[1], item[1])
+redis.call('ZADD', KEYS[2], ARGV[1], item[1])
+return item[1]
+"""
+
+# Move jobs whose lease expired back to pending (score = top of their priority).
+# KEYS = processing, pending, then job:<id> for each candidate; ARGV = now, then the ids.
+# A candidate whose lease was renewed since it was listed is left alone.
+_RECLAIM_SCRIPT = """
+local moved = {}
+for i = 2, #ARGV do
+  local job_id = ARGV[i]
+  local lease = redis.call('ZSCORE', KEYS[1], job_id)
+  if lease and tonumber(lease) <= tonumber(ARGV[1]) then
+    redis.call('ZREM', KEYS[1], job_id)
+    local prio = redis.call('HGET', KEYS[i + 1], 'priority')
+    if prio then
+      redis.call('ZADD', KEYS[2], tonumber(prio) * 1e13, job_id)
+    end
+    moved[#moved + 1] = job_id
+  end
+end
+return moved
+"""
+
+
+# Take one of the user's slots for a job kind: KEYS = counter; ARGV = limit, ttl.
+# Returns 1 if taken, 0 if the user already has `limit` jobs queued or running.
+_ACQUIRE_SCRIPT = """
+local n = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+if n > tonumber(ARGV[1]) then
+  redis.call('DECR', KEYS[1])
+  return 0
+end
+return 1
+"""
+
+# Give a slot back; the counter is removed when it reaches zero
+_RELEASE_SCRIPT = """
+local n = redis.call('DECR', KEYS[1])
+if n <= 0 then redis.call('DEL', KEYS[1]) end
+return n
+"""
+
+
+def _job_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+def _subs_key(job_id: str) -> str:
+    return f"job:{job_id}:subs"
+
+
+def _active_key(kind: str, user_id: str) -> str:
+    return f"jobs:active:{kind}:{user_id}"  # queued + running jobs the user started
+
+
+def pair_dedupe_key(kind: str, user_id: str, payload: Dict[str, Any]) -> Optional[str]:
+    """Dedupe jobs of the same kind for the same (unordered) pair of users and topic."""
+    partner = payload.get("partner_id")
+    if not partner:
+        return None
+    try:
+        u1, u2 = ordered_pair(user_id, partner)
+    except (TypeError, ValueError):
+        u1, u2 = sorted([str(user_id), str(partner)])
+    topic = payload.get("topic")
+    return f"{kind}:{u1}_{u2}:{topic}" if topic else f"{kind}:{u1}_{u2}"
+
+
+class _JobChannel:
+    """
+    Stand-in for the WebSocket a handler would normally write to.
+    Frames go to every subscriber of the job (the requester plus deduplicated
+    duplicates), through whichever sockets each user has open at send time.
+    The subscriber list is cached and re-read at most every SUBSCRIBERS_REFRESH_SECONDS.
+    """
+
+    def __init__(self, job_id: str) -> None:
+        self.job_id = job_id
+        self._subscribers: List[Dict[str, str]] = []
+        self._refreshed_at = 0.0
+
+    async def _current_subscribers(self) -> List[Dict[str, str]]:
+        now = time.monotonic()
+        if now - self._refreshed_at >= SUBSCRIBERS_REFRESH_SECONDS:
+            raw = await redis_client.lrange(_subs_key(self.job_id), 0, -1)
+            self._subscribers = [json.loads(item) for item in raw]
+            self._refreshed_at = now
+        return self._subscribers
+
+    async def send_json(self, obj: dict) -> None:
+        manager = SocketManager.instance()
+        for sub in await self._current_subscribers():
+            await manager.send_json_to_user(sub["user_id"], {**obj, "request_id": sub["request_id"]})
+
+    async def close(self, code: int = 1000) -> None:
+        return None
+
+
+class JobQueue:
+    """
+    Redis-backed durable queue for expensive WebSocket work (assess / report).
+
+    - jobs survive socket drops and worker restarts (leases are reclaimed)
+    - jobs for the same pair are deduplicated while one is pending or running
+    - a user has at most WS_USER_HANDLER_LIMITS[kind] jobs of a kind queued or running
+    - a job whose subscribers have all disconnected is dropped when it is claimed
+    - lower priority numbers run first; FIFO within a priority
+    - at most JOB_WORKERS jobs run concurrently in this process
+    - results are pushed to the user's currently connected sockets
+    """
+    _instance: Optional["JobQueue"] = None
+
+    def __init__(self) -> None:
+        self._kinds: Dict[str, Tuple[Handler, int, Optional[Callable[..., Optional[str]]]]] = {}
+        self._schemas: Dict[str, Type[BaseModel]] = {}
+        self._workers: List[asyncio.Task] = []
+        self._reclaimer: Optional[asyncio.Task] = None
+        self._claim = redis_client.register_script(_CLAIM_SCRIPT)
+        self._reclaim = redis_client.register_script(_RECLAIM_SCRIPT)
+        self._acquire = redis_client.register_script(_ACQUIRE_SCRIPT)
+        self._release = redis_client.register_script(_RELEASE_SCRIPT)
+        self._running = 0
+        self.rejected = 0
+        self.abandoned = 0
+
+    @classmethod
+    def instance(cls) -> "JobQueue":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    # ---------------- Registration ----------------
+    def register(
+        self,
+        kind: str,
+        handler: Handler,
+        priority: int = 5,
+        dedupe: Optional[Callable[[str, str, Dict[str, Any]], Optional[str]]] = pair_dedupe_key,
+        schema: Optional[Type[BaseModel]] = None,
+    ) -> Handler:
+        """
+        Register `handler` to run as a queued job and return the WebSocket handler that
+        enqueues it (to be passed to SocketManager.register_handler with the same schema).
+        Payloads are stored dumped and re-validated into `schema` when the job runs.
+        """
+        self._kinds[kind] = (handler, priority, dedupe)
+        if schema is not None:
+            self._schemas[kind] = schema
+
+        async def _enqueue_handler(websocket: WebSocket, user_id: str, request_id: str,
+                                   payload: dict, meta: dict, ctx: dict) -> None:
+            job_id, duplicate = await self.enqueue(kind, user_id, request_id, payload, meta)
+            if job_id is None:
+                await SocketManager.instance().safe_send_json(websocket, {
+                    "type": "error", "request_id": request_id,
+                    "payload": {"message": "busy", "msg_type": kind},
+                })
+                return
+            await SocketManager.instance().safe_send_json(websocket, {
+                "type": "ack", "request_id": request_id,
+                "payload": {"status": "duplicate" if duplicate else "queued", "job_id": job_id},
+            })
+
+        return _enqueue_handler
+
+    # ---------------- Producer ----------------
+    async def enqueue(self, kind: str, user_id: str, request_id: str,
+                      payload: Any, meta: dict) -> Tuple[Optional[str], bool]:
+        """
+        Queue a job; returns (job_id, duplicate). A duplicate joins the existing job.
+        job_id is None when the user already has their limit of this kind queued or running.
+        """
+        if kind not in self._kinds:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if isinstance(payload, BaseModel):
+            payload = payload.model_dump()
+        _, priority, dedupe = self._kinds[kind]
+        subscriber = json.dumps({"user_id": str(user_id), "request_id": request_id})
+
+        job_id = uuid.uuid4().hex
+        dedupe_key = dedupe(kind, str(user_id), payload) if dedupe else None
+        if dedupe_key:
+            claimed = await redis_client.set(f"jobs:dedupe:{dedupe_key}", job_id,
+                                             nx=True, ex=settings.JOB_DEDUPE_TTL)
+            if not claimed:
+                existing = await redis_client.get(f"jobs:dedupe:{dedupe_key}")
+                if existing and await redis_client.hget(_job_key(existing), "status") == "queued":
+                    await redis_client.rpush(_subs_key(existing), subscriber)
+                    logger.info(f"Job {kind} for {dedupe_key} deduplicated into {existing}")
+                    return existing, True
+                # stale key (job already gone): take it over
+                await redis_client.set(f"jobs:dedupe:{dedupe_key}", job_id, ex=settings.JOB_DEDUPE_TTL)
+
+        limit = settings.WS_USER_HANDLER_LIMITS.get(kind, settings.WS_HANDLER_DEFAULT_LIMIT)
+        if not await self._acquire(keys=[_active_key(kind, str(user_id))],
+                                   args=[limit, settings.JOB_ACTIVE_COUNT_TTL]):
+            if dedupe_key:
+                await self._release_dedupe(dedupe_key, job_id)
+            self.rejected += 1
+            logger.info(f"User {user_id} already has {limit} {kind} jobs queued or running")
+            return None, False
+
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(_job_key(job_id), mapping={
+                "kind": kind,
+                "user_id": str(user_id),
+                "request_id": request_id,
+                "payload": json.dumps(payload),
+                "meta": json.dumps(meta),
+                "priority": priority,
+                "dedupe_key": dedupe_key or "",
+                "attempts": 0,
+                "status": "queued",
+                "enqueued_at": time.time(),
+            })
+            pipe.rpush(_subs_key(job_id), subscriber)
+            # priority dominates, enqueue time (ms) keeps FIFO order inside a priority
+            pipe.zadd(PENDING_KEY, {job_id: priority * 1e13 + int(time.time() * 1000)})
+            await pipe.execute()
+        logger.info(f"Queued {kind} job {job_id} for user {user_id} (priority {priority})")
+        return job_id, False
+
+    # ---------------- Workers ----------------
+    async def start(self) -> None:
+        if self._workers:
+            return
+        await self._reclaim_expired()
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(settings.JOB_WORKERS)]
+        self._reclaimer = asyncio.create_task(self._reclaim_loop())
+        logger.info(f"JobQueue started with {settings.JOB_WORKERS} workers")
+
+    async def stop(self) -> None:
+        tasks = self._workers + ([self._reclaimer] if self._reclaimer else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers, self._reclaimer = [], None
+
+    async def _reclaim_expired(self) -> List[str]:
+        """Requeue jobs whose lease ran out; returns the ids that were moved."""
+        now = time.time()
+        expired = await redis_client.zrangebyscore(PROCESSING_KEY, "-inf", now)
+        if not expired:
+            return []
+        return await self._reclaim(
+            keys=[PROCESSING_KEY, PENDING_KEY, *(_job_key(job_id) for job_id in expired)],
+            args=[now, *expired],
+        )
+
+    async def _reclaim_loop(self) -> None:
+        while True:
+            await asyncio.sleep(max(1, settings.JOB_LEASE_SECONDS / 2))
+            try:
+                expired = await self._reclaim_expired()
+                if expired:
+                    logger.warning(f"Requeued {len(expired)} jobs with expired leases")
+            except Exception as exc:
+                logger.error(f"Job reclaim error: {exc}")
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            try:
+                job_id = await self._claim(
+                    keys=[PENDING_KEY, PROCESSING_KEY],
+                    args=[time.time() + settings.JOB_LEASE_SECONDS],
+                )
+                if not job_id:
+                    await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+                    continue
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.exception(f"Job worker {index} error: {exc}")
+                await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+
+    async def _renew_lease(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(max(1, settings.JOB_LEASE_SECONDS / 3))
+            await redis_client.zadd(PROCESSING_KEY, {job_id: time.time() + settings.JOB_LEASE_SECONDS}, xx=True)
+
+    async def _run(self, job_id: str) -> None:
+        job = await redis_client.hgetall(_job_key(job_id))
+        if not job:
+            await redis_client.zrem(PROCESSING_KEY, job_id)
+            return
+
+        kind = job["kind"]
+        if not await self._has_listener(job_id):
+            self.abandoned += 1
+            logger.info(f"Dropping job {job_id} ({kind}): every subscriber disconnected")
+            await self._finish(job_id, job, "abandoned")
+            return
+
+        channel = _JobChannel(job_id)
+        attempts = await redis_client.hincrby(_job_key(job_id), "attempts", 1)
+        if kind not in self._kinds or attempts > settings.JOB_MAX_ATTEMPTS:
+            logger.error(f"Dropping job {job_id} ({kind}) after {attempts - 1} attempts")
+            await channel.send_json({"type": kind, "payload": {"stage": "error", "message": "job_failed"}})
+            await self._finish(job_id, job, "failed")
+            return
+
+        handler = self._kinds[kind][0]
+        status = "done"
+        ctx = {"user_id": job["user_id"], "job_id": job_id, "token_exp": None}
+        renew = asyncio.create_task(self._renew_lease(job_id))
+        self._running += 1
+        started = time.perf_counter()
+        try:
+            payload = json.loads(job["payload"])
+            if kind in self._schemas:
+                payload = self._schemas[kind].model_validate(payload)
+            with db_telemetry.scope(f"job:{kind}"):
+                await handler(channel, job["user_id"], job["request_id"],
+                              payload, json.loads(job["meta"]), ctx)
+        except asyncio.CancelledError:
+            # worker shutdown: hand the job back instead of dropping it
+            await self._requeue(job_id, job)
+            raise
+        except Exception as exc:
+            logger.exception(f"Job {job_id} ({kind}) failed: {exc}")
+            status = "failed"
+            await channel.send_json({"type": kind, "payload": {"stage": "error", "message": str(exc)}})
+        finally:
+            self._running -= 1
+            renew.cancel()
+        await self._finish(job_id, job, status)
+        logger.info(f"Job {job_id} ({kind}) finished in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    async def _has_listener(self, job_id: str) -> bool:
+        """Whether any subscriber of the job is still connected (to any worker)."""
+        manager = SocketManager.instance()
+        for raw in await redis_client.lrange(_subs_key(job_id), 0, -1):
+            # an unknown presence keeps the job: dropping it would lose the work
+            if await manager.is_connected(json.loads(raw)["user_id"], if_unknown=True):
+                return True
+        return False
+
+    async def _requeue(self, job_id: str, job: Dict[str, str]) -> None:
+        """Move an interrupted job back to pending (top of its priority); its hash, subscribers and dedupe key stay."""
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.zrem(PROCESSING_KEY, job_id)
+            pipe.hincrby(_job_key(job_id), "attempts", -1)  # an interruption is not a failed attempt
+            pipe.zadd(PENDING_KEY, {job_id: int(job["priority"]) * 1e13})
+            await pipe.execute()
+        logger.info(f"Job {job_id} ({job['kind']}) interrupted, requeued")
+
+    async def _finish(self, job_id: str, job: Dict[str, str], status: str) -> None:
+        """
+        Mark the job finished and give its requester's slot back; its hash and
+        subscribers expire after JOB_RESULT_TTL.
+        """
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.zrem(PROCESSING_KEY, job_id)
+            pipe.hset(_job_key(job_id), mapping={"status": status, "finished_at": time.time()})
+            pipe.expire(_job_key(job_id), settings.JOB_RESULT_TTL)
+            pipe.expire(_subs_key(job_id), settings.JOB_RESULT_TTL)
+            await pipe.execute()
+        await self._release(keys=[_active_key(job["kind"], job["user_id"])])
+        if job.get("dedupe_key"):
+            await self._release_dedupe(job["dedupe_key"], job_id)
+
+    async def _release_dedupe(self, dedupe_key: str, job_id: str) -> None:
+        key = f"jobs:dedupe:{dedupe_key}"
+        # only release the key if it still points at this job
+        if await redis_client.get(key) == job_id:
+            await redis_client.delete(key)
+
+    # ---------------- Introspection ----------------
+    async def stats(self) -> Dict[str, int]:
+        return {
+            "pending": await redis_client.zcard(PENDING_KEY),
+            "processing": await redis_client.zcard(PROCESSING_KEY),
+            "running_here": self._running,
+            "workers": len(self._workers),
+            "rejected_here": self.rejected,
+            "abandoned_here": self.abandoned,
+        }
@@ -1,38 +1,69 @@
 # ws/socket_manager.py
 import asyncio
-import json
 import logging
 import time
-from typing import Callable, Awaitable, Dict, Any, Set, Optional, Iterable
+from typing import Callable, Awaitable, Dict, Any, Set, Optional, Iterable, Type, Union
 from fastapi import WebSocket
+from pydantic import BaseModel, ValidationError
 from sqlalchemy.orm import Session
-from core.redis import get_messages_from_cache, clear_room_cache
-from utils.chat_utils import persist_messages_bulk
 from core.config import get_settings
-from utils.helpers import db_call 
+from services.db_telemetry import db_telemetry
+from services.llm_telemetry import Histogram
+from ws.connection import Connection
+from ws.codec import JSON_CODEC, Codec
+from ws.cluster import ClusterBus
+from ws.heartbeat import HeartbeatWheel
+from ws.chat_flusher import ChatFlusher
+from ws.handler_tasks import HandlerTasks
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-Handler = Callable[[WebSocket, str, str, dict, dict, dict], Awaitable[None]]
+# payload is the handler's schema instance when one was registered, else the raw dict
+Handler = Callable[[WebSocket, str, str, Any, dict, dict], Awaitable[None]]
 settings = get_settings()
 
+# send queue depth bucket upper bounds (frames; last bucket is +Inf)
+QUEUE_DEPTH_BUCKETS = [0, 1, 4, 16, 64, 128, 256]
+
 
 class SocketManager:
     """
     Singleton WebSocket manager that tracks connections and rooms.
-    Supports multiple sockets per user, room membership, safe message dispatch,
-    and bulk flush of chat messages from Redis to DB on disconnect.
-    Automatically starts a ping loop when the singleton is created.
+    Supports multiple sockets per user, room membership (with a user -> rooms reverse
+    index so disconnects only touch the user's own rooms), safe message dispatch
+    (handler tasks are bounded per socket/user and cancelled on disconnect),
+    and bulk flush of the user's chat rooms from Redis to DB on disconnect (the
+    ChatFlusher also drains rooms in the background).
+    Automatically starts a heartbeat (timing wheel) when the singleton is created.
     """
     _instance: Optional["SocketManager"] = None
 
     def __init__(self) -> None:
         self._user_ws: Dict[str, Set[WebSocket]] = {}
         self._ws_user: Dict[WebSocket, str] = {}
+        self._conns: Dict[WebSocket, Connection] = {}  # outbound queue + writer per socket
         self._rooms: Dict[str, Set[str]] = {}
+        self._user_rooms: Dict[str, Set[str]] = {}  # reverse index of _rooms
         self._handlers: Dict[str, Handler] = {}
-        self._lock = asyncio.Lock()
+        self._schemas: Dict[str, Type[BaseModel]] = {}
+        self._tasks = HandlerTasks()  # in-flight handler tasks per socket / per user
+        # Separate locks so room changes never wait on connection churn and vice versa.
+        # Never hold both at once; every critical section is O(1) or O(rooms-of-user).
+        self._conn_lock = asyncio.Lock()
+        self._room_lock = asyncio.Lock()
+        # cross-process delivery; started by start_cluster() once the app is up
+        self._bus: Optional[ClusterBus] = (
+            ClusterBus(deliver=self._deliver_local) if settings.CLUSTER_ENABLED else None
+        )
+
+        self._heartbeat = HeartbeatWheel(
+            interval=settings.WS_PING_INTERVAL,
+            tick=settings.WS_HEARTBEAT_TICK,
+            dead_after=settings.WS_DEAD_AFTER,
+            on_dead=lambda conn: self._drop_connection(conn.websocket),
+            max_concurrent_drops=settings.WS_DEAD_DROP_CONCURRENCY,
+        )
 
         try:
             loop = asyncio.get_running_loop()
@@ -41,7 +72,7 @@ class SocketManager:
 
         try:
             self._ping_task = loop.create_task(self._ping_loop())
-            logger.info("SocketManager ping loop started")
+            logger.info("SocketManager heartbeat started")
         except Exception as exc:
             logger.warning("Failed to start ping loop automatically: %s", exc)
             self._ping_task = None
@@ -53,38 +84,57 @@ class SocketManager:
         return cls._instance
 
     # ---------------- Connection lifecycle ----------------
-    async def register_connection(self, user_id: str, websocket: WebSocket) -> None:
-        async with self._lock:
+    async def register_connection(self, user_id: str, websocket: WebSocket, codec: Optional[Codec] = None) -> None:
+        conn = Connection(websocket, user_id, on_dead=self._drop_connection, codec=codec)
+        async with self._conn_lock:
             self._user_ws.setdefault(user_id, set()).add(websocket)
             self._ws_user[websocket] = user_id
+            self._conns[websocket] = conn
+            conn.start()
+            self._heartbeat.add(conn)
+            local_sockets = len(self._user_ws[user_id])
             logger.info(f"WebSocket registered for user {user_id}")
+        await self._update_presence(user_id, local_sockets)
 
     async def unregister_connection(self, websocket: WebSocket) -> Optional[str]:
-        async with self._lock:
+        async with self._conn_lock:
             user_id = self._ws_user.pop(websocket, None)
-            rooms_to_flush = []
-            if user_id:
-                conns = self._user_ws.get(user_id)
-                if conns:
-                    conns.discard(websocket)
-                    if not conns:
-                        self._user_ws.pop(user_id, None)
-
-                for room_id, members in list(self._rooms.items()):
-                    if user_id in members:
-                        members.discard(user_id)
-                        rooms_to_flush.append(room_id)
-                        if not members:
-                            self._rooms.pop(room_id, None)
-                logger.info(f"WebSocket for user {user_id} unregistered")
-
-        for room_id in rooms_to_flush:
-             await self._flush_room_cache_to_db(room_id)
+            conn = self._conns.pop(websocket, None)
+            if conn is not None:
+                conn.stop()
+                self._heartbeat.remove(conn)
+            self._tasks.cancel_connection(websocket)
+            if not user_id:
+                return None
+            conns = self._user_ws.get(user_id)
+            if conns:
+                conns.discard(websocket)
+            last_connection = not conns
+            if last_connection:
+                self._user_ws.pop(user_id, None)
+            local_sockets = len(conns or ())
+            logger.info(f"WebSocket for user {user_id} unregistered")
+        await self._update_presence(user_id, local_sockets)
+
+        async with self._room_lock:
+            if last_connection:
+                # the user is gone: leave every room they were in
+                rooms_to_flush = list(self._user_rooms.pop(user_id, ()))
+                for room_id in rooms_to_flush:
+                    self._discard_member(room_id, user_id)
+            else:
+                rooms_to_flush = list(self._user_rooms.get(user_id, ()))
+
+        if rooms_to_flush:
+            try:
+                await ChatFlusher.instance().flush_rooms(rooms_to_flush)
+            except Exception as exc:
+                logger.exception(f"Error flushing rooms of user {user_id} to DB: {exc}")
 
         return user_id
 
     async def close_user_connections(self, user_id: str) -> None:
-        async with self._lock:
+        async with self._conn_lock:
             conns = list(self._user_ws.get(user_id, []))
         for ws in conns:
             try:
@@ -95,49 +145,88 @@ class SocketManager:
 
     # ---------------- Room management ----------------
     async def add_user_to_room(self, user_id: str, room_id: str) -> None:
-        async with self._lock:
+        async with self._room_lock:
             self._rooms.setdefault(room_id, set()).add(user_id)
+            self._user_rooms.setdefault(user_id, set()).add(room_id)
 
     async def remove_user_from_room(self, user_id: str, room_id: str) -> None:
-        async with self._lock:
-            members = self._rooms.get(room_id)
-            if members and user_id in members:
-                members.discard(user_id)
-                if not members:
-                    self._rooms.pop(room_id, None)
+        async with self._room_lock:
+            self._discard_member(room_id, user_id)
+            rooms = self._user_rooms.get(user_id)
+            if rooms is not None:
+                rooms.discard(room_id)
+                if not rooms:
+                    self._user_rooms.pop(user_id, None)
+
+    def _discard_member(self, room_id: str, user_id: str) -> None:
+        """Remove user from room's member set (caller holds _room_lock)."""
+        members = self._rooms.get(room_id)
+        if members and user_id in members:
+            members.discard(user_id)
+            if not members:
+                self._rooms.pop(room_id, None)
 
     def room_members(self, room_id: str) -> Set[str]:
         return set(self._rooms.get(room_id, set()))
 
+    def user_rooms(self, user_id: str) -> Set[str]:
+        return set(self._user_rooms.get(user_id, set()))
+
     # ---------------- Handler registry & dispatch ----------------
-    def register_handler(self, msg_type: str, handler: Handler) -> None:
+    def register_handler(self, msg_type: str, handler: Handler, schema: Optional[Type[BaseModel]] = None) -> None:
+        """
+        Register `handler` for `msg_type`. With a `schema`, payloads are validated into
+        that model before the handler task is spawned; invalid ones get an error frame.
+        """
         self._handlers[msg_type] = handler
+        if schema is not None:
+            self._schemas[msg_type] = schema
+        else:
+            self._schemas.pop(msg_type, None)
 
     def unregister_handler(self, msg_type: str) -> None:
         self._handlers.pop(msg_type, None)
+        self._schemas.pop(msg_type, None)
+
+    async def dispatch_raw(self, websocket: WebSocket, raw: Union[str, bytes], ctx: dict) -> None:
+        conn = self._conns.get(websocket)
+        if conn is not None:
+            conn.touch()
+        codec = conn.codec if conn is not None else JSON_CODEC
 
-    async def dispatch_raw(self, websocket: WebSocket, raw_text: str, ctx: dict) -> None:
         try:
             if "token_exp" in ctx and ctx["token_exp"] is not None and int(time.time()) > int(ctx["token_exp"]):
                 logger.info(f"Closing ws for user {ctx.get('user_id')} due to expired token")
                 await self.safe_send_json(websocket, {
                     "type": "error", "request_id": None, "payload": {"message": "token_expired"}
                 })
+                await self.flush_connection(websocket)
                 await websocket.close(code=4403)
                 return
         except Exception:
             pass
 
         try:
-            msg = json.loads(raw_text)
-        except json.JSONDecodeError:
+            msg = codec.decode(raw)
+        except Exception:
             await self.safe_send_json(websocket, {
-                "type": "error", "request_id": None, "payload": {"message": "invalid_json"}
+                "type": "error", "request_id": None, "payload": {"message": f"invalid_{codec.name}"}
+            })
+            return
+        if not isinstance(msg, dict):
+            await self.safe_send_json(websocket, {
+                "type": "error", "request_id": None, "payload": {"message": "invalid_envelope"}
             })
             return
 
         msg_type = msg.get("type")
         request_id = msg.get("request_id", "") or ""
+
+        # application-level heartbeat from the client: liveness already recorded above
+        if msg_type == "ping":
+            await self.safe_send_json(websocket, {"type": "pong", "request_id": request_id or None, "payload": {}})
+            return
+
         payload = msg.get("payload", {}) or {}
         meta = msg.get("meta", {}) or {}
         handler = self._handlers.get(msg_type)
@@ -149,11 +238,32 @@ class SocketManager:
             })
             return
 
+        schema = self._schemas.get(msg_type)
+        if schema is not None:
+            try:
+                payload = schema.model_validate(payload)
+            except ValidationError as exc:
+                await self.safe_send_json(websocket, {
+                    "type": msg_type, "request_id": request_id,
+                    "payload": {
+                        "stage": "error", "message": "invalid_payload",
+                        "errors": [
+                            {"field": ".".join(str(p) for p in err["loc"]), "message": err["msg"]}
+                            for err in exc.errors()
+                        ],
+                    }
+                })
+                return
+
         user_id = ctx.get("user_id", "")
 
         async def _run_handler():
             try:
-                await handler(websocket, user_id, request_id, payload, meta, ctx)
+                with db_telemetry.scope(f"ws:{msg_type}"):
+                    await handler(websocket, user_id, request_id, payload, meta, ctx)
+            except asyncio.CancelledError:
+                logger.info(f"Handler for msg_type {msg_type} cancelled (user {user_id} disconnected)")
+                raise
             except Exception as exc:
                 logger.exception(f"Handler error for msg_type {msg_type}: {exc}")
                 try:
@@ -164,119 +274,147 @@ class SocketManager:
                 except Exception:
                     pass
 
-        asyncio.create_task(_run_handler())
+        if self._tasks.spawn(websocket, str(user_id), msg_type, _run_handler()) is None:
+            await self.safe_send_json(websocket, {
+                "type": "error", "request_id": request_id,
+                "payload": {"message": "busy", "msg_type": msg_type}
+            })
 
     # ---------------- Safe send helpers ----------------
+    async def _drop_connection(self, websocket: WebSocket) -> None:
+        """Close and unregister a socket whose sends failed or whose queue overflowed."""
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+        await self.unregister_connection(websocket)
+
     async def safe_send_json(self, websocket: WebSocket, obj: dict) -> None:
+        conn = self._conns.get(websocket)
+        if conn is not None:
+            conn.enqueue(obj)
+            return
+
+        # not a registered socket (e.g. a job channel or a socket being set up): send directly
         try:
             await websocket.send_json(obj)
         except Exception as exc:
             logger.error(f"send_json failed: {exc}. Closing websocket.")
-            try:
-                await websocket.close()
-            except Exception:
-                pass
-            await self.unregister_connection(websocket)
+            await self._drop_connection(websocket)
+
+    async def flush_connection(self, websocket: WebSocket, timeout: Optional[float] = None) -> None:
+        """Wait for the socket's queued frames to be sent, e.g. before closing it."""
+        conn = self._conns.get(websocket)
+        if conn is not None:
+            await conn.drain(timeout)
+
+    def _enqueue_local(self, user_id: str, obj: dict) -> int:
+        """Queue `obj` on this process's sockets of the user; returns how many accepted it."""
+        conns = [self._conns.get(ws) for ws in self._user_ws.get(str(user_id), ())]
+        return sum(1 for conn in conns if conn is not None and conn.enqueue(obj))
+
+    async def _deliver_local(self, user_id: str, obj: dict) -> int:
+        """ClusterBus callback for frames relayed from other processes."""
+        return self._enqueue_local(user_id, obj)
 
     async def send_json_to_user(self, user_id: str, obj: dict) -> int:
-        async with self._lock:
-            conns = list(self._user_ws.get(user_id, set()))
-        sent = 0
-        for ws in conns:
+        """
+        Deliver `obj` to every socket of the user: locally by queueing, and through the
+        cluster bus to other processes that hold sockets for the user.
+        Returns local sockets reached plus remote nodes published to.
+        """
+        return await self.send_json_to_users([user_id], obj)
+
+    async def send_json_to_users(self, user_ids: Iterable[str], obj: dict) -> int:
+        """
+        Like send_json_to_user for several users: local sockets are queued in one
+        synchronous pass, then remote delivery is one pipelined presence lookup and one
+        pipelined publish (one message per other node), whatever the number of users.
+        """
+        user_ids = [str(uid) for uid in user_ids]
+        sent = sum(self._enqueue_local(uid, obj) for uid in user_ids)
+        if self._bus is not None and user_ids:
             try:
-                await ws.send_json(obj)
-                sent += 1
+                sent += await self._bus.publish_to_users(user_ids, obj)
             except Exception as exc:
-                logger.error(f"Broadcast send failed for user {user_id}: {exc}")
-                try:
-                    await ws.close()
-                except Exception:
-                    pass
-                await self.unregister_connection(ws)
+                logger.error(f"Cluster publish failed for users {user_ids}: {exc}")
         return sent
 
+    async def is_connected(self, user_id: str, if_unknown: bool = False) -> bool:
+        """
+        Whether the user has a socket on this process or (per presence) on another node.
+        When the presence lookup fails the answer is `if_unknown`: False by default, so a
+        chat message goes to the offline queue (clients dedupe a redelivery by id/seq)
+        rather than possibly being lost.
+        """
+        if self._user_ws.get(str(user_id)):
+            return True
+        if self._bus is None:
+            return False
+        try:
+            return bool(await self._bus.remote_nodes(str(user_id)))
+        except Exception as exc:
+            logger.error(f"Presence lookup failed for user {user_id}: {exc}")
+            return if_unknown
+
     async def broadcast_to_room(self, room_id: str, obj: dict, exclude_user: str = None) -> int:
-        members = self.room_members(room_id)
-        sent = 0
-        for uid in list(members):
-          if exclude_user and str(uid) == str(exclude_user):
-            continue
-          sent += await self.send_json_to_user(uid, obj)
-        return sent
+        """Queue `obj` for every member of the room without awaiting any socket I/O."""
+        members = [uid for uid in self.room_members(room_id)
+                   if not (exclude_user and str(uid) == str(exclude_user))]
+        return await self.send_json_to_users(members, obj)
+
+    # ---------------- Cluster ----------------
+    async def start_cluster(self) -> None:
+        if self._bus is not None:
+            await self._bus.start()
+
+    async def stop_cluster(self) -> None:
+        if self._bus is not None:
+            await self._bus.stop()
+
+    async def _update_presence(self, user_id: str, local_sockets: int) -> None:
+        if self._bus is None:
+            return
+        try:
+            await self._bus.set_presence(user_id, local_sockets)
+        except Exception as exc:
+            logger.error(f"Presence update failed for user {user_id}: {exc}")
+
+    def connection_stats(self, detail: bool = False) -> Dict[str, Any]:
+        """
+        Aggregate connection metrics. Queue depths are reported as a histogram, the max
+        and how many connections are at or above WS_QUEUE_DEPTH_ALERT; per-connection
+        stats (which carry user ids) are only included with `detail`.
+        """
+        conns = list(self._conns.values())
+        depths = Histogram(QUEUE_DEPTH_BUCKETS)
+        for conn in conns:
+            depths.observe(conn.depth)
+        stats = {
+            "connections": len(conns),
+            "users": len(self._user_ws),
+            "rooms": len(self._rooms),
+            "queued_frames": int(depths.total),
+            "max_queue_depth": max((c.depth for c in conns), default=0),
+            "queue_depth": depths.snapshot(),
+            "backed_up": sum(1 for c in conns if c.depth >= settings.WS_QUEUE_DEPTH_ALERT),
+            "tasks": self._tasks.stats(),
+            "heartbeat": self._heartbeat.stats(),
+            "cluster": self._bus.stats() if self._bus is not None else None,
+        }
+        if detail:
+            stats["per_connection"] = [
+                {**c.stats(), "tasks": self._tasks.connection_count(c.websocket)} for c in conns
+            ]
+        return stats
 
     # ---------------- Utilities ----------------
     def get_user_ids(self) -> Iterable[str]:
         return list(self._user_ws.keys())
 
     async def get_user_websockets(self, user_id: str) -> Set[WebSocket]:
-        async with self._lock:
+        async with self._conn_lock:
             return set(self._user_ws.get(user_id, set()))
 
-    async def ping_all(self) -> None:
-        async with self._lock:
-            all_conns = [ws for conns in self._user_ws.values() for ws in conns]
-        for ws in all_conns:
-            try:
-                await ws.send_text("__ping__")
-            except Exception as exc:
-                logger.warning(f"Ping failed: {exc}")
-                try:
-                    await ws.close()
-                except Exception:
-                    pass
-                await self.unregister_connection(ws)
-
     async def _ping_loop(self) -> None:
-        while True:
-            try:
-                await self.ping_all()
-            except Exception as exc:
-                logger.error(f"Ping loop error: {exc}")
-            await asyncio.sleep(settings.WS_PING_INTERVAL)
-
-    # ---------------- Redis flush to DB ----------------
-    async def _flush_room_cache_to_db(self, room_id: str):
-        """Flush cached messages from Redis to DB in bulk"""
-        try:
-            messages = await get_messages_from_cache(room_id)
-            if not messages:
-                return
-
-            # Extract participants reliably (keep as strings)
-            participants: Set[str] = set()
-            for msg in messages:
-                if msg.get("sender"):
-                    participants.add(str(msg["sender"]))
-                if msg.get("receiver"):
-                    participants.add(str(msg["receiver"]))
-
-            # Fallback: derive participants from room_id if needed
-            if len(participants) < 2 and "_" in room_id:
-                parts = room_id.split("_")
-                for p in parts[:2]:
-                    participants.add(str(p))
-
-            if len(participants) >= 2:
-                u1_str, u2_str = sorted(list(participants))[:2]
-                try:
-                    u1, u2 = int(u1_str), int(u2_str)
-                except ValueError:
-                    logger.warning(f"Non-numeric participant IDs in room {room_id}, skipping flush.")
-                    return
-            else:
-                logger.warning(f"Could not determine both participants for room {room_id}, skipping flush.")
-                return
-
-            topic = messages[0].get("topic", "general")
-
-          
-         
-            await asyncio.to_thread(db_call, persist_messages_bulk, u1, u2, topic, messages)
-
-         
-            await clear_room_cache(room_id)
-
-            logger.info(f"Flushed {len(messages)} messages from {room_id} to DB")
-
-        except Exception as exc:
-            logger.exception(f"Error flushing Redis cache to DB for room {room_id}: {exc}")
+        await self._heartbeat.run()
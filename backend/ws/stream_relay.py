@@ -0,0 +1,113 @@
+# ws/stream_relay.py
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+
+class StreamRelay:
+    """
+    Forwards LLM output produced in a worker thread to a WebSocket as incremental frames.
+
+    `token()` and `partial()` are thread-safe and can be passed as callbacks to
+    LLMService.stream_query running in run_in_executor, or to analyze_conversation.
+    Token deltas are coalesced and flushed at most every `flush_interval` seconds so a
+    fast stream does not turn into one frame per token. Frames are written by one
+    writer task, in the order they were produced.
+
+    Frames sent (payload):
+      {"stage": "llm_stream", "delta": "..."}        -- coalesced token text
+      {"stage": "partial_score", ...partial fields}  -- e.g. one scored chunk
+    Timings (ms since the relay was created) are available from `timings()`.
+    """
+
+    def __init__(
+        self,
+        manager,
+        websocket: WebSocket,
+        msg_type: str,
+        request_id: str,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        flush_interval: float = 0.05,
+    ) -> None:
+        self._manager = manager
+        self._websocket = websocket
+        self._msg_type = msg_type
+        self._request_id = request_id
+        self._loop = loop or asyncio.get_running_loop()
+        self._flush_interval = flush_interval
+        self._buffer: List[str] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._frames: Deque[Dict[str, Any]] = deque()
+        self._writer: Optional[asyncio.Task] = None
+        self._started = time.perf_counter()
+        self._first_frame_at: Optional[float] = None
+
+    # ---------------- Thread-safe callbacks ----------------
+    def token(self, delta: str) -> None:
+        self._loop.call_soon_threadsafe(self._on_token, delta)
+
+    def partial(self, data: Dict[str, Any]) -> None:
+        self._loop.call_soon_threadsafe(self._on_partial, data)
+
+    # ---------------- Event-loop side ----------------
+    def _on_token(self, delta: str) -> None:
+        self._buffer.append(delta)
+        if self._first_frame_at is None:
+            # first output goes out immediately; later tokens are coalesced
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self._loop.call_later(self._flush_interval, self._flush)
+
+    def _on_partial(self, data: Dict[str, Any]) -> None:
+        self._flush()  # keep frames in the order they were produced
+        self._send({"stage": "partial_score", **data})
+
+    def _flush(self) -> None:
+        self._flush_handle = None
+        if self._buffer:
+            delta = "".join(self._buffer)
+            self._buffer.clear()
+            self._send({"stage": "llm_stream", "delta": delta})
+
+    def _send(self, payload: Dict[str, Any]) -> None:
+        if self._first_frame_at is None:
+            self._first_frame_at = time.perf_counter()
+        self._frames.append({"type": self._msg_type, "request_id": self._request_id, "payload": payload})
+        # a single writer drains the frames in order and exits once they are sent
+        if self._writer is None or self._writer.done():
+            self._writer = self._loop.create_task(self._write_frames())
+
+    async def _write_frames(self) -> None:
+        while self._frames:
+            frame = self._frames.popleft()
+            try:
+                await self._manager.safe_send_json(self._websocket, frame)
+            except Exception as exc:
+                logger.error(f"{self._msg_type} stream {self._request_id}: frame send failed: {exc}")
+
+    async def close(self) -> Dict[str, Optional[float]]:
+        """Flush any buffered text, wait for in-flight frames and return the timings."""
+        # let callbacks queued by the worker thread run before the final flush
+        await asyncio.sleep(0)
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._flush()
+        if self._writer is not None:
+            await self._writer
+        timings = self.timings()
+        logger.info(f"{self._msg_type} stream {self._request_id}: ttfb_ms={timings['ttfb_ms']}, total_ms={timings['total_ms']}")
+        return timings
+
+    def timings(self) -> Dict[str, Optional[float]]:
+        now = time.perf_counter()
+        ttfb = (self._first_frame_at - self._started) * 1000 if self._first_frame_at else None
+        return {
+            "ttfb_ms": round(ttfb, 1) if ttfb is not None else None,
+            "total_ms": round((now - self._started) * 1000, 1),
+        }